@@ -17,10 +17,16 @@
 import argparse
 import logging
 import sys
-from typing import Any
+from typing import Any, Optional
 
-from cou.steps.plan import apply_plan, dump_plan, generate_plan
-from cou.zaza_utils import clean_up_libjuju_thread
+from cou.steps import UpgradeStep, estimate, plan_cache, serialization
+from cou.steps.plan import apply_plan, dump_plan, export_trace, generate_plan
+from cou.zaza_utils import (
+    clean_up_libjuju_thread,
+    instrumentation,
+    probe_cache,
+    progress,
+)
 
 
 def parse_args(args: Any) -> argparse.Namespace:
@@ -46,8 +52,76 @@ def parse_args(args: Any) -> argparse.Namespace:
     parser.add_argument(
         "--interactive", default=True, help="Sets the interactive prompts", action="store_true"
     )
+    parser.add_argument(
+        "--approve",
+        action="append",
+        default=None,
+        metavar="PATTERN",
+        help="Approve up front the steps (and their sub steps) whose description matches "
+        "the shell-style PATTERN; can be given more than once.",
+    )
+    parser.add_argument(
+        "--no-progress",
+        default=True,
+        dest="progress",
+        help="Do not show the progress dashboard while waiting for applications to settle.",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--profile",
+        default=False,
+        help="Record the calls made to Juju and log a summary of them at exit.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default=None,
+        dest="profile_output",
+        metavar="FILE",
+        help="Write the --profile statistics to FILE as JSON; implies --profile.",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        metavar="FILE",
+        help="Write the timeline of the upgrade steps to FILE as a Chrome trace.",
+    )
+    parser.add_argument(
+        "--probe-cache-ttl",
+        default=probe_cache.DEFAULT_TTL,
+        type=float,
+        dest="probe_cache_ttl",
+        metavar="SECONDS",
+        help="Reuse the results of read-only commands run on a unit for up to SECONDS; "
+        "0 disables the cache.",
+    )
+    parser.add_argument(
+        "--no-plan-cache",
+        default=True,
+        dest="plan_cache",
+        help="With --dry-run, always generate the plan, rather than reuse the plan cached "
+        "for an unchanged model.",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--save-plan",
+        default=None,
+        dest="save_plan",
+        metavar="FILE",
+        help="Write the plan to FILE, to review it or apply it later with --load-plan.",
+    )
+    parser.add_argument(
+        "--load-plan",
+        default=None,
+        dest="load_plan",
+        metavar="FILE",
+        help="Use the plan in FILE, written by --save-plan, instead of generating one.",
+    )
 
-    return parser.parse_args(args)
+    parsed_args = parser.parse_args(args)
+    if parsed_args.profile_output:
+        parsed_args.profile = True
+    return parsed_args
 
 
 def setup_logging(log_level: str = "INFO") -> None:
@@ -67,20 +141,68 @@ def setup_logging(log_level: str = "INFO") -> None:
         root_logger.addHandler(console_handler)
 
 
+def report_profile(output: Optional[str] = None) -> None:
+    """Stop profiling and report the statistics.
+
+    Failing to write the statistics is logged, it doesn't fail the run.
+
+    :param output: File to write the statistics to as JSON, if any.
+    :type output: Optional[str]
+    """
+    instrumentation.disable()
+    instrumentation.log_summary()
+    if output:
+        try:
+            instrumentation.export_json(output)
+        except (OSError, TypeError, ValueError) as exc:
+            logging.error("Unable to write the profile to %s: %s", output, exc)
+            return
+        logging.info("Profile written to %s", output)
+
+
+def get_plan(args: argparse.Namespace) -> UpgradeStep:
+    """Load, or generate, the plan for upgrade and save it if asked to."""
+    if args.load_plan:
+        upgrade_plan = serialization.load_plan_file(args.load_plan)
+    elif args.dry_run and args.plan_cache:
+        upgrade_plan = plan_cache.generate_cached_plan(args, generate_plan)
+    else:
+        upgrade_plan = generate_plan(args)
+    if args.save_plan:
+        serialization.save_plan_file(upgrade_plan, args.save_plan)
+        logging.info("Plan written to %s", args.save_plan)
+    return upgrade_plan
+
+
 def entrypoint() -> int:
     """Execute 'charmed-openstack-upgrade' command."""
+    args = None
+    upgrade_plan = None
     try:
         args = parse_args(sys.argv[1:])
         setup_logging(log_level=args.loglevel)
+        if args.profile or args.trace:
+            instrumentation.enable()
+        if args.progress and sys.stderr.isatty():
+            progress.enable()
+        probe_cache.set_ttl(args.probe_cache_ttl)
 
-        upgrade_plan = generate_plan(args)
+        upgrade_plan = get_plan(args)
         if args.dry_run:
-            dump_plan(upgrade_plan)
+            dump_plan(upgrade_plan, estimate=estimate.estimate_plan(upgrade_plan))
         else:
-            apply_plan(upgrade_plan)
+            try:
+                apply_plan(upgrade_plan, approve=args.approve)
+            finally:
+                estimate.record_history(upgrade_plan)
 
         clean_up_libjuju_thread()
         return 0
     except Exception as exc:  # pylint: disable=broad-exception-caught
         logging.error(exc)
         return 1
+    finally:
+        if args is not None and args.trace and upgrade_plan is not None:
+            export_trace(upgrade_plan, args.trace)
+        if args is not None and args.profile:
+            report_profile(args.profile_output)
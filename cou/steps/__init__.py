@@ -17,8 +17,31 @@
 
 from __future__ import annotations
 
+import time
+from dataclasses import dataclass
 from typing import Any, Callable, List, Optional
 
+from cou.zaza_utils import instrumentation, probe_cache, progress
+
+
+@dataclass
+class StepTimings:
+    """Timings of the last run of an upgrade step, see UpgradeStep.run()."""
+
+    start_time: Optional[float] = None
+    completed: bool = False
+    wall_time: float = 0.0
+    wait_time: float = 0.0
+    rpc_time: float = 0.0
+
+
+@dataclass(frozen=True)
+class StepTarget:
+    """What an upgrade step acts on: the charm of an application and its unit count."""
+
+    charm: str
+    units: int = 0
+
 
 class UpgradeStep:
     """Represents each upgrade step."""
@@ -28,23 +51,51 @@ class UpgradeStep:
         description: str,
         parallel: bool,
         function: Optional[Callable],
+        target: Optional[StepTarget] = None,
         **params: Optional[Any],
     ):
         """Initialize upgrade step."""
         self.parallel = parallel
+        self.target = target
         self.description = description
         self.sub_steps: List[UpgradeStep] = list[UpgradeStep]()
         self.params = params
         self.function = function
+        self.timings = StepTimings()
 
     def add_step(self, step: UpgradeStep) -> None:
         """Add a single step."""
         self.sub_steps.append(step)
 
     def run(self) -> Any:
-        """Run the function."""
-        if self.function is not None:
+        """Run the function.
+
+        The start (epoch) and wall time of the run, and whether it completed
+        without raising, are recorded in timings.  While
+        instrumentation is enabled, so are the time spent blocked waiting on
+        Juju (wait_time) and the time spent in Juju API requests (rpc_time).
+        As requests can run concurrently, rpc_time can exceed wall_time.
+
+        A step can change any unit, so the cached results of the read-only
+        commands run on units are dropped once it has run, see probe_cache.
+        """
+        if self.function is None:
+            return None
+        before = instrumentation.get_totals()
+        start = time.perf_counter()
+        self.timings = StepTimings(start_time=time.time())
+        progress.step_started(self.description)
+        try:
             if self.params:
-                return self.function(**self.params)
-            return self.function()
-        return None
+                result = self.function(**self.params)
+            else:
+                result = self.function()
+            self.timings.completed = True
+            return result
+        finally:
+            probe_cache.invalidate()
+            progress.step_finished(self.description)
+            self.timings.wall_time = time.perf_counter() - start
+            after = instrumentation.get_totals()
+            self.timings.wait_time = after.get("sync", 0.0) - before.get("sync", 0.0)
+            self.timings.rpc_time = after.get("rpc", 0.0) - before.get("rpc", 0.0)
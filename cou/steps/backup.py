@@ -17,15 +17,18 @@
 import logging
 import os
 
-from cou.zaza_utils import model
-from cou.zaza_utils.upgrade_utils import get_database_app
+from cou.utils import lazy_import
+
+# loaded on first use, so that the cli does not pay for libjuju at start up
+model = lazy_import("cou.zaza_utils.model")
+upgrade_utils = lazy_import("cou.zaza_utils.upgrade_utils")
 
 
 def backup() -> None:
     """Backup mysql database of openstack."""
     logging.info("Backing up mysql database")
 
-    mysql_app = get_database_app()
+    mysql_app = upgrade_utils.get_database_app()
     mysql_leader = model.get_unit_from_name(model.get_lead_unit_name(mysql_app))
 
     logging.info("mysqldump mysql-innodb-cluster DBs ...")
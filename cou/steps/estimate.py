@@ -0,0 +1,245 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Estimate how long a plan takes, from the timings of earlier upgrades.
+
+Every step that ran to completion records its wall time in a local history,
+keyed on the step type and the charm and unit count of its target.  A step is estimated as the
+median of its recorded timings; when the exact key has no history, the timings
+of the same type of step on the same charm are scaled to the unit count, or,
+failing that, those of the same type of step on any charm are used.
+"""
+
+import json
+import logging
+import os
+import statistics
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from cou.steps import UpgradeStep
+from cou.steps.serialization import get_step_type
+from cou.utils import get_cache_dir
+
+HISTORY_FILE = "step-history.json"
+# Number of timings kept per key.
+MAX_TIMINGS = 20
+
+History = Dict[str, List[float]]
+
+
+@dataclass
+class PlanEstimate:
+    """Estimated durations of a plan, in seconds.
+
+    total is the time to run every step one after the other, which is how
+    apply_plan runs them; critical_path is the time if the sub steps of
+    parallel steps ran concurrently, as the plan allows, so it is a lower
+    bound rather than what an upgrade takes today.
+    steps has the estimate of each step (including its sub steps), or None
+    when there is no history for a step or for any of its sub steps.
+    """
+
+    total: Optional[float]
+    critical_path: Optional[float]
+    steps: Dict[UpgradeStep, Optional[float]]
+
+
+def _history_path() -> str:
+    return os.path.join(get_cache_dir(), HISTORY_FILE)
+
+
+def _split_key(key: str) -> Tuple[str, str, int]:
+    step_type, charm, units = key.rsplit("/", 2)
+    return step_type, charm, int(units)
+
+
+def history_key(step: UpgradeStep) -> Optional[str]:
+    """Return the key that the timings of a step are recorded under.
+
+    :param step: The step
+    :type step: UpgradeStep
+    :returns: The key, or None if the step has no registered type
+    :rtype: Optional[str]
+    """
+    step_type = get_step_type(step)
+    if step_type is None:
+        return None
+    charm, units = (step.target.charm, step.target.units) if step.target else ("", 0)
+    return f"{step_type}/{charm}/{units}"
+
+
+def load_history() -> History:
+    """Load the history of step timings.
+
+    :returns: The timings (in seconds) keyed on history_key()
+    :rtype: History
+    """
+    try:
+        with open(_history_path(), "r", encoding="utf-8") as history_file:
+            history = json.load(history_file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        logging.warning("Ignoring unreadable step history: %s", exc)
+        return {}
+    if not isinstance(history, dict):
+        return {}
+    valid = {}
+    for key, timings in history.items():
+        try:
+            _split_key(key)
+            if not all(isinstance(timing, (int, float)) for timing in timings):
+                raise ValueError(f"invalid timings {timings}")
+        except (AttributeError, TypeError, ValueError) as exc:
+            logging.debug("Ignoring step history entry %s: %s", key, exc)
+            continue
+        valid[key] = timings
+    return valid
+
+
+def record_history(upgrade_plan: UpgradeStep) -> None:
+    """Add the timings of the steps of an applied plan to the history.
+
+    Only the steps that ran to completion are recorded, the timings of a
+    failed or interrupted step would skew the estimates.
+
+    :param upgrade_plan: The applied plan
+    :type upgrade_plan: UpgradeStep
+    """
+    history = load_history()
+    recorded = 0
+    stack = [upgrade_plan]
+    while stack:
+        step = stack.pop()
+        stack.extend(step.sub_steps)
+        key = history_key(step)
+        if key is None or not step.timings.completed:
+            continue
+        timings = history.setdefault(key, [])
+        timings.append(step.timings.wall_time)
+        del timings[:-MAX_TIMINGS]
+        recorded += 1
+    if not recorded:
+        return
+    path = _history_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write and rename, so that concurrent runs don't write the same file
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=os.path.dirname(path), suffix=".tmp", delete=False
+        ) as history_file:
+            json.dump(history, history_file)
+        try:
+            os.replace(history_file.name, path)
+        except OSError:
+            os.remove(history_file.name)
+            raise
+    except OSError as exc:
+        logging.warning("Unable to record the step timings: %s", exc)
+
+
+def estimate_step(step: UpgradeStep, history: History) -> Optional[float]:
+    """Estimate how long a single step (without its sub steps) takes.
+
+    :param step: The step
+    :type step: UpgradeStep
+    :param history: The step timings, as returned by load_history()
+    :type history: History
+    :returns: The estimate in seconds, 0 for a step without a function, or None
+        if there is no history for the step
+    :rtype: Optional[float]
+    """
+    if step.function is None:
+        return 0.0
+    key = history_key(step)
+    if key is None:
+        return None
+    if history.get(key):
+        return statistics.median(history[key])
+    step_type, charm, units = _split_key(key)
+    same_charm = []
+    same_type = []
+    for other_key, timings in history.items():
+        if not timings:
+            continue
+        other_type, other_charm, other_units = _split_key(other_key)
+        if other_type != step_type:
+            continue
+        same_type.extend(timings)
+        if other_charm == charm and other_units:
+            same_charm.append((abs(other_units - units), other_units, timings))
+    if same_charm and units:
+        _, nearest_units, timings = min(same_charm)
+        return statistics.median(timings) * units / nearest_units
+    if same_type:
+        return statistics.median(same_type)
+    return None
+
+
+def _estimate(
+    step: UpgradeStep, history: History, steps: Dict[UpgradeStep, Optional[float]]
+) -> Tuple[Optional[float], Optional[float]]:
+    """Return the total and critical path estimates of a step and its sub steps."""
+    own = estimate_step(step, history)
+    total, critical_path = own, own
+    sub_critical_paths = []
+    for sub_step in step.sub_steps:
+        sub_total, sub_critical_path = _estimate(sub_step, history, steps)
+        total = None if total is None or sub_total is None else total + sub_total
+        sub_critical_paths.append(sub_critical_path)
+    if None in sub_critical_paths or critical_path is None:
+        critical_path = None
+    elif sub_critical_paths:
+        # the critical path of a parallel step is its slowest sub step
+        combine = max if step.parallel else sum
+        critical_path += combine(p for p in sub_critical_paths if p is not None)
+    steps[step] = total
+    return total, critical_path
+
+
+def estimate_plan(upgrade_plan: UpgradeStep, history: Optional[History] = None) -> PlanEstimate:
+    """Estimate how long a plan takes.
+
+    :param upgrade_plan: The plan
+    :type upgrade_plan: UpgradeStep
+    :param history: The step timings, default is load_history()
+    :type history: Optional[History]
+    :returns: The estimates
+    :rtype: PlanEstimate
+    """
+    if history is None:
+        history = load_history()
+    steps: Dict[UpgradeStep, Optional[float]] = {}
+    total, critical_path = _estimate(upgrade_plan, history, steps)
+    return PlanEstimate(total=total, critical_path=critical_path, steps=steps)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Format an estimate for people.
+
+    :param seconds: The estimate
+    :type seconds: Optional[float]
+    :returns: e.g. '~1h05m', '~2m30s' or 'unknown'
+    :rtype: str
+    """
+    if seconds is None:
+        return "unknown"
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"~{hours}h{minutes:02d}m"
+    return f"~{minutes}m{secs:02d}s"
@@ -15,13 +15,18 @@
 
 """Upgrade planning utilities."""
 
+import fnmatch
+import json
 import logging
 import sys
+import threading
 from argparse import Namespace
-from typing import Any
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from cou.steps import UpgradeStep
 from cou.steps.backup import backup
+from cou.steps.estimate import PlanEstimate, format_duration
 
 
 def generate_plan(args: Namespace) -> UpgradeStep:
@@ -34,23 +39,196 @@ def generate_plan(args: Namespace) -> UpgradeStep:
     return plan
 
 
-def apply_plan(upgrade_plan: Any) -> None:
-    """Apply the plan for upgrade."""
-    result = input(upgrade_plan.description + "[Continue/abort/skip]")
-    if result.casefold() == "c".casefold():
-        upgrade_plan.run()
-    elif result.casefold() == "a".casefold():
-        sys.exit(1)
+class _StepRunner:
+    """Run approved steps, in the order they were approved, in the background.
+
+    Steps are run one at a time by a single worker thread, so that the
+    operator can be asked about the next steps while the approved ones run.
+    Once a step fails, the steps queued after it are not run.
+    """
+
+    def __init__(self) -> None:
+        """Start with no steps queued."""
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cou-step")
+        self._futures: List[Future] = []
+        self._failed = threading.Event()
+
+    def _run(self, step: UpgradeStep) -> None:
+        if self._failed.is_set():
+            return
+        try:
+            step.run()
+        except BaseException:
+            self._failed.set()
+            raise
+        logging.info(
+            "%s took %.1fs (%.1fs waiting on Juju)",
+            step.description,
+            step.timings.wall_time,
+            step.timings.wait_time,
+        )
+
+    def submit(self, step: UpgradeStep) -> None:
+        """Queue an approved step."""
+        self._futures.append(self._executor.submit(self._run, step))
+
+    def check(self) -> None:
+        """Raise the error of the step that failed, if any."""
+        if self._failed.is_set():
+            self.wait()
+
+    def wait(self) -> None:
+        """Wait for the queued steps, raising the error of a failed one."""
+        wait(self._futures)
+        for future in self._futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        """Drop the steps that have not started, and wait for the running one."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _is_approved(step: UpgradeStep, approve: Sequence[str]) -> bool:
+    return any(fnmatch.fnmatch(step.description, pattern) for pattern in approve)
+
+
+def _apply_step(
+    step: UpgradeStep, runner: _StepRunner, approve: Sequence[str], approved: bool
+) -> None:
+    """Ask about, and queue, a step and its sub steps."""
+    runner.check()
+    approved = approved or _is_approved(step, approve)
+    if step.function is None:
+        # nothing to run, so nothing to ask about
+        if step.description:
+            logging.info(step.description)
+    elif approved:
+        runner.submit(step)
     else:
-        logging.info("Skipped")
+        result = input(step.description + "[Continue/phase/abort/skip]").casefold()
+        if result == "c":
+            runner.submit(step)
+        elif result == "p":
+            approved = True
+            runner.submit(step)
+        elif result == "a":
+            runner.shutdown()
+            sys.exit(1)
+        else:
+            logging.info("Skipped")
 
-    for sub_step in upgrade_plan.sub_steps:
-        apply_plan(sub_step)
+    for sub_step in step.sub_steps:
+        _apply_step(sub_step, runner, approve, approved)
+
+
+def apply_plan(upgrade_plan: UpgradeStep, approve: Optional[Sequence[str]] = None) -> None:
+    """Apply the plan for upgrade.
 
+    The operator is asked whether to continue with, abort or skip each step
+    that has something to run, in order; answering 'phase' approves the step
+    and all its sub steps.  Steps whose description matches one of the approve
+    patterns (see fnmatch) are approved up front, with all their sub steps.
+    Approved steps run in the background, in order, while the operator is asked
+    about the next ones.
 
-def dump_plan(upgrade_plan: UpgradeStep, ident: int = 0) -> None:
-    """Dump the plan for upgrade."""
+    :param upgrade_plan: The plan to apply
+    :type upgrade_plan: UpgradeStep
+    :param approve: Patterns of the descriptions of the steps approved up front
+    :type approve: Optional[Sequence[str]]
+    """
+    runner = _StepRunner()
+    try:
+        _apply_step(upgrade_plan, runner, approve or [], False)
+        runner.wait()
+    finally:
+        runner.shutdown()
+
+
+def dump_plan(
+    upgrade_plan: UpgradeStep, ident: int = 0, estimate: Optional[PlanEstimate] = None
+) -> None:
+    """Dump the plan for upgrade.
+
+    With an estimate, each step is annotated with its estimated duration and
+    the plan is followed by its total and critical path estimates.
+    """
     tab = "\t"
-    logging.info(f"{tab*ident}{upgrade_plan.description}")  # pylint: disable=W1203
+    description = upgrade_plan.description
+    if estimate is not None:
+        description += f" ({format_duration(estimate.steps.get(upgrade_plan))})"
+    logging.info(f"{tab*ident}{description}")  # pylint: disable=W1203
     for sub_step in upgrade_plan.sub_steps:
-        dump_plan(sub_step, ident + 1)
+        dump_plan(sub_step, ident + 1, estimate)
+    if estimate is not None and ident == 0:
+        logging.info(
+            "Estimated duration: %s, %s on the critical path if parallel steps ran "
+            "concurrently",
+            format_duration(estimate.total),
+            format_duration(estimate.critical_path),
+        )
+
+
+def _trace_events(
+    upgrade_plan: UpgradeStep, events: List[Dict[str, Any]]
+) -> Tuple[Optional[float], Optional[float]]:
+    """Add the trace events of a step and its sub steps.
+
+    A step that ran is an event for its own run; a step that did not run (e.g.
+    the top level plan) is an event spanning its sub steps, if any ran.
+
+    :returns: the start and end (epoch) of the step, or None if it didn't run
+    """
+    timings = upgrade_plan.timings
+    start, end = None, None
+    if timings.start_time is not None:
+        start = timings.start_time
+        end = start + timings.wall_time
+    event_index = len(events)
+    for sub_step in upgrade_plan.sub_steps:
+        sub_start, sub_end = _trace_events(sub_step, events)
+        if sub_start is not None and sub_end is not None:
+            start = sub_start if start is None else min(start, sub_start)
+            end = sub_end if end is None else max(end, sub_end)
+    if start is None or end is None:
+        return None, None
+    events.insert(
+        event_index,
+        {
+            "name": upgrade_plan.description,
+            "cat": "step",
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": 1,
+            "tid": 1,
+            "args": {
+                "wall_time": timings.wall_time,
+                "wait_time": timings.wait_time,
+                "rpc_time": timings.rpc_time,
+            },
+        },
+    )
+    return start, end
+
+
+def export_trace(upgrade_plan: UpgradeStep, path: str) -> None:
+    """Write the timeline of an applied plan as a Chrome trace.
+
+    The file can be opened in chrome://tracing or https://ui.perfetto.dev to
+    look at the critical path and the idle gaps of the upgrade.  Failing to
+    write the file is logged, it doesn't fail the run.
+
+    :param upgrade_plan: The plan that was applied
+    :type upgrade_plan: UpgradeStep
+    :param path: The file to write
+    :type path: str
+    """
+    events: List[Dict[str, Any]] = []
+    _trace_events(upgrade_plan, events)
+    try:
+        with open(path, "w", encoding="utf-8") as trace:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace, indent=1)
+    except (OSError, TypeError, ValueError) as exc:
+        logging.error("Unable to write the trace to %s: %s", path, exc)
+        return
+    logging.info("Trace written to %s", path)
@@ -0,0 +1,162 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cache of generated plans, keyed on a fingerprint of the model and the arguments.
+
+Generating a plan reads the status and config of the whole model.  When
+neither the model (same model, charm revisions, unit counts and config), the
+cli arguments that shape the plan nor the version of cou have changed since
+the last run, the plan is loaded from the cache instead.  Only --dry-run uses the cache; an upgrade
+always runs a freshly generated plan.
+"""
+
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import tempfile
+from argparse import Namespace
+from typing import Callable, Optional, Tuple
+
+from cou.steps import UpgradeStep
+from cou.steps.serialization import PlanFormatError, plan_from_dict, plan_to_dict
+from cou.utils import get_cache_dir, lazy_import
+
+model = lazy_import("cou.zaza_utils.model")
+
+# Bump when the cached format changes.
+CACHE_VERSION = 2
+# Number of cached plans to keep.
+MAX_CACHED_PLANS = 20
+# The cli arguments that generate_plan reads, and so change the plan; the
+# others (logging, profiling, where the plan is saved, ...) don't.  Add an
+# argument here when generate_plan starts reading it.
+PLAN_ARGS: Tuple[str, ...] = ()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(get_cache_dir(), f"plan-{key}.json")
+
+
+def _cou_version() -> str:
+    try:
+        return importlib.metadata.version("charmed-openstack-upgrader")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def get_cache_key(args: Namespace, model_fingerprint: str) -> str:
+    """Return the key of the cached plan for a model and cli arguments.
+
+    Only the arguments in PLAN_ARGS are part of the key.  The key also covers
+    the version of cou, so that the plans generated by another version are
+    never reused.
+
+    :param args: The cli arguments
+    :type args: Namespace
+    :param model_fingerprint: The fingerprint of the model
+    :type model_fingerprint: str
+    :returns: hex digest of the key
+    :rtype: str
+    """
+    plan_args = {name: getattr(args, name, None) for name in PLAN_ARGS}
+    key = {"cou": _cou_version(), "args": plan_args, "model": model_fingerprint}
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def load_plan(key: str) -> Optional[UpgradeStep]:
+    """Load the cached plan for a cache key.
+
+    :param key: The cache key, see get_cache_key
+    :type key: str
+    :returns: The plan, or None if there is no (usable) cached plan
+    :rtype: Optional[UpgradeStep]
+    """
+    try:
+        with open(_cache_path(key), "r", encoding="utf-8") as cache_file:
+            data = json.load(cache_file)
+        if data.get("version") != CACHE_VERSION:
+            return None
+        return plan_from_dict(data["plan"])
+    except FileNotFoundError:
+        return None
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        logging.debug("Ignoring unusable cached plan %s: %s", key, exc)
+        return None
+
+
+def _prune_cache(cache_dir: str) -> None:
+    """Remove all but the MAX_CACHED_PLANS most recent cached plans."""
+    plans = [
+        os.path.join(cache_dir, name)
+        for name in os.listdir(cache_dir)
+        if name.startswith("plan-") and name.endswith(".json")
+    ]
+    plans.sort(key=os.path.getmtime, reverse=True)
+    for path in plans[MAX_CACHED_PLANS:]:
+        os.remove(path)
+
+
+def save_plan(key: str, plan: UpgradeStep) -> None:
+    """Cache the plan for a cache key.
+
+    Failing to cache the plan (e.g. a step of an unregistered type, or an
+    unwritable cache directory) is logged and ignored.
+
+    :param key: The cache key, see get_cache_key
+    :type key: str
+    :param plan: The plan to cache
+    :type plan: UpgradeStep
+    """
+    path = _cache_path(key)
+    try:
+        data = json.dumps({"version": CACHE_VERSION, "plan": plan_to_dict(plan)})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write and rename, so that a concurrent run never reads half a plan
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=os.path.dirname(path), suffix=".tmp", delete=False
+        ) as cache_file:
+            cache_file.write(data)
+        try:
+            os.replace(cache_file.name, path)
+        except OSError:
+            os.remove(cache_file.name)
+            raise
+        _prune_cache(os.path.dirname(path))
+    except (OSError, PlanFormatError, TypeError, ValueError) as exc:
+        logging.warning("Unable to cache the plan: %s", exc)
+
+
+def generate_cached_plan(
+    args: Namespace, generate: Callable[[Namespace], UpgradeStep]
+) -> UpgradeStep:
+    """Return the cached plan for the current model and arguments, or generate and cache it.
+
+    :param args: The cli arguments
+    :type args: Namespace
+    :param generate: The function generating a plan from the arguments
+    :type generate: Callable[[Namespace], UpgradeStep]
+    :returns: The plan
+    :rtype: UpgradeStep
+    """
+    key = get_cache_key(args, model.get_model_fingerprint())
+    plan = load_plan(key)
+    if plan is not None:
+        logging.info("Model unchanged, using the cached plan")
+        return plan
+    plan = generate(args)
+    save_plan(key, plan)
+    return plan
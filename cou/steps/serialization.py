@@ -0,0 +1,190 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Serializable format of upgrade plans.
+
+A plan is stored as a flat list of steps, parents before their sub steps:
+
+    {
+        "version": 1,
+        "steps": [
+            {"id": 0, "type": null, "description": "Top level plan",
+             "parallel": false, "params": {}, "parent": null},
+            {"id": 1, "type": "backup", "description": "backup mysql databases",
+             "parallel": false, "params": {}, "parent": 0,
+             "target": {"charm": "mysql-innodb-cluster", "units": 3}},
+        ],
+    }
+
+A step depends on its parent and, as apply_plan() runs them in order, on the
+steps before it with the same parent.  The target, if the step has one, is the
+charm and unit count the step acts on.  The function of a step is stored as its
+type, which STEP_TYPES maps back to the function.  The format is plain JSON, so
+a plan can be generated once (e.g. in CI), reviewed, diffed and then applied
+any number of times with `cou --load-plan`.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from cou.steps import StepTarget, UpgradeStep
+from cou.steps.backup import backup
+
+PLAN_FORMAT_VERSION = 1
+
+# The functions that steps can run, keyed on their step type.
+STEP_TYPES: Dict[str, Callable] = {
+    "backup": backup,
+}
+
+
+class PlanFormatError(Exception):
+    """Exception raised when a plan can't be (de)serialized."""
+
+
+def register_step_type(step_type: str, function: Callable) -> None:
+    """Register the function of a step type.
+
+    :param step_type: The name of the step type
+    :type step_type: str
+    :param function: The function that steps of this type run
+    :type function: Callable
+    :raises PlanFormatError: if the step type is already registered
+    """
+    if STEP_TYPES.get(step_type, function) is not function:
+        raise PlanFormatError(f"step type {step_type} is already registered")
+    STEP_TYPES[step_type] = function
+
+
+def get_step_type(step: UpgradeStep) -> Optional[str]:
+    """Return the type of a step.
+
+    :param step: The step
+    :type step: UpgradeStep
+    :returns: The step type, or None if the step has no registered function
+    :rtype: Optional[str]
+    """
+    for step_type, function in STEP_TYPES.items():
+        if function is step.function:
+            return step_type
+    return None
+
+
+def plan_to_dict(plan: UpgradeStep) -> Dict[str, Any]:
+    """Convert a plan to its serializable format.
+
+    :param plan: The plan
+    :type plan: UpgradeStep
+    :raises PlanFormatError: if a step runs a function that is not registered
+    :returns: The plan, as a JSON compatible dictionary
+    :rtype: Dict[str, Any]
+    """
+    step_types = {function: step_type for step_type, function in STEP_TYPES.items()}
+    steps: List[Dict[str, Any]] = []
+    # iterative depth first walk, so that deep plans don't hit the recursion limit
+    stack: List[tuple[UpgradeStep, Optional[int]]] = [(plan, None)]
+    while stack:
+        step, parent = stack.pop()
+        if step.function is None:
+            step_type = None
+        else:
+            try:
+                step_type = step_types[step.function]
+            except KeyError as exc:
+                raise PlanFormatError(
+                    f"step '{step.description}' runs unregistered function {step.function}"
+                ) from exc
+        step_id = len(steps)
+        entry = {
+            "id": step_id,
+            "type": step_type,
+            "description": step.description,
+            "parallel": step.parallel,
+            "params": step.params,
+            "parent": parent,
+        }
+        if step.target is not None:
+            entry["target"] = {"charm": step.target.charm, "units": step.target.units}
+        steps.append(entry)
+        stack.extend((sub_step, step_id) for sub_step in reversed(step.sub_steps))
+    return {"version": PLAN_FORMAT_VERSION, "steps": steps}
+
+
+def plan_from_dict(data: Dict[str, Any]) -> UpgradeStep:
+    """Rebuild a plan from its serializable format.
+
+    :param data: The plan, as returned by plan_to_dict()
+    :type data: Dict[str, Any]
+    :raises PlanFormatError: if the data is not a valid plan
+    :returns: The plan
+    :rtype: UpgradeStep
+    """
+    if data.get("version") != PLAN_FORMAT_VERSION:
+        raise PlanFormatError(f"unsupported plan format version {data.get('version')}")
+    steps: Dict[int, UpgradeStep] = {}
+    plan: Optional[UpgradeStep] = None
+    try:
+        for entry in data["steps"]:
+            step_type = entry["type"]
+            target = entry.get("target")
+            step = UpgradeStep(
+                description=entry["description"],
+                parallel=entry["parallel"],
+                function=STEP_TYPES[step_type] if step_type is not None else None,
+                target=StepTarget(**target) if target is not None else None,
+                **entry["params"],
+            )
+            parent = entry["parent"]
+            if parent is None:
+                if plan is not None:
+                    raise PlanFormatError("plan has more than one top level step")
+                plan = step
+            else:
+                steps[parent].add_step(step)
+            steps[entry["id"]] = step
+    except KeyError as exc:
+        raise PlanFormatError(f"invalid plan, unknown {exc}") from exc
+    if plan is None:
+        raise PlanFormatError("plan has no top level step")
+    return plan
+
+
+def save_plan_file(plan: UpgradeStep, path: str) -> None:
+    """Write a plan to a file.
+
+    :param plan: The plan
+    :type plan: UpgradeStep
+    :param path: The file to write
+    :type path: str
+    """
+    with open(path, "w", encoding="utf-8") as plan_file:
+        json.dump(plan_to_dict(plan), plan_file, indent=1)
+
+
+def load_plan_file(path: str) -> UpgradeStep:
+    """Read a plan from a file written by save_plan_file().
+
+    :param path: The file to read
+    :type path: str
+    :raises PlanFormatError: if the file is not a valid plan
+    :returns: The plan
+    :rtype: UpgradeStep
+    """
+    with open(path, "r", encoding="utf-8") as plan_file:
+        try:
+            data = json.load(plan_file)
+        except ValueError as exc:
+            raise PlanFormatError(f"invalid plan file {path}: {exc}") from exc
+    return plan_from_dict(data)
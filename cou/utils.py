@@ -0,0 +1,67 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Generic helpers for the charmed openstack upgrader."""
+
+import importlib.util
+import os
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a module that is only loaded when one of its attributes is used.
+
+    Modules that pull in libjuju or oslo.config take most of the start up time
+    of cou; importing them with this keeps e.g. `cou --help` fast.  If the
+    module has already been imported, it is returned as it is.
+
+    :param name: The absolute name of the module, e.g. 'cou.zaza_utils.model'
+    :type name: str
+    :returns: The (lazy) module
+    :rtype: ModuleType
+    :raises ModuleNotFoundError: if the module does not exist
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def get_cache_dir() -> str:
+    """Return the directory that cou keeps its local cache and history in.
+
+    This is $COU_CACHE_DIR, or else 'cou' in the XDG cache directory.
+
+    :returns: The path of the directory, which may not exist yet
+    :rtype: str
+    """
+    cache_dir = os.environ.get("COU_CACHE_DIR")
+    if cache_dir:
+        return cache_dir
+    xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(xdg_cache, "cou")
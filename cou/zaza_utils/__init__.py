@@ -23,6 +23,8 @@ import time
 from pkgutil import extend_path
 from sys import version_info
 
+from cou.zaza_utils import instrumentation
+
 __path__ = extend_path(__path__, __name__)
 
 # This flag is for testing, but can be used to control whether libjuju runs in
@@ -173,7 +175,8 @@ def sync_wrapper(f, timeout=None):
     This is only to be called from sync code.  It wraps the given async
     co-routine in some sync logic that allows it to be injected into the async
     libjuju thread.  This is then waited until there is a result, in which case
-    the result is returned.
+    the result is returned.  Each call is recorded as 'sync:<name>' when
+    instrumentation is enabled.
 
     :param f: The async function that when called is a co-routine
         e.g. `async def some_function(...)` then `some_function` should be
@@ -184,8 +187,13 @@ def sync_wrapper(f, timeout=None):
     :returns: The de-async'd function
     :rtype: function
     """
+    name = "sync:{}".format(getattr(f, "__name__", repr(f)))
 
     def _wrapper(*args, **kwargs):
+        with instrumentation.timed(name):
+            return _call(*args, **kwargs)
+
+    def _call(*args, **kwargs):
         global _libjuju_loop
 
         async def _runner():
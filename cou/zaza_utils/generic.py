@@ -22,8 +22,7 @@ import subprocess
 import yaml
 
 from cou.zaza_utils import exceptions as cou_exceptions
-from cou.zaza_utils import juju as juju_utils
-from cou.zaza_utils import model
+from cou.zaza_utils import model, upgrade_utils
 
 
 def dict_to_yaml(dict_data):
@@ -76,15 +75,14 @@ def get_pkg_version(application, pkg):
     :returns: List of package version
     :rtype: list
     """
-    versions = []
-    units = model.get_units(application)
-    for unit in units:
-        cmd = "dpkg -l | grep {}".format(pkg)
-        out = juju_utils.remote_run(unit.entity_id, cmd)
-        versions.append(out.split("\n")[0].split()[2])
-    if len(set(versions)) != 1:
+    units = [unit.entity_id for unit in model.get_units(application)]
+    versions = upgrade_utils.get_package_versions(units, pkg)
+    for unit_name, version in versions.items():
+        if version is None:
+            raise Exception("Unable to get the version of {} on {}".format(pkg, unit_name))
+    if len(set(versions.values())) != 1:
         raise Exception("Unexpected output from pkg version check")
-    return versions[0]
+    return versions[units[0]]
 
 
 def get_undercloud_env_vars():
@@ -378,10 +376,10 @@ def series_upgrade(
     set_dpkg_non_interactive_on_unit(unit_name)
     logging.info("Prepare series upgrade on {}".format(machine_num))
     model.prepare_series_upgrade(machine_num, to_series=to_series)
-    logging.info("Waiting for workload status 'blocked' on {}".format(unit_name))
-    model.block_until_unit_wl_status(unit_name, "blocked")
-    logging.info("Waiting for model idleness")
-    model.block_until_all_units_idle()
+    logging.info(
+        "Waiting for workload status 'blocked' on {} and model idleness".format(unit_name)
+    )
+    model.block_until_targets([model.unit_wl_status_target(unit_name, "blocked")], idle=True)
     wrap_do_release_upgrade(
         unit_name,
         from_series=from_series,
@@ -391,10 +389,10 @@ def series_upgrade(
     )
     logging.info("Reboot {}".format(unit_name))
     reboot(unit_name)
-    logging.info("Waiting for workload status 'blocked' on {}".format(unit_name))
-    model.block_until_unit_wl_status(unit_name, "blocked")
-    logging.info("Waiting for model idleness")
-    model.block_until_all_units_idle()
+    logging.info(
+        "Waiting for workload status 'blocked' on {} and model idleness".format(unit_name)
+    )
+    model.block_until_targets([model.unit_wl_status_target(unit_name, "blocked")], idle=True)
     logging.info("Set origin on {}".format(application))
     # Allow for charms which have neither source nor openstack-origin
     if origin:
@@ -403,9 +401,8 @@ def series_upgrade(
     logging.info("Complete series upgrade on {}".format(machine_num))
     model.complete_series_upgrade(machine_num)
     model.block_until_all_units_idle()
-    logging.info("Waiting for workload status 'active' on {}".format(unit_name))
-    model.block_until_unit_wl_status(unit_name, "active")
-    model.block_until_all_units_idle()
+    logging.info("Waiting for workload status 'active' on {} and model idleness".format(unit_name))
+    model.block_until_targets([model.unit_wl_status_target(unit_name, "active")], idle=True)
     # This step may be performed by juju in the future
     logging.info("Set series on {} to {}".format(application, to_series))
     model.set_series(application, to_series)
@@ -517,6 +514,27 @@ def do_release_upgrade(unit_name):
     except subprocess.CalledProcessError as e:
         logging.warn("Failed do-release-upgrade for {}".format(unit_name))
         logging.warn(e)
+    finally:
+        _invalidate_clock_offsets(unit_name)
+
+
+def do_release_upgrade_on_units(unit_names):
+    """Run do-release-upgrade noninteractive once on each machine of units.
+
+    The series upgrade upgrades one machine at a time and skips the machines
+    it already upgraded, see series_upgrade_application(), so it keeps using
+    do_release_upgrade().
+
+    :param unit_names: Unit Names
+    :type unit_names: List[str]
+    :returns: The unit do-release-upgrade ran on, for each unit
+    :rtype: Dict[str, str]
+    """
+    upgraded = {}
+    for units in model.get_units_by_machine(unit_names).values():
+        do_release_upgrade(units[0])
+        upgraded.update((unit_name, units[0]) for unit_name in units)
+    return upgraded
 
 
 def reboot(unit_name):
@@ -535,6 +553,17 @@ def reboot(unit_name):
     except subprocess.CalledProcessError as e:
         logging.info(e)
         pass
+    finally:
+        _invalidate_clock_offsets(unit_name)
+
+
+def _invalidate_clock_offsets(unit_name):
+    """Drop the clock offset of the machine of a unit, whose clock may step.
+
+    :param unit_name: Unit Name
+    :type unit_name: str
+    """
+    model.invalidate_clock_offsets(machines=list(model.get_units_by_machine([unit_name])))
 
 
 def juju_reboot(unit_name):
@@ -553,6 +582,8 @@ def juju_reboot(unit_name):
     except subprocess.CalledProcessError as e:
         logging.info(e)
         pass
+    finally:
+        _invalidate_clock_offsets(unit_name)
 
 
 def set_dpkg_non_interactive_on_unit(
@@ -565,12 +596,31 @@ def set_dpkg_non_interactive_on_unit(
     :param apt_conf_d: Apt.conf file to update
     :type apt_conf_d: str
     """
+    model.run_on_unit(unit_name, _dpkg_non_interactive_command(apt_conf_d))
+
+
+def set_dpkg_non_interactive_on_units(
+    unit_names, apt_conf_d="/etc/apt/apt.conf.d/50unattended-upgrades"
+):
+    """Set dpkg options once on each machine of units.
+
+    See do_release_upgrade_on_units() for why series_upgrade() doesn't use it.
+
+    :param unit_names: Unit Names
+    :type unit_names: List[str]
+    :param apt_conf_d: Apt.conf file to update
+    :type apt_conf_d: str
+    """
+    model.run_on_unit_machines(unit_names, _dpkg_non_interactive_command(apt_conf_d))
+
+
+def _dpkg_non_interactive_command(apt_conf_d):
+    """Return the command setting the dpkg options in apt_conf_d."""
     DPKG_NON_INTERACTIVE = 'DPkg::options { "--force-confdef"; };'
     # Check if the option exists. If not, add it to the apt.conf.d file
-    cmd = "grep '{option}' {file_name} || echo '{option}' >> {file_name}".format(
+    return "grep '{option}' {file_name} || echo '{option}' >> {file_name}".format(
         option=DPKG_NON_INTERACTIVE, file_name=apt_conf_d
     )
-    model.run_on_unit(unit_name, cmd)
 
 
 def get_process_id_list(unit_name, process_name, expect_success=True, pgrep_full=False):
@@ -589,13 +639,39 @@ def get_process_id_list(unit_name, process_name, expect_success=True, pgrep_full
     :returns: List of process IDs
     :raises: cou_exceptions.ProcessIdsFailed
     """
+    cmd = _process_id_command(process_name, expect_success, pgrep_full)
+    results = model.run_on_unit(unit_name=unit_name, command=cmd)
+    return _process_id_list(unit_name, cmd, results)
+
+
+def _process_id_command(process_name, expect_success=True, pgrep_full=False):
+    """Return the command listing the process ID(s) of a process name.
+
+    See get_process_id_list() for the parameters.
+
+    :rtype: str
+    """
     if pgrep_full:
         cmd = 'pgrep -f "{}"'.format(process_name)
     else:
         cmd = 'pidof -x "{}"'.format(process_name)
     if not expect_success:
         cmd += " || exit 0 && exit 1"
-    results = model.run_on_unit(unit_name=unit_name, command=cmd)
+    return cmd
+
+
+def _process_id_list(unit_name, cmd, results):
+    """Return the process ID(s) from the results of _process_id_command().
+
+    :param unit_name: The unit the command ran on
+    :type unit_name: str
+    :param cmd: The command
+    :type cmd: str
+    :param results: The results of the command
+    :type results: dict
+    :returns: List of process IDs
+    :raises: cou_exceptions.ProcessIdsFailed
+    """
     code = results.get("Code", 1)
     try:
         code = int(code)
@@ -609,12 +685,51 @@ def get_process_id_list(unit_name, process_name, expect_success=True, pgrep_full
     return str(output).split()
 
 
+def _process_ids_command(process_names):
+    """Return the command listing the process ID(s) of several process names.
+
+    Each process name is looked up with pidof, and a line with its index, the
+    exit code of pidof and the process IDs is printed for it, e.g.
+    '0 0 1234 1235' or '1 1 '.
+
+    :param process_names: The process names
+    :type process_names: List[str]
+    :rtype: str
+    """
+    return "; ".join(
+        'pids=$(pidof -x "{}"); echo "{} $? $pids"'.format(process_name, index)
+        for index, process_name in enumerate(process_names)
+    )
+
+
+def _parse_process_ids(output):
+    """Parse the output of _process_ids_command().
+
+    :param output: The output of the command
+    :type output: Optional[str]
+    :returns: The exit code of pidof and the process IDs, keyed by the index
+        of the process name
+    :rtype: Dict[int, Tuple[int, str]]
+    """
+    found = {}
+    for line in (output or "").splitlines():
+        index, code, pids = (line.split(None, 2) + ["", "", ""])[:3]
+        if index.isdigit() and code.isdigit():
+            found[int(index)] = (int(code), pids)
+    return found
+
+
 def get_unit_process_ids(unit_processes, expect_success=True):
     """Get unit process ID(s).
 
     Construct a dict containing unit sentries, process names, and
     process IDs.
 
+    All the process names are looked up with a single command on each unit,
+    and all the units are run on at once, with a single call to the
+    controller.  Each unit looks up every process name, but only gets the
+    process IDs of its own process names.
+
     :param unit_processes: A dictionary of unit names
         to list of process names.
     :param expect_success: if False expect the processes to not be
@@ -623,12 +738,35 @@ def get_unit_process_ids(unit_processes, expect_success=True):
         of process names to PIDs.
     :raises: cou_exceptions.ProcessIdsFailed
     """
-    pid_dict = {}
+    pid_dict = {unit_name: {} for unit_name in unit_processes}
+    # process name <-> its index in the command
+    indexes = {}
+    for process_list in unit_processes.values():
+        for process in process_list:
+            indexes.setdefault(process, len(indexes))
+    if not indexes:
+        return pid_dict
+    cmd = _process_ids_command(list(indexes))
+    # a read-only probe, but the process IDs are always looked up afresh
+    results = model.run_on_units(cmd, units=list(unit_processes), max_age=0)
     for unit_name, process_list in unit_processes.items():
-        pid_dict[unit_name] = {}
+        unit_results = results.get(unit_name, {})
+        found = _parse_process_ids(unit_results.get("Stdout"))
         for process in process_list:
-            pids = get_process_id_list(unit_name, process, expect_success=expect_success)
-            pid_dict[unit_name].update({process: pids})
+            try:
+                code, pids = found[indexes[process]]
+            except KeyError:
+                # the command didn't get as far as this process
+                process_results = dict(unit_results, Code=1)
+            else:
+                if not expect_success:
+                    code = int(code == 0)
+                process_results = {"Code": code, "Stdout": pids, "Stderr": ""}
+            pid_dict[unit_name][process] = _process_id_list(
+                unit_name,
+                _process_id_command(process, expect_success=expect_success),
+                process_results,
+            )
     return pid_dict
 
 
@@ -31,11 +31,17 @@ from cou.zaza_utils import ro_types
 # being used.
 _options = None
 
+# The read-only view of _options, built on first use by get_options() and
+# thrown away whenever the options are changed through this module.
+_options_view = None
+
 
 def get_raw_options():
     """Get the actual options as a raw structure.
 
-    This returns the _tests_options from the file.
+    This returns the _tests_options from the file.  Note that if the returned
+    structure is modified directly, then invalidate_options_view() must be
+    called so that get_options() and get_option() see the change.
 
     :returns: options that have been set
     :rtype: Dict
@@ -49,17 +55,33 @@ def get_raw_options():
 def get_options():
     """Get the options as read-only property accessible structure.
 
-    This returns the raw options as an Attribute-dict and list.
+    This returns the raw options as an Attribute-dict and list.  The view is
+    built once and then shared until the options are next changed.
+
     :returns: the options wrapped in a a ReadOnlyDict()
     :rtype: ReadOnlyDict[]
     """
-    return ro_types.resolve_immutable(get_raw_options())
+    global _options_view
+    if _options_view is None:
+        _options_view = ro_types.resolve_immutable(get_raw_options())
+    return _options_view
+
+
+def invalidate_options_view():
+    """Drop the cached read-only view of the options.
+
+    This is done by set_option(), merge() and reset_options(); it only needs
+    to be called directly if the structure from get_raw_options() is changed.
+    """
+    global _options_view
+    _options_view = None
 
 
 def reset_options():
     """Reset the options to nothing.  Use sparingly."""
     global _options
     _options = None
+    invalidate_options_view()
 
 
 class LevelType(enum.Enum):
@@ -173,6 +195,7 @@ def set_option(option, value, override=False, use_list=True):
     last_index = len(keys) - 1
     levels = []
     options = get_raw_options()
+    invalidate_options_view()
 
     key_types = _keys_to_level_types(keys, use_list)
 
@@ -246,14 +269,14 @@ def get_option(option, default=None, raise_exception=False):
     :returns: ANY
     """
     keys = option.split(".")
-    options = get_raw_options()
+    options = get_options()
 
     key_types = _keys_to_level_types(keys, True)
     for i, key in enumerate(keys):
         option_type = _ref_to_level_type(options)
         if option_type == key_types[i]:
             try:
-                options = options[_convert_key_type(key, key_types[i])]
+                options = _get_item(options, _convert_key_type(key, key_types[i]))
             except (KeyError, IndexError):
                 if raise_exception:
                     raise KeyError(
@@ -263,7 +286,7 @@ def get_option(option, default=None, raise_exception=False):
         elif option_type == LevelType.DICT:
             try:
                 # it's a int like key
-                options = options[int(key)]
+                options = _get_item(options, int(key))
             except KeyError:
                 if raise_exception:
                     raise KeyError(
@@ -276,7 +299,26 @@ def get_option(option, default=None, raise_exception=False):
             raise KeyError("No option {} at {}".format(option, ".".join(keys[:i])))
         else:
             return default
-    return ro_types.resolve_immutable(options)
+    return options
+
+
+def _get_item(ref, key):
+    """Get key from a level of the read-only options view.
+
+    The ReadOnlyDict '_' to '-' fallback is bypassed, so that keys are matched
+    exactly as they would be in the raw options.
+
+    :param ref: the level to look in.
+    :type ref: Union[ro_types.ReadOnlyDict, ro_types.ReadOnlyList]
+    :param key: the key or index to fetch.
+    :type key: Union[str, int]
+    :returns: the value at key
+    :rtype: ANY
+    :raises: KeyError or IndexError if the key isn't present.
+    """
+    if isinstance(ref, dict):
+        return dict.__getitem__(ref, key)
+    return tuple.__getitem__(ref, key)
 
 
 def merge(data, override=False):
@@ -293,6 +335,7 @@ def merge(data, override=False):
     :type data: ANY
     """
     options = get_raw_options()
+    invalidate_options_view()
 
     def _merge(ref, _data):
         """Attempt to merge _data at ref.
@@ -0,0 +1,392 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Record where a run spends its time talking to Juju.
+
+Instrumentation is off by default, and then timed() and record_cache() return
+straight away.  When enabled (e.g. by `cou --profile`) every instrumented call
+records its count, errors, latency histogram and bytes transferred, and every
+instrumented cache its hits and misses.  The Juju API calls themselves are
+recorded, per facade and request, by wrapping the libjuju Connection.rpc().
+
+The calls are made from both the foreground thread and the libjuju thread, so
+updates are done under a lock.
+"""
+
+import bisect
+import contextlib
+import json
+import logging
+import threading
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets; the last bucket
+# is everything slower.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+ENABLED = False
+
+_lock = threading.Lock()
+_calls = {}
+_caches = {}
+# total duration per kind of call, the kind being the part of the name before
+# the first ':' (e.g. 'sync', 'rpc')
+_totals = {}
+_rpc_original = None
+
+
+class CallStats(object):
+    """The statistics of one kind of call."""
+
+    __slots__ = ("count", "errors", "total", "min", "max", "buckets", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        """Start with no calls recorded."""
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, duration, error=False, bytes_in=0, bytes_out=0):
+        """Add a call.
+
+        :param duration: How long the call took, in seconds
+        :type duration: float
+        :param error: Whether the call raised
+        :type error: bool
+        :param bytes_in: Bytes received by the call
+        :type bytes_in: int
+        :param bytes_out: Bytes sent by the call
+        :type bytes_out: int
+        """
+        self.count += 1
+        self.errors += int(error)
+        self.total += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = max(self.max, duration)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def as_dict(self):
+        """Return the statistics as a dictionary.
+
+        :returns: the statistics
+        :rtype: Dict[str, ANY]
+        """
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min or 0.0,
+            "max": self.max,
+            "histogram": {
+                (
+                    "<={}".format(bound)
+                    if bound is not None
+                    else ">{}".format(LATENCY_BUCKETS[-1])
+                ): n
+                for bound, n in zip(LATENCY_BUCKETS + (None,), self.buckets)
+            },
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+class _Timer(object):
+    """Context manager that records the duration of its block."""
+
+    __slots__ = ("name", "start", "bytes_in", "bytes_out")
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_call(
+            self.name,
+            time.perf_counter() - self.start,
+            error=exc_type is not None,
+            bytes_in=self.bytes_in,
+            bytes_out=self.bytes_out,
+        )
+        return False
+
+
+class _NullTimer(object):
+    """Context manager used while instrumentation is disabled."""
+
+    __slots__ = ()
+    bytes_in = 0
+    bytes_out = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        # allow `timer.bytes_in = n` to be a no-op
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(name):
+    """Time a block of code as a call of name.
+
+    The returned context manager has bytes_in and bytes_out attributes that
+    the block can set, e.g.:
+
+        with instrumentation.timed("run_on_unit") as timer:
+            result = ...
+            timer.bytes_in = len(result)
+
+    :param name: The name to record the call under
+    :type name: str
+    :returns: a context manager
+    :rtype: ContextManager
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def record_call(name, duration, error=False, bytes_in=0, bytes_out=0):
+    """Record a call of name.
+
+    :param name: The name to record the call under
+    :type name: str
+    :param duration: How long the call took, in seconds
+    :type duration: float
+    :param error: Whether the call raised
+    :type error: bool
+    :param bytes_in: Bytes received by the call
+    :type bytes_in: int
+    :param bytes_out: Bytes sent by the call
+    :type bytes_out: int
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        try:
+            stats = _calls[name]
+        except KeyError:
+            stats = _calls[name] = CallStats()
+        stats.add(duration, error=error, bytes_in=bytes_in, bytes_out=bytes_out)
+        kind = name.split(":", 1)[0]
+        _totals[kind] = _totals.get(kind, 0.0) + duration
+
+
+def record_cache(name, hit):
+    """Record a hit or a miss of the cache name.
+
+    :param name: The name of the cache
+    :type name: str
+    :param hit: True for a hit, False for a miss
+    :type hit: bool
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        counts = _caches.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+def _install_rpc_hook():
+    """Wrap libjuju's Connection.rpc() to record every API call."""
+    global _rpc_original
+    if _rpc_original is not None:
+        return
+    from juju.client.connection import Connection
+
+    original = _rpc_original = Connection.rpc
+
+    async def rpc(self, msg, encoder=None):
+        if not ENABLED:
+            return await original(self, msg, encoder=encoder)
+        name = "rpc:{}.{}".format(msg.get("type"), msg.get("request"))
+        result = None
+        start = time.perf_counter()
+        try:
+            result = await original(self, msg, encoder=encoder)
+        except BaseException:
+            record_call(name, time.perf_counter() - start, error=True)
+            raise
+        duration = time.perf_counter() - start
+        # the payloads are measured after the call, so that serialising them
+        # isn't counted as latency
+        record_call(
+            name,
+            duration,
+            bytes_in=len(json.dumps(result)) if result else 0,
+            bytes_out=len(json.dumps(msg, cls=encoder)),
+        )
+        return result
+
+    Connection.rpc = rpc
+
+
+def _uninstall_rpc_hook():
+    """Put libjuju's Connection.rpc() back."""
+    global _rpc_original
+    if _rpc_original is None:
+        return
+    from juju.client.connection import Connection
+
+    Connection.rpc = _rpc_original
+    _rpc_original = None
+
+
+def enable(rpc=True):
+    """Start recording.
+
+    :param rpc: Also record the individual Juju API calls.
+    :type rpc: bool
+    """
+    global ENABLED
+    ENABLED = True
+    if rpc:
+        _install_rpc_hook()
+
+
+def disable():
+    """Stop recording; the statistics gathered so far are kept."""
+    global ENABLED
+    ENABLED = False
+    _uninstall_rpc_hook()
+
+
+def reset():
+    """Forget all the statistics."""
+    with _lock:
+        _calls.clear()
+        _caches.clear()
+        _totals.clear()
+
+
+def get_totals():
+    """Return the total time recorded for each kind of call.
+
+    The kind is the part of the call name before the first ':', so 'sync' is
+    the time the caller spent blocked in sync_wrapper calls and 'rpc' the time
+    spent in Juju API requests.  Comparing the totals from before and after a
+    piece of work gives the time that work spent on each.
+
+    :returns: total seconds keyed on kind of call
+    :rtype: Dict[str, float]
+    """
+    with _lock:
+        return dict(_totals)
+
+
+def get_stats():
+    """Return all the statistics.
+
+    :returns: {'calls': {name: {...}}, 'caches': {name: {...}}}
+    :rtype: Dict[str, Dict[str, Dict[str, ANY]]]
+    """
+    with _lock:
+        calls = {name: stats.as_dict() for name, stats in _calls.items()}
+        caches = {
+            name: {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+            for name, (hits, misses) in _caches.items()
+        }
+    return {"calls": calls, "caches": caches}
+
+
+def format_summary(stats=None):
+    """Format the statistics as a table, slowest total time first.
+
+    :param stats: statistics, as returned by get_stats(); default is now
+    :type stats: Optional[Dict]
+    :returns: the summary
+    :rtype: str
+    """
+    stats = stats or get_stats()
+    lines = [
+        "{:<48} {:>7} {:>5} {:>10} {:>9} {:>9} {:>11} {:>11}".format(
+            "call", "count", "errs", "total(s)", "mean(ms)", "max(ms)", "bytes in", "bytes out"
+        )
+    ]
+    calls = sorted(stats["calls"].items(), key=lambda item: item[1]["total"], reverse=True)
+    for name, call in calls:
+        lines.append(
+            "{:<48} {:>7} {:>5} {:>10.3f} {:>9.1f} {:>9.1f} {:>11} {:>11}".format(
+                name[:48],
+                call["count"],
+                call["errors"],
+                call["total"],
+                call["mean"] * 1000,
+                call["max"] * 1000,
+                call["bytes_in"],
+                call["bytes_out"],
+            )
+        )
+    if stats["caches"]:
+        lines.append("")
+        lines.append("{:<48} {:>7} {:>7} {:>9}".format("cache", "hits", "misses", "hit rate"))
+        for name, cache in sorted(stats["caches"].items()):
+            lines.append(
+                "{:<48} {:>7} {:>7} {:>8.1%}".format(
+                    name[:48], cache["hits"], cache["misses"], cache["hit_rate"]
+                )
+            )
+    return "\n".join(lines)
+
+
+def log_summary():
+    """Log the summary of the statistics."""
+    logging.info("Juju call profile:\n%s", format_summary())
+
+
+def export_json(path):
+    """Write the statistics to a JSON file, to compare runs.
+
+    :param path: The file to write
+    :type path: str
+    """
+    with open(path, "w") as f:
+        json.dump(get_stats(), f, indent=2, sort_keys=True)
+
+
+@contextlib.contextmanager
+def profiling(rpc=True):
+    """Enable instrumentation for the duration of the block.
+
+    :param rpc: Also record the individual Juju API calls.
+    :type rpc: bool
+    """
+    enable(rpc=rpc)
+    try:
+        yield
+    finally:
+        disable()
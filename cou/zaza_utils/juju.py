@@ -24,7 +24,7 @@ import yaml
 from cou.zaza_utils import controller
 from cou.zaza_utils import exceptions as cou_exceptions
 from cou.zaza_utils import generic as generic_utils
-from cou.zaza_utils import model
+from cou.zaza_utils import model, probe_cache
 
 KUBERNETES_PROVIDER_NAME = "kubernetes"
 
@@ -191,7 +191,7 @@ def get_unit_name_from_host_name(host_name, application_name, model_name=None):
         # display_name should be present in maas deploys
         for _no in status.machines.keys():
             machine = status.machines.get(_no)
-            if machine.display_name.split(".")[0] == host_name.split(".")[0]:
+            if (machine.display_name or "").split(".")[0] == host_name.split(".")[0]:
                 machine_number = int(_no)
         # If no match was found try and extract machine number from host_name.
         # This is probably a non-maas deploy.
@@ -402,6 +402,9 @@ def get_relation_from_unit(entity, remote_entity, remote_interface_name, model_n
 def leader_get(application, key="", model_name=None):
     """Get leader settings from leader unit of named application.
 
+    The settings are reused for probe_cache.TTL seconds, see
+    model.async_run_on_leader().
+
     :param application: Application to get leader settings from.
     :type application: str
     :param model_name: Name of model to query.
@@ -411,7 +414,7 @@ def leader_get(application, key="", model_name=None):
     :raises: model.CommandRunFailed
     """
     cmd = "leader-get --format=yaml {}".format(key)
-    result = model.run_on_leader(application, cmd, model_name=model_name)
+    result = model.run_on_leader(application, cmd, model_name=model_name, max_age=probe_cache.TTL)
     if result and int(result.get("Code")) == 0:
         return yaml.safe_load(result.get("Stdout"))
     else:
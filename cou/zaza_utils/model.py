@@ -24,15 +24,22 @@ import asyncio
 import collections
 import concurrent
 import datetime
+import hashlib
 import inspect
+import json
 import logging
+import operator
 import os
 import re
-import subprocess
 import tempfile
+import threading
 import time
+import weakref
 
 import juju.client
+import juju.client.client
+import juju.constraints
+import juju.tag
 import yaml
 from juju.errors import JujuError
 from juju.model import Model
@@ -40,7 +47,8 @@ from oslo_config import cfg
 
 import cou.zaza_utils.exceptions as cou_exceptions
 import cou.zaza_utils.generic as generic_utils
-from cou.zaza_utils import sync_wrapper
+import cou.zaza_utils.status as status_utils
+from cou.zaza_utils import instrumentation, probe_cache, progress, sync_wrapper
 
 # Default for the Juju MAX_FRAME_SIZE to be 256MB to stop
 # "RPC: Connection closed, reconnecting" errors and then a failure in the log.
@@ -49,6 +57,9 @@ JUJU_MAX_FRAME_SIZE = 2**30
 
 APPS_LEFT_INTERVAL = 600
 
+# Messages of units which are ready, see async_wait_for_application_states()
+APPROVED_MESSAGE_PREFIXES = ("ready", "Ready", "Unit is ready")
+
 CURRENT_MODEL = None
 MODEL_ALIASES = {}
 
@@ -216,6 +227,7 @@ async def get_model_memo(model_name):
     model = None
     if model_name in ModelRefs:
         model = ModelRefs[model_name]
+        instrumentation.record_cache("model_memo", not is_model_disconnected(model))
         if is_model_disconnected(model):
             try:
                 await model.disconnect()
@@ -223,13 +235,16 @@ async def get_model_memo(model_name):
                 pass
             model = None
             del ModelRefs[model_name]
+    else:
+        instrumentation.record_cache("model_memo", False)
     if model is None:
         # NOTE(tinwood): Due to
         # https://github.com/juju/python-libjuju/issues/458 set the max frame
         # size to something big to stop "RPC: Connection closed, reconnecting"
         # messages and then failures.
         model = Model(max_frame_size=JUJU_MAX_FRAME_SIZE)
-        await model.connect(model_name)
+        with instrumentation.timed("model_connect"):
+            await model.connect(model_name)
         ModelRefs[model_name] = model
     return model
 
@@ -515,9 +530,25 @@ def _normalise_action_results(results):
         return {}
 
 
-async def async_run_on_unit(unit_name, command, model_name=None, timeout=None):
+def _results_size(results):
+    """Return the number of bytes of output in normalised action results.
+
+    :param results: Results from _normalise_action_results()
+    :type results: Dict[str, str]
+    :returns: size of stdout and stderr
+    :rtype: int
+    """
+    return len(results.get("Stdout") or "") + len(results.get("Stderr") or "")
+
+
+async def async_run_on_unit(unit_name, command, model_name=None, timeout=None, max_age=None):
     """Juju run on unit.
 
+    If max_age is set, the command is a read-only probe: its result is cached
+    and a cached result no older than max_age seconds is returned instead of
+    running it again, see cou.zaza_utils.probe_cache.  Otherwise the command
+    may change the unit, so the cached probe results of the unit are dropped.
+
     :param model_name: Name of model unit is in
     :type model_name: str
     :param unit_name: Name of unit to match
@@ -526,22 +557,43 @@ async def async_run_on_unit(unit_name, command, model_name=None, timeout=None):
     :type command: str
     :param timeout: How long in seconds to wait for command to complete
     :type timeout: int
+    :param max_age: The maximum age of a cached result, in seconds
+    :type max_age: Optional[float]
     :returns: action.data['results'] {'Code': '', 'Stderr': '', 'Stdout': ''}
     :rtype: dict
     """
+    if max_age is not None:
+        cached = probe_cache.get(unit_name, command, model_name=model_name, max_age=max_age)
+        if cached is not None:
+            return cached
     model = await get_model(model_name)
     unit = await async_get_unit_from_name(unit_name, model)
-    action = await unit.run(command, timeout=timeout)
-    results = action.data.get("results")
-    return _normalise_action_results(results)
+    try:
+        with instrumentation.timed("run_on_unit") as timer:
+            action = await unit.run(command, timeout=timeout)
+            results = _normalise_action_results(action.data.get("results"))
+            timer.bytes_out = len(command)
+            timer.bytes_in = _results_size(results)
+    finally:
+        if max_age is None:
+            probe_cache.invalidate(units=[unit_name])
+    if max_age:
+        probe_cache.put(unit_name, command, results, model_name=model_name)
+    return results
 
 
 run_on_unit = sync_wrapper(async_run_on_unit)
 
 
-async def async_run_on_leader(application_name, command, model_name=None, timeout=None):
+async def async_run_on_leader(
+    application_name, command, model_name=None, timeout=None, max_age=None
+):
     """Juju run on leader unit.
 
+    If max_age is set, the command is a read-only probe, whose result is
+    cached, otherwise the cached probe results of the application are dropped;
+    see async_run_on_unit().
+
     :param application_name: Application to match
     :type application_name: str
     :param command: Command to execute
@@ -550,6 +602,8 @@ async def async_run_on_leader(application_name, command, model_name=None, timeou
     :type model_name: str
     :param timeout: How long in seconds to wait for command to complete
     :type timeout: int
+    :param max_age: The maximum age of a cached result, in seconds
+    :type max_age: Optional[float]
     :returns: action.data['results'] {'Code': '', 'Stderr': '', 'Stdout': ''}
     :rtype: dict
     """
@@ -557,17 +611,442 @@ async def async_run_on_leader(application_name, command, model_name=None, timeou
     for unit in model.applications[application_name].units:
         is_leader = await unit.is_leader_from_status()
         if is_leader:
-            action = await unit.run(command, timeout=timeout)
-            results = action.data.get("results")
-            return _normalise_action_results(results)
+            if max_age is not None:
+                cached = probe_cache.get(
+                    unit.entity_id, command, model_name=model_name, max_age=max_age
+                )
+                if cached is not None:
+                    return cached
+            try:
+                with instrumentation.timed("run_on_leader") as timer:
+                    action = await unit.run(command, timeout=timeout)
+                    results = _normalise_action_results(action.data.get("results"))
+                    timer.bytes_out = len(command)
+                    timer.bytes_in = _results_size(results)
+            finally:
+                if max_age is None:
+                    probe_cache.invalidate(applications=[application_name])
+            if max_age:
+                probe_cache.put(unit.entity_id, command, results, model_name=model_name)
+            return results
 
 
 run_on_leader = sync_wrapper(async_run_on_leader)
 
 
+def _receiver_name(tag):
+    """Return the name of the unit or machine an action ran on.
+
+    :param tag: The tag of the receiver, e.g. unit-nova-compute-0 or
+        machine-1-lxd-0
+    :type tag: str
+    :returns: The unit name or machine id, e.g. nova-compute/0 or 1/lxd/0
+    :rtype: str
+    """
+    if tag.startswith("unit-"):
+        application, _, number = juju.tag.untag("unit-", tag).rpartition("-")
+        return "{}/{}".format(application, number)
+    return juju.tag.untag("machine-", tag).replace("-", "/")
+
+
+async def async_run_on_units(
+    command,
+    application_name=None,
+    units=None,
+    machines=None,
+    model_name=None,
+    timeout=None,
+    max_age=None,
+):
+    """Juju run on all the units of an application, or on units or machines.
+
+    The command is run everywhere with a single call to the controller, like
+    `juju run --application`, instead of a call per unit.
+
+    If max_age is set, the command is a read-only probe: the result of each
+    unit is cached and, when only run on units, the units with a cached result
+    no older than max_age seconds aren't run on again.  Otherwise the cached
+    probe results of the units (and application) are dropped, or all of them
+    when run on machines; see cou.zaza_utils.probe_cache.
+
+    :param command: Command to execute
+    :type command: str
+    :param application_name: Run on all the units of the application
+    :type application_name: Optional[str]
+    :param units: Names of the units to run on
+    :type units: Optional[Iterable[str]]
+    :param machines: Ids of the machines to run on
+    :type machines: Optional[Iterable[str]]
+    :param model_name: Name of model the units are in
+    :type model_name: str
+    :param timeout: How long in seconds to wait for command to complete
+    :type timeout: int
+    :param max_age: The maximum age of a cached result, in seconds
+    :type max_age: Optional[float]
+    :returns: The results of each unit (or machine), keyed by unit name (or
+        machine id), e.g. {'app/0': {'Code': '', 'Stderr': '', 'Stdout': ''}}
+    :rtype: Dict[str, dict]
+    :raises: ValueError if there is nothing to run on, JujuError if the
+        command couldn't be run
+    """
+    applications = [application_name] if application_name else []
+    units = list(units or [])
+    machines = list(machines or [])
+    if not (applications or units or machines):
+        raise ValueError("Must be called with an application, units or machines")
+    cached = {}
+    if max_age is not None and not (applications or machines):
+        for unit_name in units:
+            result = probe_cache.get(unit_name, command, model_name=model_name, max_age=max_age)
+            if result is not None:
+                cached[unit_name] = result
+        units = [unit_name for unit_name in units if unit_name not in cached]
+        if not units:
+            return cached
+    try:
+        results = await _async_run_on_units(
+            command, applications, units, machines, model_name, timeout
+        )
+    finally:
+        if max_age is None and machines:
+            probe_cache.invalidate()
+        elif max_age is None:
+            probe_cache.invalidate(units=units, applications=applications)
+    if max_age and not machines:
+        for unit_name, result in results.items():
+            probe_cache.put(unit_name, command, result, model_name=model_name)
+    cached.update(results)
+    return cached
+
+
+async def _async_run_on_units(command, applications, units, machines, model_name, timeout):
+    """Make the call of async_run_on_units(), see there."""
+    model = await get_model(model_name)
+    facade = juju.client.client.ActionFacade.from_connection(model.connection())
+    if timeout:
+        # Convert seconds to nanoseconds
+        timeout = int(timeout * 1000000000)
+    with instrumentation.timed("run_on_units") as timer:
+        response = await facade.Run(
+            applications=applications,
+            commands=command,
+            machines=machines,
+            timeout=timeout,
+            units=units,
+        )
+        _check_error_results(response, "run `{}`".format(command))
+        actions = await asyncio.gather(
+            *(model.wait_for_action(result.action.tag) for result in response.results)
+        )
+        results = {
+            _receiver_name(result.action.receiver): _normalise_action_results(
+                action.data.get("results")
+            )
+            for result, action in zip(response.results, actions)
+        }
+        timer.bytes_out = len(command)
+        timer.bytes_in = sum(_results_size(result) for result in results.values())
+    return results
+
+
+run_on_units = sync_wrapper(async_run_on_units)
+
+
+async def async_get_unit_machines(unit_names, model_name=None):
+    """Return the machine each unit is on.
+
+    Subordinate units are on the machine of their principal unit.
+
+    :param unit_names: The units
+    :type unit_names: Iterable[str]
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :returns: The machine id of each unit found in the status
+    :rtype: Dict[str, str]
+    """
+    unit_names = list(unit_names)
+    # the placement of the units doesn't change, a cached status will do
+    status = await async_get_status(
+        model_name,
+        refresh=False,
+        filters=sorted({unit_name.split("/")[0] for unit_name in unit_names}),
+    )
+    machines = {}
+    for app_status in status.applications.values():
+        for unit_name, unit_status in (app_status["units"] or {}).items():
+            machines[unit_name] = unit_status["machine"]
+            for subordinate in unit_status.get("subordinates") or {}:
+                machines[subordinate] = unit_status["machine"]
+    return {unit_name: machines[unit_name] for unit_name in unit_names if unit_name in machines}
+
+
+get_unit_machines = sync_wrapper(async_get_unit_machines)
+
+
+async def async_get_units_by_machine(unit_names, model_name=None):
+    """Group units by the machine they are on.
+
+    On hyperconverged nodes, e.g. nova-compute and ceph-osd units with their
+    subordinates, many units share a machine.  Operations on the machine
+    rather than on the unit (e.g. reading the clock or the installed
+    packages) only need to run once for all of them.
+
+    :param unit_names: The units
+    :type unit_names: Iterable[str]
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :returns: The units on each machine, in the order of unit_names.  A unit
+        that isn't in the status is in a group of its own, keyed by its name.
+    :rtype: Dict[str, List[str]]
+    """
+    unit_names = list(unit_names)
+    machines = await async_get_unit_machines(unit_names, model_name=model_name)
+    groups = {}
+    for unit_name in unit_names:
+        groups.setdefault(machines.get(unit_name, unit_name), []).append(unit_name)
+    return groups
+
+
+get_units_by_machine = sync_wrapper(async_get_units_by_machine)
+
+
+async def async_run_on_unit_machines(
+    unit_names, command, model_name=None, timeout=None, max_age=None
+):
+    """Juju run a machine scoped command once on each machine of the units.
+
+    The command runs on a single unit of each machine, and its results are
+    shared by all the units on that machine.  All the machines are run on
+    with a single call to the controller, see async_run_on_units(), which
+    also describes max_age.
+
+    :param unit_names: The units
+    :type unit_names: Iterable[str]
+    :param command: Command to execute
+    :type command: str
+    :param model_name: Name of model the units are in
+    :type model_name: str
+    :param timeout: How long in seconds to wait for command to complete
+    :type timeout: int
+    :param max_age: The maximum age of a cached result, in seconds
+    :type max_age: Optional[float]
+    :returns: The results of each unit, keyed by unit name, e.g.
+        {'app/0': {'Code': '', 'Stderr': '', 'Stdout': ''}}
+    :rtype: Dict[str, dict]
+    """
+    groups = await async_get_units_by_machine(unit_names, model_name=model_name)
+    if not groups:
+        return {}
+    results = await async_run_on_units(
+        command,
+        units=[units[0] for units in groups.values()],
+        model_name=model_name,
+        timeout=timeout,
+        max_age=max_age,
+    )
+    return {unit_name: results[units[0]] for units in groups.values() for unit_name in units}
+
+
+run_on_unit_machines = sync_wrapper(async_run_on_unit_machines)
+
+
+# How old, in seconds, the clock offset of a machine gets before it is
+# refreshed in the background, and before it is measured again before use.
+CLOCK_OFFSET_REFRESH = 300.0
+CLOCK_OFFSET_MAX_AGE = 3600.0
+
+
+class ClockOffset(collections.namedtuple("ClockOffset", ["offset", "rtt", "time"])):
+    """The clock offset of a machine, see async_get_clock_offsets().
+
+    offset is how far (in seconds) the clock of the machine is ahead of the
+    local clock, rtt how long the measurement took, which bounds its error,
+    and time when it was measured (time.monotonic()).
+    """
+
+    __slots__ = ()
+
+    def unit_time(self, local_time=None):
+        """Return the time on the machine, computed from the local time.
+
+        The clock of the machine was read at some point of the measurement, so
+        this is the earliest time that it can show: a service restarted after
+        it was returned has a later start time.
+
+        :param local_time: The local time, default is now
+        :type local_time: Optional[float]
+        :returns: time in seconds since Epoch on the machine
+        :rtype: float
+        """
+        if local_time is None:
+            local_time = time.time()
+        return local_time + self.offset - self.rtt / 2
+
+
+# A map of (model name, machine id) <-> the ClockOffset of the machine.
+_CLOCK_OFFSETS = {}
+# The (model name, machine id) keys being refreshed in the background.
+_CLOCK_OFFSETS_REFRESHING = set()
+_CLOCK_OFFSETS_LOCK = threading.Lock()
+# Keep a reference to the background refreshes, so they aren't collected.
+_CLOCK_OFFSETS_TASKS = set()
+
+
+def invalidate_clock_offsets(model_name=None, machines=None):
+    """Drop the measured clock offsets of the machines of a model.
+
+    The offsets have to be dropped whenever the clock of a machine may have
+    been stepped, e.g. by NTP after a reboot or a series upgrade.  The
+    containers of a machine share its clock, so theirs are dropped too.
+
+    :param model_name: Name of model.
+    :type model_name: str
+    :param machines: Ids of the machines, default is all the machines
+    :type machines: Optional[Iterable[str]]
+    """
+    prefixes = None if machines is None else tuple("{}/".format(m) for m in machines)
+    with _CLOCK_OFFSETS_LOCK:
+        for key in list(_CLOCK_OFFSETS):
+            if key[0] != str(model_name):
+                continue
+            if prefixes is None or "{}/".format(key[1]).startswith(prefixes):
+                del _CLOCK_OFFSETS[key]
+
+
+async def _async_measure_clock_offsets(groups, model_name=None, timeout=None):
+    """Measure the clock offset of machines.
+
+    The clocks of all the machines are read with a single call, and the
+    offset is taken from the middle of the call, like NTP does.
+
+    :param groups: The units of each machine, see async_get_units_by_machine()
+    :type groups: Dict[str, List[str]]
+    :param model_name: Name of model the units are in
+    :type model_name: str
+    :param timeout: How long in seconds to wait for the clocks to be read
+    :type timeout: int
+    :returns: The offset of each machine
+    :rtype: Dict[str, ClockOffset]
+    :raises: ValueError if the clock of a machine couldn't be read
+    """
+    start = time.time()
+    results = await async_run_on_units(
+        "date +%s.%N",
+        units=[units[0] for units in groups.values()],
+        model_name=model_name,
+        timeout=timeout,
+        max_age=0,
+    )
+    end = time.time()
+    measured = time.monotonic()
+    offsets = {
+        machine: ClockOffset(
+            float(results.get(units[0], {}).get("Stdout", "")) - (start + end) / 2,
+            end - start,
+            measured,
+        )
+        for machine, units in groups.items()
+    }
+    with _CLOCK_OFFSETS_LOCK:
+        _CLOCK_OFFSETS.update(
+            ((str(model_name), machine), offset) for machine, offset in offsets.items()
+        )
+    return offsets
+
+
+async def _async_refresh_clock_offsets(groups, model_name=None, timeout=None):
+    """Measure the clock offset of machines, logging rather than raising errors.
+
+    See _async_measure_clock_offsets() for the parameters.
+    """
+    try:
+        await _async_measure_clock_offsets(groups, model_name=model_name, timeout=timeout)
+    except Exception as e:
+        logging.warning(
+            "Unable to refresh the clock offset of machines {}: {}".format(sorted(groups), e)
+        )
+    finally:
+        with _CLOCK_OFFSETS_LOCK:
+            _CLOCK_OFFSETS_REFRESHING.difference_update(
+                (str(model_name), machine) for machine in groups
+            )
+
+
+def _refresh_clock_offsets_in_background(groups, model_name=None, timeout=None):
+    """Refresh the clock offset of machines, unless it is already being done.
+
+    See _async_measure_clock_offsets() for the parameters.
+    """
+    with _CLOCK_OFFSETS_LOCK:
+        groups = {
+            machine: units
+            for machine, units in groups.items()
+            if (str(model_name), machine) not in _CLOCK_OFFSETS_REFRESHING
+        }
+        _CLOCK_OFFSETS_REFRESHING.update((str(model_name), machine) for machine in groups)
+    if not groups:
+        return
+    task = asyncio.get_running_loop().create_task(
+        _async_refresh_clock_offsets(groups, model_name=model_name, timeout=timeout)
+    )
+    _CLOCK_OFFSETS_TASKS.add(task)
+    task.add_done_callback(_CLOCK_OFFSETS_TASKS.discard)
+
+
+async def async_get_clock_offsets(unit_names, model_name=None, timeout=None):
+    """Return the clock offset of the machine of each unit.
+
+    The offset of a machine is measured once (all the machines with a single
+    call), and then reused, so that the time on a unit can be computed
+    locally, see ClockOffset.unit_time().  An offset older than
+    CLOCK_OFFSET_REFRESH seconds is refreshed in the background, while the
+    current one is returned; one older than CLOCK_OFFSET_MAX_AGE seconds is
+    measured again first.
+
+    :param unit_names: Names of the units
+    :type unit_names: Iterable[str]
+    :param model_name: Name of model the units are in
+    :type model_name: str
+    :param timeout: How long in seconds to wait for the clocks to be read
+    :type timeout: int
+    :returns: The offset of the machine of each unit, keyed by unit name
+    :rtype: Dict[str, ClockOffset]
+    :raises: ValueError if the clock of a machine couldn't be read
+    """
+    groups = await async_get_units_by_machine(unit_names, model_name=model_name)
+    now = time.monotonic()
+    with _CLOCK_OFFSETS_LOCK:
+        offsets = {machine: _CLOCK_OFFSETS.get((str(model_name), machine)) for machine in groups}
+    expired = {
+        machine: groups[machine]
+        for machine, offset in offsets.items()
+        if offset is None or now - offset.time > CLOCK_OFFSET_MAX_AGE
+    }
+    if expired:
+        offsets.update(
+            await _async_measure_clock_offsets(expired, model_name=model_name, timeout=timeout)
+        )
+    stale = {
+        machine: groups[machine]
+        for machine, offset in offsets.items()
+        if now - offset.time > CLOCK_OFFSET_REFRESH
+    }
+    if stale:
+        _refresh_clock_offsets_in_background(stale, model_name=model_name, timeout=timeout)
+    return {
+        unit_name: offsets[machine] for machine, units in groups.items() for unit_name in units
+    }
+
+
+get_clock_offsets = sync_wrapper(async_get_clock_offsets)
+
+
 async def async_get_unit_time(unit_name, model_name=None, timeout=None):
     """Get the current time (in seconds since Epoch) on the given unit.
 
+    The time is computed from the clock offset of the machine of the unit,
+    without a call to the unit, see async_get_clock_offsets().
+
     :param model_name: Name of model to query.
     :type model_name: str
     :param unit_name: Name of unit to run action on
@@ -575,15 +1054,33 @@ async def async_get_unit_time(unit_name, model_name=None, timeout=None):
     :returns: time in seconds since Epoch on unit
     :rtype: int
     """
-    out = await async_run_on_unit(
-        unit_name=unit_name, command="date +'%s'", model_name=model_name, timeout=timeout
-    )
-    return int(out["Stdout"])
+    offsets = await async_get_clock_offsets([unit_name], model_name=model_name, timeout=timeout)
+    return int(offsets[unit_name].unit_time())
 
 
 get_unit_time = sync_wrapper(async_get_unit_time)
 
 
+async def async_get_units_time(unit_names, model_name=None, timeout=None):
+    """Get the current time (in seconds since Epoch) on the given units.
+
+    See async_get_unit_time().
+
+    :param unit_names: Names of the units
+    :type unit_names: Iterable[str]
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :returns: time in seconds since Epoch on each unit
+    :rtype: Dict[str, int]
+    """
+    offsets = await async_get_clock_offsets(unit_names, model_name=model_name, timeout=timeout)
+    now = time.time()
+    return {unit_name: int(offset.unit_time(now)) for unit_name, offset in offsets.items()}
+
+
+get_units_time = sync_wrapper(async_get_units_time)
+
+
 async def async_get_systemd_service_active_time(unit_name, service, model_name=None, timeout=None):
     r"""Return the time that the given service was last active.
 
@@ -591,6 +1088,8 @@ async def async_get_systemd_service_active_time(unit_name, service, model_name=N
           relates to the last time the systemd service entered an 'active'
           state.
 
+    The result is reused for probe_cache.TTL seconds, see async_run_on_unit().
+
     :param unit_name: Name of unit to run action on
     :type unit_name: str
     :param service: Name of service to check active time
@@ -602,7 +1101,11 @@ async def async_get_systemd_service_active_time(unit_name, service, model_name=N
     """
     cmd = "systemctl show {} --property=ActiveEnterTimestamp".format(service)
     out = await async_run_on_unit(
-        unit_name=unit_name, command=cmd, model_name=model_name, timeout=timeout
+        unit_name=unit_name,
+        command=cmd,
+        model_name=model_name,
+        timeout=timeout,
+        max_age=probe_cache.TTL,
     )
     str_time = out["Stdout"].rstrip().replace("ActiveEnterTimestamp=", "")
     start_time = datetime.datetime.strptime(str_time, "%a %Y-%m-%d %H:%M:%S %Z")
@@ -620,6 +1123,7 @@ async def async_get_unit_service_start_time(
     Return the time (in seconds since Epoch) that the oldest process of the
     given service was started on the given unit. If the service is not running
     raise ServiceNotRunning exception.
+    The result is reused for probe_cache.TTL seconds, see async_run_on_unit().
 
     If pgrep_full is True  ensure that any special characters in the name of
     the service are escaped e.g.
@@ -654,7 +1158,11 @@ async def async_get_unit_service_start_time(
             " head -1"
         )
     out = await async_run_on_unit(
-        unit_name=unit_name, command=cmd, model_name=model_name, timeout=timeout
+        unit_name=unit_name,
+        command=cmd,
+        model_name=model_name,
+        timeout=timeout,
+        max_age=probe_cache.TTL,
     )
     out = out["Stdout"].strip()
     if out:
@@ -911,7 +1419,9 @@ async def async_reset_application_config(application_name, config_keys, model_na
     :type config_keys: List[str]
     """
     model = await get_model(model_name)
-    return await model.applications[application_name].reset_config(config_keys)
+    result = await model.applications[application_name].reset_config(config_keys)
+    probe_cache.invalidate(applications=[application_name])
+    return result
 
 
 reset_application_config = sync_wrapper(async_reset_application_config)
@@ -932,19 +1442,139 @@ async def async_set_application_config(application_name, configuration, model_na
     :type configuration: Dict[str,str]
     """
     model = await get_model(model_name)
-    return await model.applications[application_name].set_config(configuration)
+    result = await model.applications[application_name].set_config(configuration)
+    probe_cache.invalidate(applications=[application_name])
+    return result
 
 
 set_application_config = sync_wrapper(async_set_application_config)
 
 
-# A map of model names <-> last time get_status was called, and the result of
-# that call.
+# A map of status keys <-> last time get_status was called, and the result of
+# that call.  The key of the full status of a model is its name, the key of a
+# filtered status is a (model name, filters) tuple, see _status_key().
 _GET_STATUS_TIMES = {}
+# A map of status keys <-> the future of the get_status call in flight, if any.
+_GET_STATUS_IN_FLIGHT = {}
+# A map of model names <-> the lock guarding the two maps above.
+_GET_STATUS_LOCKS = {}
 StatusResult = collections.namedtuple("StatusResult", ["time", "result"])
 
 
-async def async_get_status(model_name=None, interval=4.0, refresh=True):
+def get_status_lock(model_name=None):
+    """Return the lock guarding the cached status of a model.
+
+    This is a threading lock, so it can be held from the sync side (e.g. by a
+    sync_wrapper caller) as well as from the libjuju thread.  It is only held
+    for short, non-blocking sections and never across an await.
+
+    :param model_name: Name of model.
+    :type model_name: str
+    :returns: The lock
+    :rtype: threading.Lock
+    """
+    key = str(model_name)
+    try:
+        return _GET_STATUS_LOCKS[key]
+    except KeyError:
+        # setdefault is atomic, so racing threads all get the same lock
+        return _GET_STATUS_LOCKS.setdefault(key, threading.Lock())
+
+
+def invalidate_status_cache(model_name=None):
+    """Drop the cached status of a model.
+
+    The next call to async_get_status fetches the status from Juju.  A call
+    that is already in flight may return a status from before the
+    invalidation to the callers already waiting on it, but later callers
+    don't join it and its result isn't cached.
+
+    :param model_name: Name of model.
+    :type model_name: str
+    """
+    with get_status_lock(model_name):
+        for cache in (_GET_STATUS_TIMES, _GET_STATUS_IN_FLIGHT):
+            for key in list(cache):
+                if key == str(model_name) or (
+                    isinstance(key, tuple) and key[0] == str(model_name)
+                ):
+                    del cache[key]
+
+
+def _status_key(model_name, filters):
+    """Return the key that a (filtered) status is cached under.
+
+    :param model_name: Name of model.
+    :type model_name: str
+    :param filters: Application or unit names the status is filtered on.
+    :type filters: Optional[Iterable[str]]
+    :returns: The key
+    :rtype: Union[str, Tuple[str, Tuple[str, ...]]]
+    """
+    if not filters:
+        return str(model_name)
+    return (str(model_name), tuple(sorted(set(filters))))
+
+
+async def _async_refresh_status(model_name, key):
+    """Fetch the status of a model, sharing the call with concurrent callers.
+
+    The first caller fetches the status, any caller arriving while that fetch
+    is in flight (on the same event loop) awaits its result instead.
+
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :param key: The key of the status, as returned by _status_key()
+    :type key: Union[str, Tuple[str, Tuple[str, ...]]]
+    :returns: juju status, see cou.zaza_utils.status
+    :rtype: cou.zaza_utils.status.ModelStatus
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        with get_status_lock(model_name):
+            in_flight = _GET_STATUS_IN_FLIGHT.get(key)
+            if in_flight is None or in_flight.done() or in_flight.get_loop() is not loop:
+                in_flight = _GET_STATUS_IN_FLIGHT[key] = loop.create_future()
+                break
+        instrumentation.record_cache("status", True)
+        try:
+            # shield, so that a cancelled caller doesn't cancel the others
+            return await asyncio.shield(in_flight)
+        except asyncio.CancelledError:
+            if not in_flight.cancelled():
+                raise
+            # the caller that owned the call was cancelled, so try again
+
+    try:
+        model = await get_model(model_name)
+        instrumentation.record_cache("status", False)
+        filters = list(key[1]) if isinstance(key, tuple) else None
+        with instrumentation.timed("get_status"):
+            full_status = await model.get_status(filters=filters)
+        status = StatusResult(time.time(), status_utils.compact_status(full_status))
+        with get_status_lock(model_name):
+            # unless the cache was invalidated while the call was in flight
+            if _GET_STATUS_IN_FLIGHT.get(key) is in_flight:
+                _GET_STATUS_TIMES[key] = status
+        in_flight.set_result(status.result)
+        return status.result
+    except asyncio.CancelledError:
+        in_flight.cancel()
+        raise
+    except Exception as e:
+        in_flight.set_exception(e)
+        # mark the exception as retrieved, the caller gets it raised anyway
+        in_flight.exception()
+        raise
+    finally:
+        with get_status_lock(model_name):
+            if _GET_STATUS_IN_FLIGHT.get(key) is in_flight:
+                del _GET_STATUS_IN_FLIGHT[key]
+
+
+async def async_get_status(
+    model_name=None, interval=4.0, refresh=True, max_age=None, filters=None
+):
     """Return the full status, but share calls between different asyncs.
 
     Return the full status for the model_name (current model is None), but no
@@ -953,13 +1583,23 @@ async def async_get_status(model_name=None, interval=4.0, refresh=True):
     returns the refreshed status.  This is the default.  If refresh is False,
     then the function immediately returns with the cached information.
 
+    If max_age is set, a cached status that is no older than max_age seconds
+    is returned immediately, and an older one is refreshed straight away.
+    This lets each call site pick how fresh the status needs to be.
+
+    If filters is set, only the status of those applications and units (and
+    of the machines they are on) is fetched.  Each set of filters is cached
+    separately, so a wait on a single application doesn't download the status
+    of every unit of the model.
+
+    The status is cached in its compact representation, see
+    cou.zaza_utils.status.
+
     This is to enable multiple co-routines to access the status information
     without making multiple calls to Juju which all essentially will return
-    identical information.
-
-    Note that this is NOT thread-safe, but is async safe.  i.e. multiple
-    different co-operating async futures can call this (in the same thread) and
-    all access the same status.
+    identical information.  Concurrent callers that need a refresh share a
+    single call to Juju.  The cache is guarded by get_status_lock(), so it can
+    also be read or invalidated from other threads.
 
     :param model_name: Name of model to query.
     :type model_name: str
@@ -967,28 +1607,27 @@ async def async_get_status(model_name=None, interval=4.0, refresh=True):
     :type interval: float
     :param refresh: Force a refresh; do not used cached results
     :type refresh: bool
-    :returns: dictionary of juju status
-    :rtype: dict
+    :param max_age: The maximum age of a cached status, in seconds
+    :type max_age: Optional[float]
+    :param filters: Application or unit names to filter the status on
+    :type filters: Optional[Iterable[str]]
+    :returns: juju status, see cou.zaza_utils.status
+    :rtype: cou.zaza_utils.status.ModelStatus
     """
-    key = str(model_name)
-    model = None
-
-    async def _update_status_result(key):
-        nonlocal model
-        if model is None:
-            model = await get_model(model_name)
-        status = StatusResult(time.time(), await model.get_status())
-        _GET_STATUS_TIMES[key] = status
-        return status.result
-
-    try:
-        last = _GET_STATUS_TIMES[key]
-    except KeyError:
-        return await _update_status_result(key)
+    key = _status_key(model_name, filters)
+    with get_status_lock(model_name):
+        last = _GET_STATUS_TIMES.get(key)
+    if last is None:
+        return await _async_refresh_status(model_name, key)
     now = time.time()
+    if max_age is not None:
+        if now - last.time <= max_age:
+            instrumentation.record_cache("status", True)
+            return last.result
+        return await _async_refresh_status(model_name, key)
     if last.time + interval <= now:
         # we need to refresh the status time, so let's do that.
-        return await _update_status_result(key)
+        return await _async_refresh_status(model_name, key)
     # otherwise, if we need a refreshed version, then we have to wait;
     if refresh:
         # wait until the min interval is exceeded, and then grab a copy.
@@ -996,14 +1635,53 @@ async def async_get_status(model_name=None, interval=4.0, refresh=True):
         # now get the status.
         # By passing refresh=False, this WILL return a cached status if another
         # co-routine has already refreshed it.
-        return await async_get_status(model_name, interval, refresh=False)
+        return await async_get_status(model_name, interval, refresh=False, filters=filters)
     # Not refreshing, so return the cached version
+    instrumentation.record_cache("status", True)
     return last.result
 
 
 get_status = sync_wrapper(async_get_status)
 
 
+async def async_get_model_fingerprint(model_name=None):
+    """Return a fingerprint of the deployed applications of a model.
+
+    The fingerprint covers the model UUID and, for each application, its charm
+    URL (which includes the revision), unit count and config values.  It
+    changes whenever any of these do, so it can be used as a cache key for
+    anything derived from them.  It costs one status call plus the config
+    calls for all the applications, which are made concurrently.
+
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :returns: hex digest of the fingerprint
+    :rtype: str
+    """
+    model = await get_model(model_name)
+    status = await async_get_status(model_name=model_name)
+    app_names = sorted(app for app in status.applications if app in model.applications)
+    configs = await asyncio.gather(*(model.applications[app].get_config() for app in app_names))
+    applications = {}
+    for app, config in zip(app_names, configs):
+        app_status = status.applications[app]
+        applications[app] = {
+            "charm": app_status["charm"],
+            "units": len(app_status.get("units") or {}),
+            "config": {
+                key: option.get("value") if isinstance(option, dict) else option
+                for key, option in (config or {}).items()
+            },
+        }
+    fingerprint = {"model": model.info.uuid, "applications": applications}
+    return hashlib.sha256(
+        json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+get_model_fingerprint = sync_wrapper(async_get_model_fingerprint)
+
+
 class ActionFailed(Exception):
     """Exception raised when action fails."""
 
@@ -1062,8 +1740,10 @@ async def async_run_action(
 
     model = await get_model(model_name)
     unit = await async_get_unit_from_name(unit_name, model)
-    action_obj = await unit.run_action(action_name, **action_params)
-    await action_obj.wait()
+    with instrumentation.timed("run_action:{}".format(action_name)):
+        action_obj = await unit.run_action(action_name, **action_params)
+        await action_obj.wait()
+    probe_cache.invalidate(units=[unit_name])
     if raise_on_failure and action_obj.status != "completed":
         try:
             output = await model.get_action_output(action_obj.id)
@@ -1102,8 +1782,10 @@ async def async_run_action_on_leader(
     for unit in model.applications[application_name].units:
         is_leader = await unit.is_leader_from_status()
         if is_leader:
-            action_obj = await unit.run_action(action_name, **action_params)
-            await action_obj.wait()
+            with instrumentation.timed("run_action:{}".format(action_name)):
+                action_obj = await unit.run_action(action_name, **action_params)
+                await action_obj.wait()
+            probe_cache.invalidate(applications=[application_name])
             if raise_on_failure and action_obj.status != "completed":
                 try:
                     output = await model.get_action_output(action_obj.id)
@@ -1145,10 +1827,6 @@ async def async_run_action_on_units(
 
     model = await get_model(model_name)
     actions = []
-    for unit_name in units:
-        unit = await async_get_unit_from_name(unit_name, model)
-        action_obj = await unit.run_action(action_name, **action_params)
-        actions.append(action_obj)
 
     async def _check_actions():
         for action_obj in actions:
@@ -1156,7 +1834,14 @@ async def async_run_action_on_units(
                 return False
         return True
 
-    await async_block_until(_check_actions, timeout=timeout)
+    with instrumentation.timed("run_action_on_units:{}".format(action_name)):
+        for unit_name in units:
+            unit = await async_get_unit_from_name(unit_name, model)
+            action_obj = await unit.run_action(action_name, **action_params)
+            actions.append(action_obj)
+
+        await async_block_until(_check_actions, timeout=timeout)
+    probe_cache.invalidate(units=units)
 
     for action_obj in actions:
         if raise_on_failure and action_obj.status != "completed":
@@ -1243,12 +1928,152 @@ class CommandRunFailed(Exception):
         super(CommandRunFailed, self).__init__(msg)
 
 
+class ModelStateIndex(object):
+    """Units by workload status and machines by status, for one model.
+
+    The index is filled by scanning the model once, and then kept up to date
+    from the model deltas, so that looking up the (usually few) units or
+    machines in a given state doesn't scan the whole model.  It only keeps
+    names, the entities are looked up in the model (and their state checked
+    again) when they are queried, so a stale entry is never returned.
+    """
+
+    def __init__(self):
+        """Create an empty index."""
+        # workload status -> names of the units in that status
+        self.unit_names = collections.defaultdict(set)
+        # machine status -> ids of the machines in that status
+        self.machine_ids = collections.defaultdict(set)
+        self._unit_state = {}
+        self._machine_state = {}
+        # machine id -> number of units on the machine
+        self._machine_units = collections.Counter()
+
+    def scan(self, model):
+        """Index all the units and machines of the model.
+
+        :param model: The model to index
+        :type model: juju.model.Model
+        """
+        for unit in model.units.values():
+            self._update_unit(unit.entity_id, unit)
+        for machine in model.machines.values():
+            self._update_machine(machine.entity_id, machine)
+
+    def _update_unit(self, name, unit):
+        old_status, old_machine = self._unit_state.pop(name, (None, None))
+        if old_status is not None:
+            self.unit_names[old_status].discard(name)
+        if old_machine is not None:
+            self._machine_units[old_machine] -= 1
+        if unit is None:
+            return
+        # the id, rather than unit.machine, as the machine may not be in the
+        # model yet, and is then only indexed by its own (later) delta
+        state = (unit.workload_status, unit.safe_data.get("machine-id") or None)
+        self._unit_state[name] = state
+        self.unit_names[state[0]].add(name)
+        if state[1] is not None:
+            self._machine_units[state[1]] += 1
+
+    def _update_machine(self, machine_id, machine):
+        old_status = self._machine_state.pop(machine_id, None)
+        if old_status is not None:
+            self.machine_ids[old_status].discard(machine_id)
+        if machine is None:
+            return
+        self._machine_state[machine_id] = machine.status
+        self.machine_ids[machine.status].add(machine_id)
+
+    @staticmethod
+    def _live(old_obj, new_obj):
+        """Return the entity id, and the entity unless the delta removed it.
+
+        The new_obj of a remove delta is not None but a dead entity, whose
+        data can't be read any more (and which is falsy).
+        """
+        entity = old_obj if new_obj is None else new_obj
+        if new_obj is None or new_obj.dead:
+            return entity.entity_id, None
+        return entity.entity_id, new_obj
+
+    async def on_unit_change(self, delta, old_obj, new_obj, model):
+        """Update the index from a unit delta, see Model.add_observer."""
+        self._update_unit(*self._live(old_obj, new_obj))
+
+    async def on_machine_change(self, delta, old_obj, new_obj, model):
+        """Update the index from a machine delta, see Model.add_observer."""
+        self._update_machine(*self._live(old_obj, new_obj))
+
+    def units_in_state(self, model, state):
+        """Return the units of the model with a matching workload status.
+
+        :param model: The indexed model
+        :type model: juju.model.Model
+        :param state: The workload status
+        :type state: str
+        :returns: The units
+        :rtype: List[juju.unit.Unit]
+        """
+        units = (model.units.get(name) for name in self.unit_names.get(state, ()))
+        return [unit for unit in units if unit is not None and unit.workload_status == state]
+
+    def machines_in_state(self, model, states):
+        """Return the machines of the model, that host units, in one of states.
+
+        :param model: The indexed model
+        :type model: juju.model.Model
+        :param states: The machine statuses
+        :type states: List[str]
+        :returns: The machines
+        :rtype: List[juju.machine.Machine]
+        """
+        machines = []
+        for state in states:
+            for machine_id in self.machine_ids.get(state, ()):
+                machine = model.machines.get(machine_id)
+                if machine is not None and self._machine_units[machine_id] > 0:
+                    if machine.status == state:
+                        machines.append(machine)
+        return machines
+
+
+# The indexes of the models that are watched, see watch_model_state()
+_MODEL_STATE_INDEXES = weakref.WeakKeyDictionary()
+
+
+def watch_model_state(model):
+    """Keep an index of the units and machines of the model by state.
+
+    Once a model is watched, units_with_wl_status_state(),
+    machines_in_state() and check_model_for_hard_errors() use the index
+    rather than scanning the model.  Watching a model that is already watched
+    returns its index.
+
+    :param model: The model to watch
+    :type model: juju.model.Model
+    :returns: The index
+    :rtype: ModelStateIndex
+    """
+    index = _MODEL_STATE_INDEXES.get(model)
+    if index is None:
+        index = ModelStateIndex()
+        index.scan(model)
+        model.add_observer(index.on_unit_change, entity_type="unit")
+        model.add_observer(index.on_machine_change, entity_type="machine")
+        _MODEL_STATE_INDEXES[model] = index
+    return index
+
+
 def units_with_wl_status_state(model, state):
     """Return a list of unit which have a matching workload status.
 
     :returns: Units in error state
     :rtype: [juju.Unit, ...]
     """
+    index = _MODEL_STATE_INDEXES.get(model)
+    if index is not None:
+        return index.units_in_state(model, state)
     matching_units = []
     for unit in model.units.values():
         wl_status = unit.workload_status
@@ -1266,7 +2091,7 @@ async def async_resolve_units(
     :type application_name: str
     :param wait: Whether to wait for error state to have cleared.
     :type wait: bool
-    :param timeout: Seconds to wait for an individual units state to clear.
+    :param timeout: Seconds to wait for the state of all the units to clear.
     :type timeout: int
     :param erred_hook: Only resolve units that went into an error state when
                        running the specified hook.
@@ -1281,16 +2106,24 @@ async def async_resolve_units(
         erred_units = [u for u in erred_units if u.application == application_name]
     if erred_hook:
         erred_units = [u for u in erred_units if erred_hook in u.workload_status_message]
-    for u in erred_units:
-        logging.info("Resolving unit: {}".format(u.entity_id))
-        # Use u.resolved() when implemented in libjuju
-        cmd = ["juju", "resolved", "-m", model.info.name, u.entity_id]
-        await generic_utils.check_output(cmd)
+    if not erred_units:
+        return
+    logging.info("Resolving units: {}".format(", ".join(u.entity_id for u in erred_units)))
+    # resolve all the units in a single call, retrying the failed hooks like
+    # `juju resolved` does
+    facade = juju.client.client.ApplicationFacade.from_connection(model.connection())
+    results = await facade.ResolveUnitErrors(
+        all_=False,
+        retry=True,
+        tags={"entities": [{"tag": juju.tag.unit(u.entity_id)} for u in erred_units]},
+    )
+    _check_error_results(results, "resolve units")
     if wait:
-        for unit in erred_units:
-            await block_until_auto_reconnect_model(
-                lambda: not unit.workload_status == "error", model=model, timeout=timeout
-            )
+        await block_until_auto_reconnect_model(
+            lambda: all(u.workload_status != "error" for u in erred_units),
+            model=model,
+            timeout=timeout,
+        )
 
 
 resolve_units = sync_wrapper(async_resolve_units)
@@ -1306,6 +2139,9 @@ def machines_in_state(model, states):
     :returns: List of machines
     :rtype: List[juju.machine.Machine]
     """
+    index = _MODEL_STATE_INDEXES.get(model)
+    if index is not None:
+        return index.machines_in_state(model, states)
     machines = []
     for application_name in model.applications.keys():
         for unit in model.applications[application_name].units:
@@ -1438,26 +2274,170 @@ def is_unit_idle(unit):
     :returns: True if the unit is in the idle state
     :rtype: bool
     """
-    try:
-        return unit.data["agent-status"]["current"] == "idle"
-    except (AttributeError, KeyError):
-        pass
-    return False
+    return _unit_agent_status(unit) == "idle"
 
 
 def is_unit_errored_from_install_hook(unit):
     """Return True if the unit is in error state from the install hook.
 
-    :param unit: the unit to test
-    :type unit: :class:'juju.unit.Unit'
-    :returns: True if the unit is in the failed state and the workload status
-              message indicates the install hook failed.
-    :rtype: bool
+    :param unit: the unit to test
+    :type unit: :class:'juju.unit.Unit'
+    :returns: True if the unit is in the failed state and the workload status
+              message indicates the install hook failed.
+    :rtype: bool
+    """
+    return (
+        unit.workload_status == "error"
+        and unit.workload_status_message == 'hook failed: "install"'
+    )
+
+
+class UnitStatusTable:
+    """The status fields of a list of units, as columns.
+
+    The fields are read from the units once, so that the predicates of
+    async_wait_for_application_states() are evaluated over plain lists rather
+    than over the unit properties, which look up the libjuju model state on
+    every access.
+    """
+
+    __slots__ = ("units", "names", "agent_status", "workload_status", "message")
+
+    def __init__(self, units):
+        """Read the status fields of units.
+
+        :param units: The units
+        :type units: Iterable[juju.unit.Unit]
+        """
+        self.units = list(units)
+        self.names = [unit.entity_id for unit in self.units]
+        self.agent_status = [_unit_agent_status(unit) for unit in self.units]
+        self.workload_status = [unit.workload_status for unit in self.units]
+        self.message = [unit.workload_status_message or "" for unit in self.units]
+
+    def __len__(self):
+        """Return the number of units."""
+        return len(self.units)
+
+
+def _unit_agent_status(unit):
+    """Return the current agent status of a unit, or None if it is unknown.
+
+    :param unit: the unit
+    :type unit: :class:'juju.unit.Unit'
+    :returns: The agent status, e.g. 'idle'
+    :rtype: Optional[str]
+    """
+    try:
+        return unit.data["agent-status"]["current"]
+    except (AttributeError, KeyError):
+        return None
+
+
+class ApplicationStatePredicate:
+    """The readiness check of an application, compiled from its states entry.
+
+    See async_wait_for_application_states() for the keys of an entry.  The
+    approved statuses and message prefixes and the regex are worked out once,
+    instead of at every poll of the wait.
+    """
+
+    __slots__ = ("statuses", "prefixes", "regex", "num_expected_units", "_match")
+
+    def __init__(self, check_info=None, statuses=("active",), prefixes=APPROVED_MESSAGE_PREFIXES):
+        """Compile the states entry of an application.
+
+        :param check_info: The states entry of the application
+        :type check_info: Optional[dict]
+        :param statuses: The workload statuses approved for every application
+        :type statuses: Tuple[str, ...]
+        :param prefixes: The message prefixes approved for every application
+        :type prefixes: Tuple[str, ...]
+        """
+        check_info = check_info or {}
+        app_wls = check_info.get("workload-status", None)
+        self.statuses = tuple(statuses) + ((app_wls,) if app_wls is not None else ())
+        # preferentially try the newer -prefix first, before falling back to
+        # the older key without a -prefix
+        check_msg = check_info.get(
+            "workload-status-message-prefix", check_info.get("workload-status-message", None)
+        )
+        self.prefixes = tuple(prefixes) + ((check_msg,) if check_msg is not None else ())
+        check_regex = check_info.get("workload-status-message-regex", None)
+        self.regex = re.compile(check_regex) if check_regex is not None else None
+        self.num_expected_units = check_info.get("num-expected-units", None)
+        # Note: search is used so that pattern doesn't have to use a ".*" at
+        # the beginning of the string to match. To match the start use a "^".
+        if self.regex is not None:
+            self._match = self.regex.search
+        else:
+            self._match = operator.methodcaller("startswith", self.prefixes)
+
+    def expects(self, num_units):
+        """Return True if the application has the number of units to check.
+
+        If the caller set num-expected-units, the application is only checked
+        once it has that many units, otherwise it needs at least one unit.
+
+        :param num_units: The number of units of the application
+        :type num_units: int
+        :rtype: bool
+        """
+        if self.num_expected_units is not None:
+            return num_units == self.num_expected_units
+        return num_units > 0
+
+    def evaluate(self, table):
+        """Check the units of a table.
+
+        :param table: The status of the units of the application
+        :type table: UnitStatusTable
+        :returns: For every unit of table, the (gate, unit state, approved
+            states) of the checks it fails, which is empty if it is ready.  A
+            unit which isn't idle only fails the 'unit status' check.
+        :rtype: List[List[Tuple[str, str, List[str]]]]
+        """
+        idle = [status == "idle" for status in table.agent_status]
+        workload = [status in self.statuses for status in table.workload_status]
+        message = [self._match(msg) for msg in table.message]
+        if all(idle) and all(workload) and all(message):
+            return [[] for _ in idle]
+        failures = []
+        for i, unit_idle in enumerate(idle):
+            failed = []
+            if not unit_idle:
+                failed.append(("unit status", "not idle", ["idle"]))
+            else:
+                if not workload[i]:
+                    failed.append(
+                        ("workload status", table.workload_status[i], list(self.statuses))
+                    )
+                if not message[i]:
+                    failed.append(
+                        ("workload status message", table.message[i], list(self.prefixes))
+                    )
+            failures.append(failed)
+        return failures
+
+
+def compile_application_states(applications, states=None):
+    """Compile the states of async_wait_for_application_states().
+
+    :param applications: The applications to wait for
+    :type applications: Iterable[str]
+    :param states: States to look for
+    :type states: Optional[dict]
+    :returns: The predicate of each application
+    :rtype: Dict[str, ApplicationStatePredicate]
     """
-    return (
-        unit.workload_status == "error"
-        and unit.workload_status_message == 'hook failed: "install"'
-    )
+    states = states or {}
+    default = ApplicationStatePredicate()
+    return {
+        application: (
+            ApplicationStatePredicate(states[application]) if states.get(application) else default
+        )
+        for application in applications
+    }
 
 
 async def async_wait_for_application_states(
@@ -1523,12 +2503,10 @@ async def async_wait_for_application_states(
     # websockets.exceptions.ConnectionClosed if it detects that the connection
     # is closed.  What we want to do then, is re-open the connection, and try
     # again, hence this function uses block_until_auto_reconnect_model
-    approved_message_prefixes = ["ready", "Ready", "Unit is ready"]
-    approved_statuses = ["active"]
-
     if not states:
         states = {}
     model = await get_model(model_name)
+    watch_model_state(model)
     if not ignore_hard_errors:
         check_model_for_hard_errors(model)
     logging.info("Waiting for an application to be present")
@@ -1557,6 +2535,7 @@ async def async_wait_for_application_states(
                 application,
             )
 
+    predicates = compile_application_states(applications_left, states)
     logging.info("Now checking workload status and status messages")
 
     # Store the units and how many times they've been resolved for
@@ -1564,103 +2543,41 @@ async def async_wait_for_application_states(
     # then this will fail hard.
     resolve_counts = collections.defaultdict(int)
     last_report = time.time()
-    while True:
-        # now we sleep to allow progress to be made in the libjuju futures
-        await asyncio.sleep(0.5)
-
-        await ensure_model_connected(model)
-        timed_out = int(time.time() - start) > timeout
-        issues = []
-        for application in applications_left.copy():
-            check_info = states.get(application, {})
-            app_data = model.applications.get(application, None)
-            units = list(app_data.units)
-
-            # if there are no units then the application may not be ready.
-            # However, if the caller explicitly allows that situation then
-            # we gate on that.
-            num_expected = check_info.get("num-expected-units", None)
-            if num_expected is not None:
-                if len(units) != num_expected:
-                    continue
-            else:
-                # num_expected is None, so 0 units means we are still
-                # waiting
-                if len(units) == 0:
-                    continue
+    dashboard = progress.start(model, applications_left)
+    try:
+        while True:
+            # now we sleep to allow progress to be made in the libjuju futures
+            await asyncio.sleep(0.5)
 
-            # all_okay is a Boolean of the current state.  It starts as
-            # True, but if False by the end of the checks, then the
-            # application is not ready.
-            all_okay = True
-            check_wl_statuses = approved_statuses.copy()
-            app_wls = check_info.get("workload-status", None)
-            if app_wls is not None:
-                check_wl_statuses.append(app_wls)
-            # preferentially try the newer -prefix first, before
-            # falling back to the older key without a -prefix
-            check_msg = check_info.get(
-                "workload-status-message-prefix", check_info.get("workload-status-message", None)
-            )
-            check_regex = check_info.get("workload-status-message-regex", None)
-            prefixes = approved_message_prefixes.copy()
-            if check_msg is not None:
-                prefixes.append(check_msg)
-
-            # check all the units; any not in status, we continue
-            for unit in units:
-                # if a unit isn't idle, then not ready yet.
-                ok = is_unit_idle(unit)
-                all_okay = all_okay and ok
-                if not ok and timed_out:
-                    issues.append(
-                        timeout_msg.format(
-                            unit_name=unit.entity_id,
-                            gate_attr="unit status",
-                            unit_state="not idle",
-                            approved_states=["idle"],
-                        )
-                    )
+            await ensure_model_connected(model)
+            timed_out = int(time.time() - start) > timeout
+            issues = []
+            for application in applications_left.copy():
+                predicate = predicates[application]
+                app_data = model.applications.get(application, None)
+                units = list(app_data.units)
+
+                # if there are no units then the application may not be ready.
+                # However, if the caller explicitly allows that situation then
+                # we gate on that.
+                if not predicate.expects(len(units)):
                     continue
 
+                errored = False
                 try:
-                    ok = check_unit_workload_status(model, unit, check_wl_statuses)
-                    all_okay = all_okay and ok
-                    if not ok and timed_out:
-                        issues.append(
-                            timeout_msg.format(
-                                unit_name=unit.entity_id,
-                                gate_attr="workload status",
-                                unit_state=unit.workload_status,
-                                approved_states=check_wl_statuses,
-                            )
-                        )
-                    ok = check_unit_workload_status_message(
-                        model, unit, prefixes=prefixes, regex=check_regex
-                    )
-                    all_okay = all_okay and ok
-                    if not ok and timed_out:
-                        issues.append(
-                            timeout_msg.format(
-                                unit_name=unit.entity_id,
-                                gate_attr="workload status message",
-                                unit_state=unit.workload_status_message,
-                                approved_states=prefixes,
-                            )
-                        )
+                    check_model_for_hard_errors(model)
                 except UnitError as e:
+                    errored = True
                     # Check to see if this error is "resolvable" and try
                     # again.
-                    # Note: since the UnitError can be raised for any unit
-                    # in any of the calls to the check_unit_* invocations
-                    # (which in turn call check_model_for_hard_errors),
-                    # we need to check all the units captured in the
-                    # UnitError as the current unit may not be the one in
-                    # error
+                    # Note: the UnitError is raised for any unit in the model,
+                    # so we need to check all the units captured in the
+                    # UnitError as the units of this application may not be
+                    # the ones in error
                     if ignore_hard_errors:
                         logging.warning("Units {} in error state. ".format(e.units))
-                        all_okay = False
                     else:
+                        resolved = []
                         for u in e.units:
                             if not is_unit_errored_from_install_hook(u):
                                 raise
@@ -1674,43 +2591,70 @@ async def async_wait_for_application_states(
                                 "Attempt number %d to resolve" % (u.name, resolve_counts[u.name])
                             )
                             await async_resolve_units(
-                                application_name=unit.application, erred_hook="install"
+                                application_name=application, erred_hook="install"
                             )
-                            # wait until the unit is executing. 60 seconds
-                            # seems like a reasonable timeout
-                            await async_block_until_unit_wl_status(
-                                u.name, "error", model_name, negate_match=True, timeout=60
+                            resolved.append(
+                                unit_wl_status_target(u.name, "error", negate_match=True)
                             )
+                        # wait until the units are executing. 60 seconds
+                        # seems like a reasonable timeout
+                        await async_block_until_targets(
+                            resolved, model_name=model_name, timeout=60
+                        )
 
-                        all_okay = False
-
-            # if not all states are okay, continue to the next one.
-            if not all_okay:
-                continue
-
-            applications_left.remove(application)
-            logging.info("Application %s is ready.", application)
+                # all_okay is a Boolean of the current state.  It starts as
+                # True, but if False by the end of the checks, then the
+                # application is not ready.
+                all_okay = not errored
+                # check all the units in one pass; any not in status, we
+                # continue
+                table = UnitStatusTable(units)
+                for unit_name, failed in zip(table.names, predicate.evaluate(table)):
+                    unit_okay = not (failed or errored)
+                    all_okay = all_okay and unit_okay
+                    if timed_out:
+                        issues.extend(
+                            timeout_msg.format(
+                                unit_name=unit_name,
+                                gate_attr=gate_attr,
+                                unit_state=unit_state,
+                                approved_states=approved_states,
+                            )
+                            for gate_attr, unit_state, approved_states in failed
+                        )
+                    dashboard.unit_checked(application, unit_name, unit_okay)
 
-        delta_last_report = time.time() - last_report
-        if applications_left and delta_last_report > APPS_LEFT_INTERVAL:
-            last_report = time.time()
-            logging.info("Applications left: %s", ", ".join(applications_left))
+                # if not all states are okay, continue to the next one.
+                if not all_okay:
+                    continue
 
-        if not applications_left:
-            logging.info(
-                "All applications reached approved status, "
-                "number of units (where relevant), and workload"
-                " status message checks."
-            )
-            return
+                applications_left.remove(application)
+                dashboard.application_ready(application)
+                logging.info("Application %s is ready.", application)
+            dashboard.render()
+
+            delta_last_report = time.time() - last_report
+            if applications_left and delta_last_report > APPS_LEFT_INTERVAL:
+                last_report = time.time()
+                logging.info("Applications left: %s", ", ".join(applications_left))
+
+            if not applications_left:
+                logging.info(
+                    "All applications reached approved status, "
+                    "number of units (where relevant), and workload"
+                    " status message checks."
+                )
+                return
 
-        # check if we've timed-out, if so record the problem charms to the
-        # log and raise a ModelTimeout
-        if timed_out:
-            logging.info("TIMEOUT: Workloads didn't reach acceptable " "status:")
-            for issue in issues:
-                logging.info(issue)
-            raise ModelTimeout("Work state not achieved within timeout.")
+            # check if we've timed-out, if so record the problem charms to the
+            # log and raise a ModelTimeout
+            if timed_out:
+                logging.info("TIMEOUT: Workloads didn't reach acceptable " "status:")
+                for issue in issues:
+                    logging.info(issue)
+                raise ModelTimeout("Work state not achieved within timeout.")
+    finally:
+        dashboard.close()
 
 
 wait_for_application_states = sync_wrapper(async_wait_for_application_states)
@@ -1734,6 +2678,7 @@ async def async_block_until_all_units_idle(
     :type ignore_hard_deploy_error: Boolean
     """
     model = await get_model(model_name)
+    watch_model_state(model)
     await block_until_auto_reconnect_model(
         lambda: units_with_wl_status_state(model, "error") or model.all_units_idle(),
         model=model,
@@ -1766,14 +2711,14 @@ async def async_block_until_unit_count(application, target_count, model_name=Non
     :param timeout: Time to wait for status to be achieved
     :type timeout: float
     """
-
-    async def _check_unit():
-        model_status = await async_get_status(model_name)
-        unit_count = len(model_status.applications[application]["units"])
-        return unit_count == target_count
-
     assert target_count == int(target_count), "target_count not an int"
-    await async_block_until(_check_unit, timeout=timeout)
+    target = WaitTarget(
+        "application",
+        application,
+        lambda app_status: len(app_status["units"]) == target_count,
+        description="{} units".format(target_count),
+    )
+    await async_block_until_targets([target], model_name=model_name, timeout=timeout)
 
 
 block_until_unit_count = sync_wrapper(async_block_until_unit_count)
@@ -1795,16 +2740,30 @@ async def async_block_until_charm_url(application, target_url, model_name=None,
     :param timeout: Time to wait for status to be achieved
     :type timeout: float
     """
+    await async_block_until_targets(
+        [charm_url_target(application, target_url)], model_name=model_name, timeout=timeout
+    )
+
 
-    async def _check_charm_url():
-        model_status = await async_get_status(model_name)
-        charm_url = model_status.applications[application]["charm"]
-        return charm_url == target_url
+block_until_charm_url = sync_wrapper(async_block_until_charm_url)
 
-    await async_block_until(_check_charm_url, timeout=timeout)
 
+def charm_url_target(application, target_url):
+    """Return the target of an application running the charm url target_url.
 
-block_until_charm_url = sync_wrapper(async_block_until_charm_url)
+    :param application: Name of application
+    :type application: str
+    :param target_url: Target charm url
+    :type target_url: str
+    :returns: The target, see async_block_until_targets()
+    :rtype: WaitTarget
+    """
+    return WaitTarget(
+        "application",
+        application,
+        lambda app_status: app_status["charm"] == target_url,
+        description="charm {}".format(target_url),
+    )
 
 
 async def async_block_until_service_status(
@@ -1843,7 +2802,7 @@ async def async_block_until_service_status(
             else:
                 command = r"pidof -x '{}'".format(service)
             out = await async_run_on_unit(
-                unit_name, command, model_name=model_name, timeout=timeout
+                unit_name, command, model_name=model_name, timeout=timeout, max_age=probe_cache.TTL
             )
             response_size = len(out["Stdout"].strip())
             if target_status == "running" and response_size == 0:
@@ -1858,7 +2817,7 @@ async def async_block_until_service_status(
 block_until_service_status = sync_wrapper(async_block_until_service_status)
 
 
-def get_actions(application_name, model_name=None):
+async def async_get_actions(application_name, model_name=None):
     """Get the actions an applications supports.
 
     :param model_name: Name of model to query.
@@ -1868,12 +2827,11 @@ def get_actions(application_name, model_name=None):
     :returns: Dictionary of actions and their descriptions
     :rtype: dict
     """
-    if not model_name:
-        model_name = get_juju_model()
-    # libjuju has not implemented get_actions yet
-    # https://github.com/juju/python-libjuju/issues/226
-    cmd = ["juju", "actions", "-m", model_name, application_name, "--format", "yaml"]
-    return yaml.safe_load(subprocess.check_output(cmd))
+    model = await get_model(model_name)
+    return await model.applications[application_name].get_actions()
+
+
+get_actions = sync_wrapper(async_get_actions)
 
 
 async def async_get_current_model():
@@ -1928,6 +2886,226 @@ async def async_block_until(*conditions, timeout=None, wait_period=0.5):
 block_until = sync_wrapper(async_block_until)
 
 
+class WaitTarget:
+    """An entity of the model and the predicate its status has to satisfy.
+
+    kind is one of 'unit', 'application', 'machine' or 'model', and name is
+    the name of the unit or application, or the id of the machine (None for
+    the model).  The predicate is called with the status of the entity, as
+    found in the status returned by async_get_status() (the whole status for
+    the model), and returns True when the target is satisfied.  A target
+    whose entity isn't in the status isn't satisfied.
+
+    Subordinate units are looked up in the units of their principal
+    application, which is principal if given, else the application the
+    subordinate is related to.
+    """
+
+    KINDS = ("unit", "application", "machine", "model")
+
+    __slots__ = ("kind", "name", "predicate", "principal", "description")
+
+    def __init__(self, kind, name, predicate, principal=None, description=None):
+        """Initialise the target.
+
+        :param kind: One of WaitTarget.KINDS
+        :type kind: str
+        :param name: The unit or application name, or the machine id
+        :type name: Optional[str]
+        :param predicate: Check of the status of the entity
+        :type predicate: Callable[[Any], bool]
+        :param principal: The principal application of a subordinate unit
+        :type principal: Optional[str]
+        :param description: What the target waits for, used in the logs
+        :type description: Optional[str]
+        :raises: ValueError if kind isn't known
+        """
+        if kind not in self.KINDS:
+            raise ValueError("Unknown kind of wait target: {}".format(kind))
+        self.kind = kind
+        self.name = name
+        self.predicate = predicate
+        self.principal = principal
+        self.description = description
+
+    def __repr__(self):
+        """Represent the target in the logs."""
+        entity = self.kind if self.name is None else "{} {}".format(self.kind, self.name)
+        if self.description:
+            return "{} ({})".format(entity, self.description)
+        return entity
+
+    @property
+    def application(self):
+        """Return the application the status has to include, if any."""
+        if self.kind == "application":
+            return self.name
+        if self.kind == "unit":
+            return self.name.split("/")[0]
+        return None
+
+    def lookup(self, status):
+        """Return the status of the entity, or None if it isn't in status.
+
+        :param status: The model status
+        :type status: cou.zaza_utils.status.ModelStatus
+        :rtype: Any
+        """
+        if self.kind == "model":
+            return status
+        if self.kind == "machine":
+            machines = status.machines
+            # containers are in the status of their host machine, e.g.
+            # 1/lxd/0 is in the containers of 1
+            parts = self.name.split("/")
+            for end in range(1, len(parts) + 1, 2):
+                machine = machines.get("/".join(parts[:end]))
+                if machine is None:
+                    return None
+                machines = machine.get("containers") or {}
+            return machine
+        app_status = status.applications.get(self.application)
+        if app_status is None or self.kind == "application":
+            return app_status
+        unit = (app_status["units"] or {}).get(self.name)
+        if unit is not None:
+            return unit
+        principals = [self.principal] if self.principal else app_status["subordinate-to"]
+        for principal in principals:
+            principal_status = status.applications.get(principal) or {}
+            for principal_unit in (principal_status.get("units") or {}).values():
+                unit = (principal_unit.get("subordinates") or {}).get(self.name)
+                if unit is not None:
+                    return unit
+        return None
+
+    def satisfied(self, status):
+        """Return True if the entity satisfies the predicate.
+
+        :param status: The model status
+        :type status: cou.zaza_utils.status.ModelStatus
+        :rtype: bool
+        """
+        entity = self.lookup(status)
+        return entity is not None and bool(self.predicate(entity))
+
+
+def _wait_targets_filters(targets):
+    """Return the status filters that include all the targets.
+
+    :param targets: The targets
+    :type targets: Iterable[WaitTarget]
+    :returns: The applications, or None if the full status is needed
+    :rtype: Optional[List[str]]
+    """
+    filters = set()
+    for target in targets:
+        if target.application is None:
+            return None
+        filters.add(target.application)
+        if target.principal:
+            filters.add(target.principal)
+    return sorted(filters)
+
+
+async def async_block_until_targets(
+    targets,
+    model_name=None,
+    timeout=2700,
+    interval=4.0,
+    refresh=True,
+    on_satisfied=None,
+    idle=False,
+    ignore_hard_errors=False,
+):
+    """Block until all the targets are satisfied.
+
+    All the targets are evaluated against each status refresh, so waiting on
+    many units, applications or machines costs a single polling loop (and a
+    single status call, filtered on the applications of the targets) instead
+    of one each.  The targets are reported as they are satisfied, and are not
+    evaluated again.
+
+    With idle=True, the same loop then waits for all the units of the model to
+    be idle, as async_block_until_all_units_idle() does, so that e.g. waiting
+    for a unit to be blocked and then for the model to settle is one wait.
+    The units are only checked once all the targets are satisfied.
+
+    An example accessing this function via its sync wrapper::
+
+        block_until_targets(
+            [WaitTarget('unit', 'keystone/0', lambda u: u.agent_status.status == 'idle'),
+             WaitTarget('machine', '0', lambda m: m.agent_status.status == 'started')],
+            timeout=600)
+
+    :param targets: The targets to wait for
+    :type targets: Iterable[WaitTarget]
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :param timeout: Time to wait for all the targets, in seconds
+    :type timeout: float
+    :param interval: The minimum time between calls to get_status
+    :type interval: float
+    :param refresh: Force a refresh; do not used cached results
+    :type refresh: bool
+    :param on_satisfied: Called with each target as it is satisfied
+    :type on_satisfied: Optional[Callable[[WaitTarget], None]]
+    :param idle: Also wait for all the units of the model to be idle
+    :type idle: bool
+    :param ignore_hard_errors: With idle, stop waiting for the units to be idle
+                               rather than raise when a unit is in error.
+    :type ignore_hard_errors: bool
+    :returns: The targets, in the order they were satisfied
+    :rtype: List[WaitTarget]
+    :raises: asyncio.TimeoutError if the timeout is exceeded, UnitError if a
+             unit is in error while waiting for idle.
+    """
+    pending = list(targets)
+    satisfied = []
+    filters = _wait_targets_filters(pending)
+    # the model whose units are waited on to be idle
+    idle_model = None
+    if idle:
+        idle_model = await get_model(model_name)
+        watch_model_state(idle_model)
+
+    async def _check_targets():
+        if pending:
+            status = await async_get_status(
+                model_name, interval=interval, refresh=refresh, filters=filters
+            )
+            for target in [target for target in pending if target.satisfied(status)]:
+                pending.remove(target)
+                satisfied.append(target)
+                logging.debug("Wait target %s is satisfied", target)
+                if on_satisfied is not None:
+                    on_satisfied(target)
+        # the units may only settle after the targets are met, e.g. after a
+        # reboot, so idleness is only checked in the poll meeting the last one
+        if pending or idle_model is None:
+            return not pending
+        errored_units = units_with_wl_status_state(idle_model, "error")
+        if errored_units and not ignore_hard_errors:
+            raise UnitError(errored_units)
+        if errored_units:
+            logging.warning("Units {} in error state. ".format(errored_units))
+            return True
+        return idle_model.all_units_idle()
+
+    try:
+        await async_block_until(_check_targets, timeout=timeout)
+    except asyncio.TimeoutError:
+        waiting = [repr(target) for target in pending]
+        if idle_model is not None:
+            waiting.append("all units idle")
+        logging.warning("Timed out waiting for: %s", ", ".join(waiting))
+        raise
+    return satisfied
+
+
+block_until_targets = sync_wrapper(async_block_until_targets)
+
+
 def file_contents(unit_name, path, timeout=None):
     """Return the contents of a file.
 
@@ -1981,12 +3159,17 @@ async def async_block_until_machine_status_is(
     :type refresh: bool
     """
 
-    async def _check_machine_status():
-        _status = await async_get_status(model_name=model_name, interval=interval, refresh=refresh)
-        equals = _status["machines"][machine].agent_status["status"] == status
+    def _check_machine_status(machine_status):
+        equals = machine_status.agent_status["status"] == status
         return not equals if invert_check else equals
 
-    await async_block_until(_check_machine_status, timeout=timeout)
+    await async_block_until_targets(
+        [WaitTarget("machine", machine, _check_machine_status)],
+        model_name=model_name,
+        timeout=timeout,
+        interval=interval,
+        refresh=refresh,
+    )
 
 
 block_until_machine_status_is = sync_wrapper(async_block_until_machine_status_is)
@@ -2013,24 +3196,26 @@ async def async_block_until_file_ready(
     :param timeout: Time to wait for contents to appear in file
     :type timeout: float
     """
-    model = await get_model(model_name)
 
     async def _check_file():
-        units = model.applications[application_name].units
-        for unit in units:
-            try:
-                output = await unit.run("cat {}".format(remote_file))
-                contents = output.data.get("results").get("Stdout", "")
-                if inspect.iscoroutinefunction(check_function):
-                    if not await check_function(contents):
-                        return False
-                elif not check_function(contents):
+        try:
+            results = await async_run_on_units(
+                "cat {}".format(remote_file),
+                application_name=application_name,
+                model_name=model_name,
+            )
+        # libjuju throws a generic error for connection failure. So we
+        # cannot differentiate between a connectivity issue and a
+        # target file not existing error. For now just assume the
+        # latter.
+        except JujuError:
+            return False
+        for output in results.values():
+            contents = output.get("Stdout", "")
+            if inspect.iscoroutinefunction(check_function):
+                if not await check_function(contents):
                     return False
-            # libjuju throws a generic error for connection failure. So we
-            # cannot differentiate between a connectivity issue and a
-            # target file not existing error. For now just assume the
-            # latter.
-            except JujuError:
+            elif not check_function(contents):
                 return False
         else:
             return True
@@ -2144,24 +3329,20 @@ async def async_block_until_file_missing(app, path, model_name=None, timeout=270
     :type timeout: float
     """
 
-    async def _check_for_file(model):
-        units = model.applications[app].units
-        results = []
-        for unit in units:
-            try:
-                output = await unit.run('test -e "{}"; echo $?'.format(path))
-                contents = output.data.get("results")["Stdout"]
-                results.append("1" in contents)
-            # libjuju throws a generic error for connection failure. So we
-            # cannot differentiate between a connectivity issue and a
-            # target file not existing error. For now just assume the
-            # latter.
-            except JujuError:
-                results.append(False)
-        return all(results)
+    async def _check_for_file():
+        try:
+            results = await async_run_on_units(
+                'test -e "{}"; echo $?'.format(path), application_name=app, model_name=model_name
+            )
+        # libjuju throws a generic error for connection failure. So we
+        # cannot differentiate between a connectivity issue and a
+        # target file not existing error. For now just assume the
+        # latter.
+        except JujuError:
+            return False
+        return all("1" in output["Stdout"] for output in results.values())
 
-    model = await get_model(model_name)
-    await async_block_until(lambda: _check_for_file(model), timeout=timeout)
+    await async_block_until(_check_for_file, timeout=timeout)
 
 
 block_until_file_missing = sync_wrapper(async_block_until_file_missing)
@@ -2220,8 +3401,7 @@ async def async_block_until_units_on_machine_are_idle(machine, model_name=None,
     :type timeout: float
     """
 
-    async def _ready():
-        _status = await async_get_status(model_name)
+    def _ready(_status):
         apps = set()
         units = []
         statuses = []
@@ -2249,7 +3429,11 @@ async def async_block_until_units_on_machine_are_idle(machine, model_name=None,
         # return ready if all the statuses were idle
         return all(statuses)
 
-    await async_block_until(_ready, timeout=timeout)
+    await async_block_until_targets(
+        [WaitTarget("model", None, _ready, description="units on {} idle".format(machine))],
+        model_name=model_name,
+        timeout=timeout,
+    )
 
 
 block_until_units_on_machine_are_idle = sync_wrapper(async_block_until_units_on_machine_are_idle)
@@ -2410,39 +3594,46 @@ async def async_block_until_unit_wl_status(
                                   unit_name is a subordinate
     :type subordinate_principal: str
     """
+    target = unit_wl_status_target(
+        unit_name, status, negate_match=negate_match, subordinate_principal=subordinate_principal
+    )
+    await async_block_until_targets([target], model_name=model_name, timeout=timeout)
 
-    async def _unit_status():
-        app = unit_name.split("/")[0]
-        model_status = await async_get_status(model_name)
-        try:
-            v = model_status.applications[app]["units"][unit_name]["workload-status"]["status"]
-        except (TypeError, KeyError):
-            # For when the unit is a subordinate we need to get it's
-            # leader, and then get the status for the subordinate from its
-            # unit
-            lead_app_name = subordinate_principal
-            if not subordinate_principal:
-                lead_app_name = model_status.applications[app]["subordinate-to"][0]
-            units = model_status.applications[lead_app_name]["units"]
-            for unit in units.values():
-                try:
-                    v = unit["subordinates"][unit_name]["workload-status"]["status"]
-                    break
-                except KeyError:
-                    pass
-            else:  # pragma: no cover
-                raise ValueError(
-                    "{} does not exist as a subordinate under a " "principal".format(unit_name)
-                )
+
+block_until_unit_wl_status = sync_wrapper(async_block_until_unit_wl_status)
+
+
+def unit_wl_status_target(unit_name, status, negate_match=False, subordinate_principal=None):
+    """Return the target of a unit having the desired workload status.
+
+    :param unit_name: Name of unit
+    :type unit_name: str
+    :param status: Status to wait for (active, maintenance etc)
+    :type status: str
+    :param negate_match: Wait until the match is not true.
+    :type negate_match: bool
+    :param subordinate_principal: Name of the principal of unit_name, if
+                                  unit_name is a subordinate
+    :type subordinate_principal: str
+    :returns: The target, see async_block_until_targets()
+    :rtype: WaitTarget
+    """
+
+    def _unit_status(unit_status):
+        v = unit_status["workload-status"]["status"]
         if negate_match:
             return v != status
         else:
             return v == status
 
-    await async_block_until(_unit_status, timeout=timeout)
-
-
-block_until_unit_wl_status = sync_wrapper(async_block_until_unit_wl_status)
+    # a subordinate unit is found in the status of its principal's units
+    return WaitTarget(
+        "unit",
+        unit_name,
+        _unit_status,
+        principal=subordinate_principal,
+        description="{}workload status {}".format("not " if negate_match else "", status),
+    )
 
 
 async def async_block_until_wl_status_info_starts_with(
@@ -2465,20 +3656,17 @@ async def async_block_until_wl_status_info_starts_with(
     :type timeout: float
     """
 
-    async def _unit_status():
-        model_status = await async_get_status(model_name)
-        wl_infos = [
-            v["workload-status"]["info"]
-            for k, v in model_status.applications[app]["units"].items()
-            if k.split("/")[0] == app
-        ]
+    def _unit_status(app_status):
+        wl_infos = [v["workload-status"]["info"] for v in app_status["units"].values()]
         g = (s.startswith(status) for s in wl_infos)
         if negate_match:
             return not any(g)
         else:
             return all(g)
 
-    await async_block_until(_unit_status, timeout=timeout)
+    await async_block_until_targets(
+        [WaitTarget("application", app, _unit_status)], model_name=model_name, timeout=timeout
+    )
 
 
 block_until_wl_status_info_starts_with = sync_wrapper(async_block_until_wl_status_info_starts_with)
@@ -2502,23 +3690,20 @@ async def async_block_until_unit_wl_message_match(
     """
     principle_unit = await async_get_principle_unit(unit, model_name=model_name)
 
-    async def _unit_status():
-        model_status = await async_get_status(model_name)
-        app = unit.split("/")[0]
-        if principle_unit:
-            principle_app = principle_unit.split("/")[0]
-            _unit = model_status.applications[principle_app]["units"][principle_unit][
-                "subordinates"
-            ][unit]
-        else:
-            _unit = model_status.applications[app]["units"][unit]
-        status = _unit["workload-status"]["info"]
+    def _unit_status(unit_status):
+        status = unit_status["workload-status"]["info"]
         if negate_match:
             return not bool(re.match(status_pattern, status))
         else:
             return bool(re.match(status_pattern, status))
 
-    await async_block_until(_unit_status, timeout=timeout)
+    target = WaitTarget(
+        "unit",
+        unit,
+        _unit_status,
+        principal=principle_unit.split("/")[0] if principle_unit else None,
+    )
+    await async_block_until_targets([target], model_name=model_name, timeout=timeout)
 
 
 block_until_unit_wl_message_match = sync_wrapper(async_block_until_unit_wl_message_match)
@@ -2724,14 +3909,12 @@ async def async_scale(
 scale = sync_wrapper(async_scale)
 
 
-def set_model_constraints(constraints, model_name=None):
+async def async_set_model_constraints(constraints, model_name=None):
     """
     Set constraints on a model.
 
-    Note: Subprocessing out to 'juju' is a temporary solution until
-          https://bit.ly/2ujbVPA lands in libjuju.
-
-    :param constraints: Constraints to be applied to model
+    :param constraints: Constraints to be applied to model, in the format of
+                        `juju set-model-constraints`, e.g. {"mem": "4G"}
     :type constraints: dict
     :param model_name: Name of model to operate on
     :type model_name: str
@@ -2739,11 +3922,13 @@ def set_model_constraints(constraints, model_name=None):
     """
     if not constraints:
         return
-    if not model_name:
-        model_name = get_juju_model()
-    cmd = ["juju", "set-model-constraints", "-m", model_name]
-    cmd.extend(["{}={}".format(k, v) for k, v in constraints.items()])
-    subprocess.check_call(cmd)
+    model = await get_model(model_name)
+    await model.set_constraints(
+        juju.constraints.parse(" ".join("{}={}".format(k, v) for k, v in constraints.items()))
+    )
+
+
+set_model_constraints = sync_wrapper(async_set_model_constraints)
 
 
 async def async_upgrade_charm(
@@ -2792,6 +3977,7 @@ async def async_upgrade_charm(
         revision=revision,
         switch=switch,
     )
+    probe_cache.invalidate(applications=[application_name])
 
 
 upgrade_charm = sync_wrapper(async_upgrade_charm)
@@ -2829,63 +4015,150 @@ class UnitNotFound(Exception):
         super(UnitNotFound, self).__init__(msg)
 
 
-# NOTE: The following are series upgrade related functions which are new
-# features in juju. We can migrate to libjuju calls when the feature
-# stabilizes.
-def prepare_series_upgrade(machine_num, to_series="xenial"):
+def _check_error_results(results, action):
+    """Raise a JujuError if an API call returned errors.
+
+    :param results: The result(s) of the API call
+    :type results: Union[juju.client._definitions.ErrorResult,
+                         juju.client._definitions.ErrorResults]
+    :param action: What the call did, for the error message
+    :type action: str
+    :raises: JujuError
+    """
+    if hasattr(results, "results"):
+        results = results.results or []
+    else:
+        results = [results]
+    errors = [result.error.message for result in results if result.error]
+    if errors:
+        raise JujuError("Unable to {}: {}".format(action, ", ".join(errors)))
+
+
+def _machine_tag(machine_num):
+    """Return the tag of a machine, e.g. machine-1-lxd-0 for 1/lxd/0.
+
+    :param machine_num: Machine number
+    :type machine_num: str
+    :returns: The tag
+    :rtype: str
+    """
+    return juju.tag.machine(machine_num.replace("/", "-"))
+
+
+async def _async_juju_cli(command, args, model_name=None):
+    """Run a juju command on a model, for calls libjuju has no binding for.
+
+    :param command: The juju command, e.g. upgrade-series
+    :type command: str
+    :param args: The arguments of the command
+    :type args: List[str]
+    :param model_name: Name of model to operate on
+    :type model_name: str
+    :raises: subprocess.CalledProcessError
+    """
+    if model_name is None:
+        model_name = await async_get_juju_model()
+    await generic_utils.check_call(["juju", command, "-m", model_name] + list(args))
+
+
+async def async_prepare_series_upgrade(machine_num, to_series="xenial", model_name=None):
     """Execute juju series-upgrade prepare on machine.
 
-    NOTE: This is a new feature in juju behind a feature flag and not yet in
-    libjuju.
-    export JUJU_DEV_FEATURE_FLAGS=upgrade-series
+    The MachineManager facade versions bound by libjuju 2.9 have no series
+    upgrade calls, so `juju upgrade-series` is run when the negotiated facade
+    lacks them.
 
     :param machine_num: Machine number
     :type machine_num: str
     :param to_series: The series to which to upgrade
     :type to_series: str
+    :param model_name: Name of model to operate on
+    :type model_name: str
     :returns: None
     :rtype: None
     """
-    juju_model = get_juju_model()
-    cmd = ["juju", "upgrade-series", "-m", juju_model, machine_num, "prepare", to_series, "--yes"]
-    subprocess.check_call(cmd)
+    model = await get_model(model_name)
+    facade = juju.client.client.MachineManagerFacade.from_connection(model.connection())
+    try:
+        if hasattr(facade, "UpgradeSeriesPrepare"):
+            result = await facade.UpgradeSeriesPrepare(
+                force=False, series=to_series, tag={"tag": _machine_tag(machine_num)}
+            )
+            _check_error_results(
+                result, "prepare series upgrade of machine {}".format(machine_num)
+            )
+        else:
+            await _async_juju_cli(
+                "upgrade-series", [machine_num, "prepare", to_series, "--yes"], model_name
+            )
+    finally:
+        probe_cache.invalidate()
+        invalidate_clock_offsets(model_name, machines=[machine_num])
 
 
-def complete_series_upgrade(machine_num):
+prepare_series_upgrade = sync_wrapper(async_prepare_series_upgrade)
+
+
+async def async_complete_series_upgrade(machine_num, model_name=None):
     """Execute juju series-upgrade complete on machine.
 
-    NOTE: This is a new feature in juju behind a feature flag and not yet in
-    libjuju.
-    export JUJU_DEV_FEATURE_FLAGS=upgrade-series
+    See async_prepare_series_upgrade() for when `juju upgrade-series` is run.
 
     :param machine_num: Machine number
     :type machine_num: str
+    :param model_name: Name of model to operate on
+    :type model_name: str
     :returns: None
     :rtype: None
     """
-    juju_model = get_juju_model()
-    cmd = ["juju", "upgrade-series", "-m", juju_model, machine_num, "complete"]
-    subprocess.check_call(cmd)
+    model = await get_model(model_name)
+    facade = juju.client.client.MachineManagerFacade.from_connection(model.connection())
+    try:
+        if hasattr(facade, "UpgradeSeriesComplete"):
+            result = await facade.UpgradeSeriesComplete(tag={"tag": _machine_tag(machine_num)})
+            _check_error_results(
+                result, "complete series upgrade of machine {}".format(machine_num)
+            )
+        else:
+            await _async_juju_cli("upgrade-series", [machine_num, "complete"], model_name)
+    finally:
+        probe_cache.invalidate()
+        invalidate_clock_offsets(model_name, machines=[machine_num])
 
 
-def set_series(application, to_series):
-    """Execute juju set-series complete on application.
+complete_series_upgrade = sync_wrapper(async_complete_series_upgrade)
 
-    NOTE: This is a new feature in juju and not yet in libjuju.
+
+async def async_set_series(application, to_series, model_name=None):
+    """Execute juju set-series complete on application.
 
     :param application: Name of application to upgrade series
     :type application: str
     :param to_series: The series to which to upgrade
     :type to_series: str
+    :param model_name: Name of model to operate on
+    :type model_name: str
     :returns: None
     :rtype: None
     """
-    juju_model = get_juju_model()
-    cmd = ["juju", "set-series", "-m", juju_model, application, to_series]
-    subprocess.check_call(cmd)
+    model = await get_model(model_name)
+    facade = juju.client.client.ApplicationFacade.from_connection(model.connection())
+    results = await facade.UpdateApplicationSeries(
+        args=[
+            {
+                "tag": {"tag": juju.tag.application(application)},
+                "series": to_series,
+                "force": False,
+            }
+        ]
+    )
+    _check_error_results(results, "set the series of {}".format(application))
+
 
+set_series = sync_wrapper(async_set_series)
 
-def attach_resource(application, resource_name, resource_path):
+
+async def async_attach_resource(application, resource_name, resource_path, model_name=None):
     """Attach resource to charm.
 
     :param application: Application to get leader settings from.
@@ -2894,19 +4167,25 @@ def attach_resource(application, resource_name, resource_path):
     :type resource_name: str
     :param resource_path: The path to the resource on disk
     :type resource_path: str
+    :param model_name: Name of model to operate on
+    :type model_name: str
     :returns: None
     :rtype: None
     """
-    juju_model = get_juju_model()
-    cmd = [
-        "juju",
-        "attach-resource",
-        "-m",
-        juju_model,
-        application,
-        "{}={}".format(resource_name, resource_path),
-    ]
-    subprocess.check_call(cmd)
+    model = await get_model(model_name)
+    app = model.applications[application]
+
+    def _upload():
+        with open(resource_path, "rb") as resource_file:
+            app.attach_resource(resource_name, os.path.basename(resource_path), resource_file)
+
+    # libjuju uploads the resource with a blocking HTTP request, so keep it
+    # off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, _upload)
+    probe_cache.invalidate(applications=[application])
+
+
+attach_resource = sync_wrapper(async_attach_resource)
 
 
 async def async_run_on_machine(machine, command, model_name=None, timeout=None):
@@ -2935,7 +4214,11 @@ async def async_run_on_machine(machine, command, model_name=None, timeout=None):
     cmd.append("--")
     cmd.append(command)
     logging.info("About to call '{}'".format(cmd))
-    return await generic_utils.check_output(cmd)
+    try:
+        return await generic_utils.check_output(cmd)
+    finally:
+        # the units on the machine aren't known, so drop every probe result
+        probe_cache.invalidate()
 
 
 run_on_machine = sync_wrapper(async_run_on_machine)
@@ -2987,9 +4270,8 @@ async def async_get_agent_status(app, unit_name):
     :returns: The agent status, either active / idle, returned by Juju
     :rtype: str
     """
-    return (await async_get_status()).applications[app]["units"][unit_name]["agent-status"][
-        "status"
-    ]
+    status = await async_get_status(filters=[app])
+    return status.applications[app]["units"][unit_name]["agent-status"]["status"]
 
 
 get_agent_status = sync_wrapper(async_get_agent_status)
@@ -3005,7 +4287,7 @@ async def async_check_if_subordinates_idle(app, unit_name):
     :returns: The agent status, either active / idle, returned by Juju
     :rtype: str
     """
-    status = await async_get_status()
+    status = await async_get_status(filters=[app])
     subordinates = status.applications[app]["units"][unit_name].get("subordinates", [])
     if not subordinates:
         return True
@@ -3046,7 +4328,7 @@ async def async_get_cloud_data(credential_name=None, model_name=None):
 get_cloud_data = sync_wrapper(async_get_cloud_data)
 
 
-def add_storage(unit, label, pool, size, model=None):
+async def async_add_storage(unit, label, pool, size, model=None):
     """Add storage to a Juju unit.
 
     :param unit: The unit name (i.e: ceph-osd/0)
@@ -3067,22 +4349,40 @@ def add_storage(unit, label, pool, size, model=None):
     :returns: The name of the allocated storage.
     :rtype: str
     """
-    model = model or get_juju_model()
-    rv = subprocess.check_output(
-        [
-            "juju",
-            "add-storage",
-            unit,
-            "-m",
-            model,
-            "{}={},{}".format(label, pool, str(size) + "GB"),
-        ],
-        stderr=subprocess.STDOUT,
+    juju_model = await get_model(model)
+    facade = juju.client.client.StorageFacade.from_connection(juju_model.connection())
+    results = await facade.AddToUnit(
+        storages=[
+            {
+                "unit": juju.tag.unit(unit),
+                "name": label,
+                # the size is in MiB
+                "storage": {"pool": pool, "size": size * 1024, "count": 1},
+            }
+        ]
     )
-    return rv.decode("UTF-8").replace("added storage ", "").split(" ")[0]
+    _check_error_results(results, "add storage to {}".format(unit))
+    # e.g. storage-osd-devices-0 -> osd-devices/0
+    storage_tag = results.results[0].result.storage_tags[0]
+    name, _, number = juju.tag.untag("storage-", storage_tag).rpartition("-")
+    return "{}/{}".format(name, number)
+
+
+add_storage = sync_wrapper(async_add_storage)
 
 
-def detach_storage(storage_name, model=None, force=False):
+def _storage_tag(storage_name):
+    """Return the tag of a storage instance, e.g. storage-osd-devices-0.
+
+    :param storage_name: The name of the storage, e.g. osd-devices/0
+    :type storage_name: str
+    :returns: The tag
+    :rtype: str
+    """
+    return "storage-{}".format(storage_name.replace("/", "-"))
+
+
+async def async_detach_storage(storage_name, model=None, force=False):
     """Detach previously allocated Juju storage.
 
     :param storage_name: The name of the allocated storage, as returned by
@@ -3095,14 +4395,26 @@ def detach_storage(storage_name, model=None, force=False):
     :param force: Whether to forcefully detach the storage.
     :type force: bool
     """
-    model = model or get_juju_model()
-    cmd = ["juju", "detach-storage", "-m", model, storage_name]
-    if force:
-        cmd.append("--force")
-    subprocess.check_call(cmd)
+    juju_model = await get_model(model)
+    facade = juju.client.client.StorageFacade.from_connection(juju_model.connection())
+    ids = [{"storage-tag": _storage_tag(storage_name), "unit-tag": ""}]
+    if hasattr(facade, "DetachStorage"):
+        results = await facade.DetachStorage(force=force, ids={"ids": ids})
+    elif not force:
+        # Storage facades before v6 only have Detach, which can't force
+        results = await facade.Detach(ids=ids)
+    else:
+        await _async_juju_cli("detach-storage", [storage_name, "--force"], model)
+        return
+    _check_error_results(results, "detach storage {}".format(storage_name))
 
 
-def remove_storage(storage_name, model=None, force=False, destroy=True):
+detach_storage = sync_wrapper(async_detach_storage)
+
+
+async def async_remove_storage(
+    storage_name, model=None, force=False, destroy=True, destroy_attachments=False
+):
     """Remove Juju storage.
 
     :param storage_name: The name of the previously allocated Juju storage.
@@ -3111,17 +4423,30 @@ def remove_storage(storage_name, model=None, force=False, destroy=True):
     :param model: The model name, or None, for the current model.
     :type model: Option[str]
 
-    :param force: If False (default), require that the storage be detached
-                  before it can be removed.
+    :param force: Whether to remove the storage even if Juju hits errors
+                  while doing so.
     :type force: bool
 
     :param destroy: Whether to destroy the storage.
     :type destroy: bool
+
+    :param destroy_attachments: If False (default), require that the storage
+                                be detached before it can be removed.
+    :type destroy_attachments: bool
     """
-    model = model or get_juju_model()
-    cmd = ["juju", "remove-storage", storage_name, "-m", model]
-    if force:
-        cmd.append("--force")
-    if not destroy:
-        cmd.append("--no-destroy")
-    subprocess.check_call(cmd)
+    juju_model = await get_model(model)
+    facade = juju.client.client.StorageFacade.from_connection(juju_model.connection())
+    results = await facade.Remove(
+        storage=[
+            {
+                "tag": _storage_tag(storage_name),
+                "destroy-attachments": destroy_attachments,
+                "destroy-storage": destroy,
+                "force": force,
+            }
+        ]
+    )
+    _check_error_results(results, "remove storage {}".format(storage_name))
+
+
+remove_storage = sync_wrapper(async_remove_storage)
@@ -353,6 +353,50 @@ PACKAGE_CODENAMES = {
     ),
 }
 
+# Package used to work out the OpenStack release that a charm is running.
+CHARM_PACKAGES = {
+    "ceilometer": "ceilometer-common",
+    "ceph-mon": "ceph-common",
+    "ceph-osd": "ceph-common",
+    "ceph-radosgw": "ceph-common",
+    "cinder": "cinder-common",
+    "designate": "designate-common",
+    "glance": "glance-common",
+    "heat": "heat-common",
+    "keystone": "keystone",
+    "neutron-api": "neutron-common",
+    "neutron-gateway": "neutron-common",
+    "nova-cloud-controller": "nova-common",
+    "nova-compute": "nova-common",
+    "openstack-dashboard": "openstack-dashboard",
+    "placement": "placement-common",
+}
+
+# (package, major version) -> codename, flattened from PACKAGE_CODENAMES
+PACKAGE_CODENAME_LOOKUP = {
+    (package, major): codename
+    for package, codenames in PACKAGE_CODENAMES.items()
+    for major, codename in codenames.items()
+}
+
+
+def get_os_codename_from_package_version(package, version):
+    """Get the OpenStack codename for an installed package version.
+
+    E.g. ('nova-common', '2:21.2.4-0ubuntu1') -> 'ussuri'
+
+    :param package: Name of the package, a key of PACKAGE_CODENAMES
+    :type package: str
+    :param version: Package version, as reported by dpkg
+    :type version: str
+    :returns: OpenStack codename or None if the version is not known
+    :rtype: Optional[str]
+    """
+    if not version:
+        return None
+    major = version.split(":", 1)[-1].split(".", 1)[0]
+    return PACKAGE_CODENAME_LOOKUP.get((package, major))
+
 
 UBUNTU_RELEASES = (
     "lucid",
@@ -391,45 +435,103 @@ class BasicStringComparator(object):
     Used to provide > and < comparisons on strings that may not necessarily be
     alphanumerically ordered.  e.g. OpenStack or Ubuntu releases AFTER the
     z-wrap.
+
+    The position of each item in _list is computed once per subclass, and
+    instances are interned per item, so that constructing a comparator is a
+    dictionary lookup and comparing two of them is an integer comparison.
     """
 
-    _list = None
+    __slots__ = ("index",)
 
-    def __init__(self, item):
-        """Do init."""
-        if self._list is None:
+    _list = None
+    _ordinals = None
+    _instances = None
+
+    def __init_subclass__(cls, **kwargs):
+        """Build the item to ordinal map for the subclass' _list."""
+        super().__init_subclass__(**kwargs)
+        if cls._list is not None:
+            cls._ordinals = {item: index for index, item in enumerate(cls._list)}
+            cls._instances = {}
+
+    def __new__(cls, item):
+        """Return the (shared) comparator for item."""
+        if cls._list is None:
             raise Exception("Must define the _list in the class definition!")
+        if isinstance(item, cls):
+            return item
+        try:
+            return cls._instances[item]
+        except KeyError:
+            pass
+        except TypeError:
+            raise KeyError("Item '{}' is not in list '{}'".format(item, cls._list))
+        try:
+            index = cls._ordinals[item]
+        except KeyError:
+            raise KeyError("Item '{}' is not in list '{}'".format(item, cls._list))
+        instance = super().__new__(cls)
+        instance.index = index
+        return cls._instances.setdefault(item, instance)
+
+    def __reduce__(self):
+        """Recreate (and so intern) the comparator from its item."""
+        return self.__class__, (self._list[self.index],)
+
+    def _index_of(self, other):
+        """Get the position of other in _list.
+
+        :param other: a string in _list, or a comparator of the same class
+        :type other: Union[str, BasicStringComparator]
+        :returns: the position of other
+        :rtype: int
+        :raises: ValueError if other is not in _list
+        """
+        if isinstance(other, self.__class__):
+            return other.index
+        assert isinstance(other, str)
         try:
-            self.index = self._list.index(item)
-        except Exception:
-            raise KeyError("Item '{}' is not in list '{}'".format(item, self._list))
+            return self._ordinals[other]
+        except KeyError:
+            raise ValueError("'{}' is not in list".format(other))
+
+    def __hash__(self):
+        """Hash as the item does, as comparators are equal to their items."""
+        return hash(self._list[self.index])
 
     def __eq__(self, other):
-        """Do equals."""
-        assert isinstance(other, str) or isinstance(other, self.__class__)
-        return self.index == self._list.index(other)
+        """Do equals.
+
+        A comparator is only equal to a comparator of the same class or a
+        string in _list; anything else (None, other types, unknown strings) is
+        left to the other operand, and so is not equal.
+        """
+        if isinstance(other, self.__class__):
+            return self.index == other.index
+        if isinstance(other, str) and other in self._ordinals:
+            return self.index == self._ordinals[other]
+        return NotImplemented
 
     def __ne__(self, other):
         """Do not equals."""
-        return not self.__eq__(other)
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
 
     def __lt__(self, other):
         """Do less than."""
-        assert isinstance(other, str) or isinstance(other, self.__class__)
-        return self.index < self._list.index(other)
+        return self.index < self._index_of(other)
 
     def __ge__(self, other):
         """Do greater than or equal."""
-        return not self.__lt__(other)
+        return self.index >= self._index_of(other)
 
     def __gt__(self, other):
         """Do greater than."""
-        assert isinstance(other, str) or isinstance(other, self.__class__)
-        return self.index > self._list.index(other)
+        return self.index > self._index_of(other)
 
     def __le__(self, other):
         """Do less than or equals."""
-        return not self.__gt__(other)
+        return self.index <= self._index_of(other)
 
     def __repr__(self):
         """Return the representation of CompareOpenStack."""
@@ -459,6 +561,8 @@ class CompareHostReleases(BasicStringComparator):
         # do something with mitaka
     """
 
+    __slots__ = ()
+
     _list = UBUNTU_RELEASES
 
 
@@ -471,4 +575,6 @@ class CompareOpenStack(BasicStringComparator):
         # do something
     """
 
+    __slots__ = ()
+
     _list = list(OPENSTACK_CODENAMES.values())
@@ -0,0 +1,130 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cache the results of read-only commands run on units.
+
+Waits and checks run the same read-only probes (e.g. `systemctl show`,
+`pidof`, `dpkg -l` or `leader-get`) on the same units over and over.  Their
+results are cached here, keyed on the model, unit and command, and reused for
+up to TTL seconds.  The hits and misses are recorded as the 'probe' cache, see
+cou.zaza_utils.instrumentation.
+
+The results of a unit are dropped whenever something is done to the unit or
+to its application (a command that isn't a probe, an action, a change of
+config or charm, ...), and all the results are dropped after each step of the
+upgrade plan.
+
+The cache is used from both the foreground thread and the libjuju thread, so
+it is only changed under a lock.
+"""
+
+import threading
+import time
+
+from cou.zaza_utils import instrumentation
+
+# How long, in seconds, a probe result is reused for by default.
+DEFAULT_TTL = 10.0
+
+TTL = DEFAULT_TTL
+
+_lock = threading.Lock()
+# (model name, unit name, command) <-> (time, result)
+_results = {}
+
+
+def set_ttl(ttl):
+    """Set how long the probe results are reused for; 0 disables the cache.
+
+    :param ttl: The time to live of the results, in seconds
+    :type ttl: float
+    """
+    global TTL
+    TTL = max(0.0, float(ttl))
+    if not TTL:
+        invalidate()
+
+
+def _key(unit_name, command, model_name):
+    return (str(model_name), unit_name, command)
+
+
+def get(unit_name, command, model_name=None, max_age=None):
+    """Return the cached result of a probe, or None.
+
+    :param unit_name: Name of the unit the probe ran on
+    :type unit_name: str
+    :param command: The probe
+    :type command: str
+    :param model_name: Name of the model of the unit
+    :type model_name: str
+    :param max_age: The maximum age of the result in seconds, default is TTL
+    :type max_age: Optional[float]
+    :returns: A copy of the result, or None if there is no fresh enough one
+    :rtype: Optional[Dict[str, str]]
+    """
+    max_age = TTL if max_age is None else max_age
+    if max_age <= 0:
+        return None
+    with _lock:
+        cached = _results.get(_key(unit_name, command, model_name))
+    hit = cached is not None and time.monotonic() - cached[0] <= max_age
+    instrumentation.record_cache("probe", hit)
+    return dict(cached[1]) if hit else None
+
+
+def put(unit_name, command, result, model_name=None):
+    """Cache the result of a probe, unless the probe failed or had no output.
+
+    A probe with no output usually found nothing (e.g. a pipeline looking up
+    a service that isn't running yet), which is the answer most likely to
+    change, so it is not reused either.
+
+    :param unit_name: Name of the unit the probe ran on
+    :type unit_name: str
+    :param command: The probe
+    :type command: str
+    :param result: The result, e.g. {'Code': '0', 'Stdout': '', 'Stderr': ''}
+    :type result: Dict[str, str]
+    :param model_name: Name of the model of the unit
+    :type model_name: str
+    """
+    if TTL <= 0 or str(result.get("Code")) != "0" or not result.get("Stdout", "").strip():
+        return
+    with _lock:
+        _results[_key(unit_name, command, model_name)] = (time.monotonic(), dict(result))
+
+
+def invalidate(units=None, applications=None):
+    """Drop cached probe results.
+
+    The results are dropped from every model, as the same unit can be cached
+    under the name of its model and under None (the current model).  Without
+    units or applications, every result is dropped.
+
+    :param units: Names of the units whose results are dropped
+    :type units: Optional[Iterable[str]]
+    :param applications: Names of the applications whose results are dropped
+    :type applications: Optional[Iterable[str]]
+    """
+    with _lock:
+        if units is None and applications is None:
+            _results.clear()
+            return
+        units = set(units or ())
+        applications = set(applications or ())
+        for key in list(_results):
+            if key[1] in units or key[1].split("/", 1)[0] in applications:
+                del _results[key]
@@ -0,0 +1,308 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Live progress view of the waits for applications to settle.
+
+While enabled (e.g. by the cli, when it runs in a terminal), the waits for
+application states show a dashboard on the terminal with, for each
+application, how many of its units are ready and which ones are not (with
+their workload and agent status), the upgrade steps that are running, the
+rate at which units become ready and the time left at that rate.
+
+The dashboard is fed by the wait loop, which already evaluates every unit, and
+by an observer of the unit deltas that libjuju receives from the model's
+AllWatcher, so it makes no status calls of its own.  It is redrawn at most every
+RENDER_INTERVAL seconds.
+"""
+
+import sys
+import threading
+import time
+import weakref
+
+# minimum number of seconds between two redraws of the dashboard
+RENDER_INTERVAL = 1.0
+# number of units that are not ready to list per application
+MAX_UNITS_LISTED = 5
+
+ENABLED = False
+_stream = None
+
+_steps_lock = threading.Lock()
+_active_steps = {}
+
+# The dashboards following each model, see Dashboard.watch().  libjuju can't
+# remove an observer, so each model gets a single observer that forwards the
+# unit deltas to the dashboards watching it at the time.
+_dashboards = weakref.WeakKeyDictionary()
+
+
+def enable(stream=None):
+    """Show the dashboard during the waits.
+
+    :param stream: The terminal to draw on, default is sys.stderr
+    :type stream: Optional[TextIO]
+    """
+    global ENABLED, _stream
+    ENABLED = True
+    _stream = stream
+
+
+def disable():
+    """Stop showing the dashboard."""
+    global ENABLED, _stream
+    ENABLED = False
+    _stream = None
+
+
+def step_started(description):
+    """Record that an upgrade step is running.
+
+    :param description: The description of the step
+    :type description: str
+    """
+    with _steps_lock:
+        _active_steps[description] = time.time()
+
+
+def step_finished(description):
+    """Record that an upgrade step is no longer running.
+
+    :param description: The description of the step
+    :type description: str
+    """
+    with _steps_lock:
+        _active_steps.pop(description, None)
+
+
+def get_active_steps():
+    """Return the running upgrade steps and when they started.
+
+    :returns: start time (epoch) keyed on step description
+    :rtype: Dict[str, float]
+    """
+    with _steps_lock:
+        return dict(_active_steps)
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return "{}h{:02d}m".format(hours, minutes)
+    return "{}m{:02d}s".format(minutes, seconds)
+
+
+class Dashboard(object):
+    """Progress of one wait for application states."""
+
+    def __init__(self, applications, stream=None, clock=time.time):
+        """Start tracking the applications.
+
+        :param applications: The applications being waited on
+        :type applications: Iterable[str]
+        :param stream: The terminal to draw on, default is sys.stderr
+        :type stream: Optional[TextIO]
+        :param clock: Returns the current time, in seconds
+        :type clock: Callable[[], float]
+        """
+        self.stream = stream or sys.stderr
+        self.clock = clock
+        self.start = clock()
+        self.applications = {app: {} for app in applications}
+        self.ready_apps = set()
+        # unit name -> "workload/agent" status, from the model deltas
+        self.unit_status = {}
+        self.became_ready = 0
+        self._model = None
+        self._lines = 0
+        self._last_render = None
+        self._dirty = True
+
+    def watch(self, model):
+        """Follow the unit status changes of the model.
+
+        :param model: The model to observe
+        :type model: juju.model.Model
+        """
+        self._model = model
+        dashboards = _dashboards.get(model)
+        if dashboards is None:
+            dashboards = _dashboards[model] = set()
+
+            async def _on_unit_change(delta, old_obj, new_obj, model):
+                for dashboard in list(dashboards):
+                    await dashboard._on_unit_change(delta, old_obj, new_obj, model)
+
+            model.add_observer(_on_unit_change, entity_type="unit")
+        dashboards.add(self)
+
+    async def _on_unit_change(self, delta, old_obj, new_obj, model):
+        unit = old_obj if new_obj is None else new_obj
+        if unit is None:
+            return
+        # the new_obj of a remove delta is a dead unit, not None
+        if new_obj is None or new_obj.dead:
+            self.unit_status.pop(unit.entity_id, None)
+        else:
+            self.unit_status[unit.entity_id] = "{}/{}".format(
+                new_obj.workload_status, new_obj.agent_status
+            )
+        self._dirty = True
+
+    def unit_checked(self, application, unit_name, ready):
+        """Record whether a unit is ready, as checked by the wait loop.
+
+        :param application: The application of the unit
+        :type application: str
+        :param unit_name: The name of the unit
+        :type unit_name: str
+        :param ready: Whether the unit is in the desired state
+        :type ready: bool
+        """
+        units = self.applications.setdefault(application, {})
+        was_ready = units.get(unit_name)
+        if was_ready != ready:
+            if ready and was_ready is False:
+                self.became_ready += 1
+            units[unit_name] = ready
+            self._dirty = True
+
+    def application_ready(self, application):
+        """Record that all the units of an application are ready.
+
+        :param application: The application
+        :type application: str
+        """
+        self.ready_apps.add(application)
+        for unit_name, ready in self.applications.get(application, {}).items():
+            if ready is False:
+                self.became_ready += 1
+            self.applications[application][unit_name] = True
+        self._dirty = True
+
+    def lines(self):
+        """Return the lines of the dashboard.
+
+        :returns: the lines
+        :rtype: List[str]
+        """
+        now = self.clock()
+        elapsed = now - self.start
+        units = [ready for app in self.applications.values() for ready in app.values()]
+        ready = sum(units)
+        lines = [
+            "Waiting for {} of {} applications, {}/{} units ready, {} elapsed".format(
+                len(self.applications) - len(self.ready_apps),
+                len(self.applications),
+                ready,
+                len(units),
+                _format_duration(elapsed),
+            )
+        ]
+        rate = self.became_ready / elapsed * 60 if elapsed > 0 else 0.0
+        if rate > 0:
+            eta = (len(units) - ready) / rate * 60
+            lines.append("{:.1f} units/min, about {} left".format(rate, _format_duration(eta)))
+        else:
+            lines.append("0.0 units/min, time left unknown")
+        for description, started in sorted(get_active_steps().items(), key=lambda i: i[1]):
+            lines.append("running: {} ({})".format(description, _format_duration(now - started)))
+        for app in sorted(self.applications):
+            if app in self.ready_apps:
+                continue
+            app_units = self.applications[app]
+            waiting = sorted(name for name, unit_ready in app_units.items() if not unit_ready)
+            lines.append(
+                "  {}: {}/{} ready".format(app, len(app_units) - len(waiting), len(app_units))
+            )
+            for name in waiting[:MAX_UNITS_LISTED]:
+                lines.append("    {} {}".format(name, self.unit_status.get(name, "")).rstrip())
+            if len(waiting) > MAX_UNITS_LISTED:
+                lines.append("    ... and {} more".format(len(waiting) - MAX_UNITS_LISTED))
+        return lines
+
+    def render(self, force=False):
+        """Redraw the dashboard, if it changed and wasn't drawn too recently.
+
+        :param force: Redraw now, if it changed
+        :type force: bool
+        """
+        now = self.clock()
+        if not self._dirty:
+            return
+        if (
+            not force
+            and self._last_render is not None
+            and now - self._last_render < RENDER_INTERVAL
+        ):
+            return
+        lines = self.lines()
+        out = []
+        if self._lines:
+            # move to the start of the previous dashboard and clear it
+            out.append("\x1b[{}F\x1b[J".format(self._lines))
+        out.extend(line + "\n" for line in lines)
+        self.stream.write("".join(out))
+        self.stream.flush()
+        self._lines = len(lines)
+        self._last_render = now
+        self._dirty = False
+
+    def close(self):
+        """Draw the final state, and stop following the model."""
+        self.render(force=True)
+        if self._model is not None:
+            _dashboards.get(self._model, set()).discard(self)
+            self._model = None
+
+
+class _NullDashboard(object):
+    """Dashboard used while the dashboard is disabled."""
+
+    def watch(self, model):
+        pass
+
+    def unit_checked(self, application, unit_name, ready):
+        pass
+
+    def application_ready(self, application):
+        pass
+
+    def render(self, force=False):
+        pass
+
+    def close(self):
+        pass
+
+
+_NULL_DASHBOARD = _NullDashboard()
+
+
+def start(model, applications):
+    """Start the dashboard of a wait, if enabled.
+
+    :param model: The model being waited on
+    :type model: juju.model.Model
+    :param applications: The applications being waited on
+    :type applications: Iterable[str]
+    :returns: The dashboard, which does nothing if the dashboard is disabled
+    :rtype: Dashboard
+    """
+    if not ENABLED:
+        return _NULL_DASHBOARD
+    dashboard = Dashboard(applications, stream=_stream)
+    dashboard.watch(model)
+    return dashboard
@@ -13,30 +13,38 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Provide read-only Dictionaries and Lists."""
+"""Provide read-only Dictionaries and Lists.
+
+The read-only structures are built eagerly: when a ReadOnlyDict or
+ReadOnlyList is constructed, every nested mapping or sequence is wrapped once
+and stored in place.  Reading an item afterwards returns the stored wrapper,
+so repeated (attribute) access of nested options does not allocate.
+"""
 
 
 import collections
 
 
-class ReadOnlyDict(collections.OrderedDict):
+class ReadOnlyDict(dict):
     """The ReadOnly dictionary accessible via attributes."""
 
+    __slots__ = ()
+
     def __init__(self, data):
         """Initialise the dictionary, by copying the keys and values.
 
-        This recurses till the values are simple values, or callables.
+        This recurses till the values are simple values, or callables.  The
+        nested values are resolved here, once, rather than on each access.
 
         :param data: a dictionary/mapping supporting structure (iter)
         :type data: instanceof collections.abc.Mapping
         :raises AssertionError: if data is not iterable and mapping
         """
         assert isinstance(data, collections.abc.Mapping)
-        for k, v in data.items():
-            super().__setitem__(k, v)
+        super().__init__((k, resolve_immutable(v)) for k, v in data.items())
 
     def __getitem__(self, key):
-        """Get the item using the key, resolves a callable.
+        """Get the item using the key.
 
         Note if the key has '_' in it, then they will be tried first.  If a key
         error occurs then the '_' will be converted to '-' and tried again.
@@ -46,9 +54,9 @@ class ReadOnlyDict(collections.OrderedDict):
         :returns: value of item
         """
         try:
-            return resolve_immutable(super().__getitem__(key))
+            return super().__getitem__(key)
         except KeyError:
-            return resolve_immutable(super().__getitem__(key.replace("_", "-")))
+            return super().__getitem__(key.replace("_", "-"))
 
     __getattr__ = __getitem__
 
@@ -60,13 +68,21 @@ class ReadOnlyDict(collections.OrderedDict):
         """Set the item; disabled."""
         raise TypeError("{} does not allow setting of items".format(self.__class__.__name__))
 
+    def _modify(self, *_, **__):
+        """Change the dictionary; disabled."""
+        raise TypeError("{} does not allow changing items".format(self.__class__.__name__))
+
+    # every other way dict has to change the items
+    __delitem__ = __delattr__ = __ior__ = _modify
+    clear = pop = popitem = setdefault = update = _modify
+
     def __serialize__(self):
-        """Serialise ourself (the OrderedDict) to a regular dictionary.
+        """Serialise ourself to a regular dictionary.
 
         :returns: a dictionary of self
         :rtype: Dict
         """
-        return {k: v for k, v in self.items()}
+        return {k: _serialize(v) for k, v in self.items()}
 
 
 class ReadOnlyList(tuple):
@@ -76,6 +92,8 @@ class ReadOnlyList(tuple):
     read-only structure.  The purpose is to make a read-only list.
     """
 
+    __slots__ = ()
+
     def __new__(cls, data):
         """Take data and copies it to an internal tuple.
 
@@ -84,27 +102,24 @@ class ReadOnlyList(tuple):
         :param data: must be iterable, so that it can be copied.
         :type data: has __iter__ method
         """
-        return tuple.__new__(cls, [v for v in data])
+        return tuple.__new__(cls, [resolve_immutable(v) for v in data])
 
     def __getitem__(self, index):
-        """Get the item at index, resolving the values as needed.
+        """Get the item at index; a slice is returned as a ReadOnlyList.
 
         :param index: the index of item to get.
-        :type index: int
+        :type index: Union[int, slice]
         :returns: the data item from the typle
         :rtype: ANY
         """
-        return resolve_immutable(super().__getitem__(index))
+        if isinstance(index, slice):
+            return ReadOnlyList(super().__getitem__(index))
+        return super().__getitem__(index)
 
     def __setattr__(self, *_):
         """Set the attribute; disabled."""
         raise TypeError("{} does not allow setting of items".format(self.__class__.__name__))
 
-    def __iter__(self):
-        """Yield values from the list."""
-        for v in super().__iter__():
-            yield resolve_immutable(v)
-
     def __repr__(self):
         """Return human-readable representation of self."""
         return "{}(({}))".format(
@@ -117,7 +132,20 @@ class ReadOnlyList(tuple):
 
     def __serialize__(self):
         """Turn the tuple into a list."""
-        return [v for v in self]
+        return [_serialize(v) for v in self]
+
+
+def _serialize(value):
+    """Turn a (possibly) read-only value back into plain python structures.
+
+    :param value: the value to serialise
+    :type value: ANY
+    :returns: the value with ReadOnlyDict/ReadOnlyList replaced by dict/list
+    :rtype: ANY
+    """
+    if isinstance(value, (ReadOnlyDict, ReadOnlyList)):
+        return value.__serialize__()
+    return value
 
 
 def resolve_immutable(value):
@@ -125,6 +153,7 @@ def resolve_immutable(value):
 
     If it's a dictionary like object, return the ReadOnlyDict() object.
     If it's a list like object, return the ReadOnlyList() object.
+    Values that are already read-only are returned as-is.
     Otherwise, just return the value.
 
     :param value: the value to resolve
@@ -133,6 +162,8 @@ def resolve_immutable(value):
     :rtype: Union[type(value), ReadOnlyDict[type(value)],
                 ReadOnlyList[type(value)]]
     """
+    if isinstance(value, (ReadOnlyDict, ReadOnlyList)):
+        return value
     if isinstance(value, collections.abc.Mapping):
         return ReadOnlyDict(value)
     elif not isinstance(value, str) and isinstance(value, collections.abc.Sequence):
@@ -0,0 +1,352 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compact representation of the juju status.
+
+The FullStatus returned by libjuju is a tree of objects, each with its own
+__dict__, which for models with thousands of units takes a lot of memory and
+garbage collection time.  compact_status() converts it to records with
+__slots__, which keep every field of the libjuju status.  Names and status
+strings (e.g. 'active', 'idle' or 'Unit is ready') are interned, so each of
+them is stored once however many units share it.
+
+The records can be read the same way as the libjuju objects: as attributes
+(unit.workload_status), as items with the juju keys (unit["workload-status"])
+or with get().
+"""
+
+import sys
+import types
+
+# Shared by all the records without subordinates, containers, etc.
+_EMPTY = types.MappingProxyType({})
+
+
+def _intern(value):
+    """Intern value if it is a string.
+
+    :param value: Value to intern
+    :type value: Any
+    :returns: The interned value
+    :rtype: Any
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _field(value):
+    """Convert a field that needs no particular conversion.
+
+    :param value: Value of the field
+    :type value: Any
+    :returns: The interned value, or None for an empty collection (which
+        libjuju has for missing fields)
+    :rtype: Any
+    """
+    if isinstance(value, (dict, list)) and not value:
+        return None
+    return _intern(value)
+
+
+class _Record:
+    """Base of the status records.
+
+    The juju keys of a record are its slots, with '-' instead of '_' (and
+    without the trailing '_' of e.g. int_).
+    """
+
+    __slots__ = ()
+    # juju key <-> attribute name
+    _KEYS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        """Map the juju keys of a record to its attributes."""
+        super().__init_subclass__(**kwargs)
+        cls._KEYS = {attr.rstrip("_").replace("_", "-"): attr for attr in cls.__slots__}
+
+    def __init__(self, **kwargs):
+        """Initialise the record, missing attributes are None."""
+        for attr in self.__slots__:
+            setattr(self, attr, kwargs.get(attr))
+
+    def __getitem__(self, key):
+        """Get the attribute of a juju key."""
+        try:
+            return getattr(self, self._KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        """Return True if key is a juju key of the record."""
+        return key in self._KEYS
+
+    def __eq__(self, other):
+        """Compare the attributes of two records."""
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, attr) == getattr(other, attr) for attr in self.__slots__)
+
+    def __repr__(self):
+        """Represent the record."""
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join("{}={!r}".format(attr, getattr(self, attr)) for attr in self.__slots__),
+        )
+
+    def get(self, key, default=None):
+        """Get the attribute of a juju key, or default if there is no such key.
+
+        :param key: The juju key, e.g. 'workload-status'
+        :type key: str
+        :param default: The value returned for unknown keys
+        :type default: Any
+        :returns: The value of the key
+        :rtype: Any
+        """
+        attr = self._KEYS.get(key)
+        return default if attr is None else getattr(self, attr)
+
+    def keys(self):
+        """Return the juju keys of the record."""
+        return self._KEYS.keys()
+
+
+class DetailedStatus(_Record):
+    """Status of an agent, workload, machine instance or application."""
+
+    __slots__ = ("status", "info", "since", "version", "kind", "life", "data", "err")
+
+
+class UnitStatus(_Record):
+    """Status of a unit."""
+
+    __slots__ = (
+        "agent_status",
+        "workload_status",
+        "workload_version",
+        "charm",
+        "leader",
+        "machine",
+        "address",
+        "public_address",
+        "opened_ports",
+        "provider_id",
+        "subordinates",
+    )
+
+
+class ApplicationStatus(_Record):
+    """Status of an application."""
+
+    __slots__ = (
+        "charm",
+        "charm_channel",
+        "series",
+        "life",
+        "exposed",
+        "status",
+        "subordinate_to",
+        "relations",
+        "units",
+        "workload_version",
+        "public_address",
+        "can_upgrade_to",
+        "base",
+        "charm_profile",
+        "charm_version",
+        "endpoint_bindings",
+        "err",
+        "exposed_endpoints",
+        "int_",
+        "meter_statuses",
+        "provider_id",
+    )
+
+
+class MachineStatus(_Record):
+    """Status of a machine."""
+
+    __slots__ = (
+        "id",
+        "agent_status",
+        "instance_status",
+        "series",
+        "hostname",
+        "dns_name",
+        "instance_id",
+        "containers",
+        "display_name",
+        "base",
+        "constraints",
+        "hardware",
+        "has_vote",
+        "wants_vote",
+        "ip_addresses",
+        "jobs",
+        "lxd_profiles",
+        "modification_status",
+        "network_interfaces",
+        "primary_controller_machine",
+    )
+
+
+class ModelStatus(_Record):
+    """Status of a model."""
+
+    __slots__ = (
+        "model",
+        "applications",
+        "machines",
+        "relations",
+        "controller_timestamp",
+        "branches",
+        "offers",
+        "remote_applications",
+    )
+
+
+def _record(cls, data, **converted):
+    """Convert the fields of data to a record.
+
+    :param cls: The class of the record
+    :type cls: Type[_Record]
+    :param data: The libjuju status (or a dict)
+    :type data: Any
+    :param converted: The fields already converted, by attribute name; the
+        other fields are converted with _field().
+    :type converted: Any
+    :returns: The record
+    :rtype: _Record
+    """
+    return cls(
+        **{
+            attr: converted[attr] if attr in converted else _field(data.get(key))
+            for key, attr in cls._KEYS.items()
+        }
+    )
+
+
+def _detailed_status(data):
+    """Convert a DetailedStatus.
+
+    :param data: The libjuju DetailedStatus (or a dict)
+    :type data: Optional[DetailedStatus]
+    :returns: The compact status
+    :rtype: Optional[DetailedStatus]
+    """
+    if not data:
+        return None
+    return _record(DetailedStatus, data, since=data.get("since"))
+
+
+def _unit_status(data):
+    """Convert a UnitStatus, and its subordinates.
+
+    :param data: The libjuju UnitStatus (or a dict)
+    :type data: UnitStatus
+    :returns: The compact status
+    :rtype: UnitStatus
+    """
+    subordinates = data.get("subordinates")
+    return _record(
+        UnitStatus,
+        data,
+        agent_status=_detailed_status(data.get("agent-status")),
+        workload_status=_detailed_status(data.get("workload-status")),
+        address=data.get("address"),
+        public_address=data.get("public-address"),
+        subordinates=(
+            {_intern(name): _unit_status(sub) for name, sub in subordinates.items()}
+            if subordinates
+            else _EMPTY
+        ),
+    )
+
+
+def _application_status(data):
+    """Convert an ApplicationStatus, and its units.
+
+    :param data: The libjuju ApplicationStatus (or a dict)
+    :type data: ApplicationStatus
+    :returns: The compact status
+    :rtype: ApplicationStatus
+    """
+    units = data.get("units")
+    relations = data.get("relations")
+    return _record(
+        ApplicationStatus,
+        data,
+        status=_detailed_status(data.get("status")),
+        subordinate_to=tuple(_intern(app) for app in data.get("subordinate-to") or ()),
+        relations=(
+            {
+                _intern(endpoint): tuple(_intern(app) for app in apps)
+                for endpoint, apps in relations.items()
+            }
+            if relations
+            else _EMPTY
+        ),
+        units=(
+            {_intern(name): _unit_status(unit) for name, unit in units.items()}
+            if units
+            else _EMPTY
+        ),
+        public_address=data.get("public-address"),
+    )
+
+
+def _machine_status(data):
+    """Convert a MachineStatus, and its containers.
+
+    :param data: The libjuju MachineStatus (or a dict)
+    :type data: MachineStatus
+    :returns: The compact status
+    :rtype: MachineStatus
+    """
+    containers = data.get("containers")
+    return _record(
+        MachineStatus,
+        data,
+        agent_status=_detailed_status(data.get("agent-status")),
+        instance_status=_detailed_status(data.get("instance-status")),
+        modification_status=_detailed_status(data.get("modification-status")),
+        containers=(
+            {_intern(name): _machine_status(machine) for name, machine in containers.items()}
+            if containers
+            else _EMPTY
+        ),
+    )
+
+
+def compact_status(status):
+    """Convert the status of a model to its compact representation.
+
+    :param status: The status, as returned by libjuju's Model.get_status()
+    :type status: juju.client._definitions.FullStatus
+    :returns: The compact status
+    :rtype: ModelStatus
+    """
+    applications = status.get("applications") or {}
+    machines = status.get("machines") or {}
+    return _record(
+        ModelStatus,
+        status,
+        applications={
+            _intern(name): _application_status(app) for name, app in applications.items()
+        },
+        machines={
+            _intern(machine_id): _machine_status(machine)
+            for machine_id, machine in machines.items()
+        },
+    )
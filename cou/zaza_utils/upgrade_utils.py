@@ -15,11 +15,17 @@
 
 """Manage global upgrade utilities."""
 
+import asyncio
+import collections
 import itertools
 import logging
 import re
 
-from cou.zaza_utils import model, os_versions
+from cou.zaza_utils import model, os_versions, probe_cache, sync_wrapper
+
+# model name -> {application: OpenStack codename}, see
+# async_get_current_os_releases()
+_CURRENT_OS_RELEASES = {}
 
 
 def extract_charm_name_from_url(charm_url):
@@ -163,3 +169,121 @@ def get_database_app(model_name=None):
         charm_name = extract_charm_name_from_url(app_config["charm"])
         if charm_name == "mysql-innodb-cluster" and _check_db_relations(app_config):
             return app
+
+
+async def async_get_package_versions(unit_names, package, model_name=None):
+    """Get the installed version of a package on units.
+
+    The package is queried once per machine, for all the machines in a single
+    call, see model.async_run_on_unit_machines(), and the result is cached as
+    a probe, see probe_cache.
+
+    :param unit_names: Names of the units
+    :type unit_names: Iterable[str]
+    :param package: Name of the package
+    :type package: str
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :returns: Package version, or None if it is not installed, keyed on unit
+    :rtype: Dict[str, Optional[str]]
+    """
+    unit_names = list(unit_names)
+    cmd = "dpkg-query --show --showformat='${{Version}}' {}".format(package)
+    results = await model.async_run_on_unit_machines(
+        unit_names, cmd, model_name=model_name, max_age=probe_cache.TTL
+    )
+    versions = {}
+    for unit_name in unit_names:
+        result = results.get(unit_name) or {}
+        if str(result.get("Code")) != "0":
+            logging.warning("Unable to get version of {} on {}".format(package, unit_name))
+            versions[unit_name] = None
+        else:
+            versions[unit_name] = result.get("Stdout", "").strip() or None
+    return versions
+
+
+get_package_versions = sync_wrapper(async_get_package_versions)
+
+
+async def async_get_current_os_releases(model_name=None, refresh=False):
+    """Get the OpenStack release currently running for each application.
+
+    The package versions of every unit of every application whose charm is in
+    os_versions.CHARM_PACKAGES are collected in one concurrent sweep, and then
+    mapped to a codename.  An application is reported at the release of its
+    oldest unit, or None if the release of any of its units is unknown (the
+    package is not installed, or its version is not in the lookup table).
+
+    The result is cached per model, so that the planner can ask for it as
+    often as it needs; pass refresh=True (or call
+    clear_current_os_releases_cache()) after the payload has been upgraded.
+
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :param refresh: Ignore any cached result for the model.
+    :type refresh: bool
+    :returns: OpenStack codename keyed on application name
+    :rtype: Dict[str, Optional[str]]
+    """
+    key = str(model_name)
+    if not refresh and key in _CURRENT_OS_RELEASES:
+        return _CURRENT_OS_RELEASES[key]
+
+    status = await model.async_get_status(model_name=model_name)
+    # package -> [(application, unit name)]
+    targets = collections.defaultdict(list)
+    for app, app_config in status.applications.items():
+        package = os_versions.CHARM_PACKAGES.get(extract_charm_name_from_url(app_config["charm"]))
+        if package is None:
+            continue
+        for unit_name in app_config.get("units") or {}:
+            targets[package].append((app, unit_name))
+
+    packages = list(targets)
+    versions = await asyncio.gather(
+        *(
+            async_get_package_versions(
+                [unit_name for _, unit_name in targets[package]], package, model_name=model_name
+            )
+            for package in packages
+        )
+    )
+
+    releases = {}
+    unknown = set()
+    for package, package_versions in zip(packages, versions):
+        for app, unit_name in targets[package]:
+            version = package_versions[unit_name]
+            codename = os_versions.get_os_codename_from_package_version(package, version)
+            current = releases.get(app)
+            if codename is None:
+                if version is not None:
+                    logging.warning(
+                        "Unknown OpenStack release of {} {} on {}".format(
+                            package, version, unit_name
+                        )
+                    )
+                unknown.add(app)
+            elif current is None or os_versions.CompareOpenStack(codename) < current:
+                releases[app] = codename
+    releases.update((app, None) for app in unknown)
+    _CURRENT_OS_RELEASES[key] = releases
+    return releases
+
+
+get_current_os_releases = sync_wrapper(async_get_current_os_releases)
+
+
+def clear_current_os_releases_cache(model_name=None, all_models=False):
+    """Forget the cached OpenStack releases of a model.
+
+    :param model_name: Name of model to forget, None for the current model.
+    :type model_name: Optional[str]
+    :param all_models: Forget the releases of every model instead.
+    :type all_models: bool
+    """
+    if all_models:
+        _CURRENT_OS_RELEASES.clear()
+    else:
+        _CURRENT_OS_RELEASES.pop(str(model_name), None)
@@ -0,0 +1,66 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+
+import pytest
+
+from cou.steps import UpgradeStep, serialization
+from cou.steps.backup import backup
+
+SIZES = [100, 1000, 10000]
+
+
+def _large_plan(num_steps):
+    """Return a plan of num_steps unit steps, in groups of 10 per application."""
+    plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+    for app_index in range(num_steps // 10):
+        app = UpgradeStep(description="app{}".format(app_index), parallel=True, function=None)
+        for unit_index in range(10):
+            app.add_step(
+                UpgradeStep(
+                    description="unit {}".format(unit_index),
+                    parallel=False,
+                    function=backup,
+                    unit="app{}/{}".format(app_index, unit_index),
+                )
+            )
+        plan.add_step(app)
+    return plan
+
+
+@pytest.mark.parametrize("num_steps", SIZES)
+def test_load_plan_file(bench, num_steps):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "plan.json")
+        serialization.save_plan_file(_large_plan(num_steps), path)
+        bench(
+            "load_plan_file[{}]".format(num_steps),
+            lambda: serialization.load_plan_file(path),
+        )
+        plan = serialization.load_plan_file(path)
+    assert len(plan.sub_steps) == num_steps // 10
+
+
+@pytest.mark.parametrize("num_steps", SIZES)
+def test_save_plan_file(bench, num_steps):
+    plan = _large_plan(num_steps)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "plan.json")
+        bench(
+            "save_plan_file[{}]".format(num_steps),
+            lambda: serialization.save_plan_file(plan, path),
+        )
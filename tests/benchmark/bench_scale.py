@@ -0,0 +1,68 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from cou.zaza_utils import model, os_versions, upgrade_utils
+from tests.benchmark.fake_model import fake_juju, generate_model
+
+SCALES = [10, 100, 1000]
+
+
+@pytest.mark.parametrize("num_units", SCALES)
+def test_get_upgrade_groups(bench, num_units):
+    fake = generate_model(num_units)
+    with fake_juju(fake):
+        groups = upgrade_utils.get_upgrade_groups()
+        bench(
+            "get_upgrade_groups[{}]".format(num_units),
+            upgrade_utils.get_upgrade_groups,
+            setup=lambda: model._GET_STATUS_TIMES.clear() or (),
+        )
+    apps = [app for _, group in groups for app in group]
+    expected = [
+        app
+        for app in fake.applications.values()
+        if not app.subordinate_to and app.charm_name not in os_versions.UPGRADE_EXCLUDE_LIST
+    ]
+    assert len(apps) == len(expected)
+
+
+@pytest.mark.parametrize("num_units", SCALES)
+def test_check_model_for_hard_errors(bench, num_units):
+    fake = generate_model(num_units)
+    with fake_juju(fake):
+        bench(
+            "check_model_for_hard_errors[{}]".format(num_units),
+            lambda: model.check_model_for_hard_errors(fake),
+        )
+        model.watch_model_state(fake)
+        bench(
+            "check_model_for_hard_errors_indexed[{}]".format(num_units),
+            lambda: model.check_model_for_hard_errors(fake),
+        )
+
+
+@pytest.mark.parametrize("num_units", SCALES)
+def test_wait_for_application_states(bench, num_units):
+    def _wait(fake):
+        with fake_juju(fake):
+            model.wait_for_application_states(timeout=60)
+
+    bench(
+        "wait_for_application_states[{}]".format(num_units),
+        _wait,
+        setup=lambda: (generate_model(num_units, settle_ticks=3),),
+    )
@@ -0,0 +1,33 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+
+# `cou --help` must finish within this many seconds (COU_BENCHMARK_STARTUP_BUDGET)
+STARTUP_BUDGET = float(os.environ.get("COU_BENCHMARK_STARTUP_BUDGET", "0.5"))
+
+
+def test_help_startup(bench):
+    def _help():
+        subprocess.run(
+            [sys.executable, "-m", "cou", "--help"], check=True, stdout=subprocess.DEVNULL
+        )
+
+    timing = bench("cou --help", _help, repeat=5)
+    assert timing < STARTUP_BUDGET, "cou --help took {:.3f}s, the budget is {}s".format(
+        timing, STARTUP_BUDGET
+    )
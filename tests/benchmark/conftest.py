@@ -0,0 +1,99 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark harness.
+
+The benchmarks are run with `tox -e benchmark` (or `make benchmark`).  The
+timings can be saved and compared to a previous run with environment
+variables:
+
+ - COU_BENCHMARK_SAVE: write the timings to this JSON file.
+ - COU_BENCHMARK_BASELINE: fail any benchmark that is slower than the timing
+   in this JSON file by more than the tolerance.
+ - COU_BENCHMARK_TOLERANCE: allowed slow down, as a fraction (default 0.25).
+ - COU_BENCHMARK_MIN_DELTA: slow downs of less than this many seconds are
+   noise, not regressions (default 0.005).
+ - COU_BENCHMARK_STARTUP_BUDGET: the most `cou --help` may take, in seconds
+   (default 0.5).
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+RESULTS = {}
+
+
+def _load_baseline():
+    path = os.environ.get("COU_BENCHMARK_BASELINE")
+    if not path:
+        return {}
+    with open(path, "r") as baseline:
+        return json.load(baseline)
+
+
+BASELINE = _load_baseline()
+TOLERANCE = float(os.environ.get("COU_BENCHMARK_TOLERANCE", "0.25"))
+MIN_DELTA = float(os.environ.get("COU_BENCHMARK_MIN_DELTA", "0.005"))
+
+
+@pytest.fixture
+def bench():
+    """Return a function that times func, records it and checks the baseline.
+
+    The function is called as bench(name, func, setup=None, repeat=3); setup
+    is run (untimed) before each call and its return value is passed as the
+    arguments of func.  The best of the repeats is kept.
+    """
+
+    def _bench(name, func, setup=None, repeat=3):
+        timings = []
+        for _ in range(repeat):
+            args = setup() if setup is not None else ()
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        RESULTS[name] = best
+        baseline = BASELINE.get(name)
+        if (
+            baseline is not None
+            and best > baseline * (1 + TOLERANCE)
+            and best - baseline > MIN_DELTA
+        ):
+            pytest.fail(
+                "{} regressed: {:.4f}s against a baseline of {:.4f}s".format(name, best, baseline)
+            )
+        return best
+
+    return _bench
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report the timings, and save them if asked to."""
+    if not RESULTS:
+        return
+    terminalreporter.section("benchmarks")
+    for name, timing in sorted(RESULTS.items()):
+        baseline = BASELINE.get(name)
+        change = " ({:+.0%})".format(timing / baseline - 1) if baseline else ""
+        terminalreporter.write_line("{:<50} {:>10.4f}s{}".format(name, timing, change))
+    path = os.environ.get("COU_BENCHMARK_SAVE")
+    if path:
+        with open(path, "w") as output:
+            json.dump(RESULTS, output, indent=2, sort_keys=True)
+        terminalreporter.write_line("timings saved to {}".format(path))
@@ -0,0 +1,360 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Local fake of a Juju model, used to exercise cou at scale.
+
+generate_model() builds a FakeModel of any size: OpenStack applications with
+their units spread over (hyperconverged) machines, and subordinate
+applications with a unit next to each principal unit.  The objects expose the
+parts of the libjuju Model/Application/Unit/Machine API and of the FullStatus
+response that cou uses, and fake_juju() makes cou.zaza_utils.model use the
+fake model instead of connecting to a controller.
+
+Units start out executing and settle to active/idle after a number of ticks.
+Under fake_juju(), every asyncio.sleep() is a tick, so the wait loops make
+progress exactly as they would against a real model, without sleeping.
+"""
+
+import asyncio
+import contextlib
+import itertools
+
+import mock
+
+import cou.zaza_utils as zaza
+from cou.zaza_utils import model as zaza_model
+from cou.zaza_utils import os_versions
+
+# charms that use 'source' rather than 'openstack-origin'
+SOURCE_CHARMS = {"ceph-mon", "ceph-osd", "ceph-radosgw", "mysql-innodb-cluster", "rabbitmq-server"}
+SUBORDINATE_CHARMS = ["hacluster", "neutron-openvswitch", "mysql-router", "ceilometer-agent"]
+
+
+class FakeStatusEntry(dict):
+    """A FullStatus entry, supporting both item and attribute access."""
+
+    def __getattr__(self, key):
+        """Get the (possibly '-' separated) key."""
+        try:
+            return self[key]
+        except KeyError:
+            try:
+                return self[key.replace("_", "-")]
+            except KeyError:
+                raise AttributeError(key)
+
+
+class FakeMachine:
+    """A machine of the fake model."""
+
+    def __init__(self, machine_id, series="focal"):
+        """Initialise the machine."""
+        self.id = machine_id
+        self.entity_id = machine_id
+        self.series = series
+        self.status = "running"
+        self.agent_status = "started"
+        self.units = []
+
+
+class FakeUnit:
+    """A unit of the fake model."""
+
+    def __init__(self, name, application, machine, leader=False, settle_ticks=0):
+        """Initialise the unit, settling after settle_ticks ticks."""
+        self.name = name
+        self.entity_id = name
+        self.tag = "unit-{}".format(name.replace("/", "-"))
+        self.application = application
+        self.machine = machine
+        self.leader = leader
+        self.subordinates = []
+        self.ticks_left = settle_ticks
+        if settle_ticks:
+            self.workload_status = "maintenance"
+            self.workload_status_message = "installing packages"
+            self.agent_status = "executing"
+        else:
+            self.settle()
+
+    def settle(self):
+        """Move the unit to the active/idle state."""
+        self.ticks_left = 0
+        self.workload_status = "active"
+        self.workload_status_message = "Unit is ready"
+        self.agent_status = "idle"
+
+    def tick(self):
+        """Make progress towards settling.
+
+        :returns: whether the unit changed state
+        :rtype: bool
+        """
+        if self.ticks_left:
+            self.ticks_left -= 1
+            if not self.ticks_left:
+                self.settle()
+                return True
+        return False
+
+    @property
+    def safe_data(self):
+        """Return the unit data, as libjuju does for a live unit."""
+        return self.data
+
+    @property
+    def data(self):
+        """Return the unit data, as libjuju keeps it."""
+        return {
+            "name": self.name,
+            "application": self.application,
+            "machine-id": self.machine.id,
+            "agent-status": {"current": self.agent_status, "message": ""},
+            "workload-status": {
+                "current": self.workload_status,
+                "message": self.workload_status_message,
+            },
+        }
+
+    async def is_leader_from_status(self):
+        """Return whether the unit is the leader."""
+        return self.leader
+
+    def status_entry(self):
+        """Return the FullStatus entry of the unit."""
+        entry = FakeStatusEntry(
+            {
+                "machine": self.machine.id,
+                "leader": self.leader,
+                "agent-status": FakeStatusEntry({"status": self.agent_status}),
+                "workload-status": FakeStatusEntry(
+                    {"status": self.workload_status, "info": self.workload_status_message}
+                ),
+            }
+        )
+        if self.subordinates:
+            entry["subordinates"] = {sub.name: sub.status_entry() for sub in self.subordinates}
+        return entry
+
+
+class FakeApplication:
+    """An application of the fake model."""
+
+    def __init__(self, name, charm, revision=1, subordinate_to=None, relations=None):
+        """Initialise the application."""
+        self.name = name
+        self.charm_name = charm
+        self.charm_url = "ch:amd64/focal/{}-{}".format(charm, revision)
+        self.subordinate_to = subordinate_to or []
+        self.relations = relations or {}
+        self.units = []
+        origin = "source" if charm in SOURCE_CHARMS else "openstack-origin"
+        self.config = {
+            "verbose": {"value": False},
+            origin: {"value": "distro"},
+        }
+
+    async def get_config(self):
+        """Return the application config."""
+        return self.config
+
+    def status_entry(self):
+        """Return the FullStatus entry of the application."""
+        entry = FakeStatusEntry(
+            {
+                "charm": self.charm_url,
+                "subordinate-to": self.subordinate_to,
+                "relations": self.relations,
+                "units": {},
+            }
+        )
+        if not self.subordinate_to:
+            entry["units"] = {unit.name: unit.status_entry() for unit in self.units}
+        return entry
+
+
+class _FakeConnection:
+    is_open = True
+
+
+class FakeModel:
+    """A fake libjuju Model."""
+
+    def __init__(self, name="fake-model"):
+        """Initialise an empty model."""
+        self.info = FakeStatusEntry({"name": name, "uuid": "fake-uuid-{}".format(name)})
+        self.applications = {}
+        self.units = {}
+        self.machines = {}
+        self.status_calls = 0
+        self.observers = []
+
+    def is_connected(self):
+        """Return True, the fake model is always connected."""
+        return True
+
+    def connection(self):
+        """Return the (always open) connection."""
+        return _FakeConnection()
+
+    async def get_status(self, filters=None):
+        """Return a FullStatus-like snapshot of the model."""
+        self.status_calls += 1
+        return FakeStatusEntry(
+            {
+                "model": self.info,
+                "applications": {
+                    name: app.status_entry() for name, app in self.applications.items()
+                },
+                "machines": {
+                    machine_id: FakeStatusEntry(
+                        {
+                            "series": machine.series,
+                            "agent-status": {"status": machine.agent_status},
+                        }
+                    )
+                    for machine_id, machine in self.machines.items()
+                },
+            }
+        )
+
+    def add_observer(self, callable_, entity_type=None, **kwargs):
+        """Register a callback for the changes of entity_type entities."""
+        self.observers.append((callable_, entity_type))
+
+    def tick(self):
+        """Let every unit make progress, and notify the observers of changes."""
+        for unit in self.units.values():
+            if unit.tick():
+                for callable_, entity_type in self.observers:
+                    if entity_type in (None, "unit"):
+                        asyncio.ensure_future(callable_(None, unit, unit, self))
+
+    @property
+    def settled(self):
+        """Return True once all the units have settled."""
+        return all(not unit.ticks_left for unit in self.units.values())
+
+
+def generate_model(
+    num_units,
+    num_apps=None,
+    num_subordinates=2,
+    units_per_machine=3,
+    settle_ticks=0,
+    name="fake-model",
+):
+    """Generate a fake cloud of (about) num_units principal units.
+
+    The principal applications are the charms in os_versions.SERVICE_GROUPS,
+    in order, and the units are dealt out to them round-robin.  Machines host
+    units_per_machine principal units each, like hyperconverged nodes.  Each of
+    the num_subordinates subordinate applications is related to one
+    principal application, and has a unit next to each of its units.
+
+    :param num_units: Number of principal units.
+    :type num_units: int
+    :param num_apps: Number of principal applications (default: one per charm
+        in SERVICE_GROUPS, but no more than num_units)
+    :type num_apps: Optional[int]
+    :param num_subordinates: Number of subordinate applications.
+    :type num_subordinates: int
+    :param units_per_machine: Number of principal units per machine.
+    :type units_per_machine: int
+    :param settle_ticks: Number of ticks before units are active/idle.
+    :type settle_ticks: int
+    :param name: Name of the model.
+    :type name: str
+    :returns: the model
+    :rtype: FakeModel
+    """
+    charms = list(itertools.chain(*(charms for _, charms in os_versions.SERVICE_GROUPS)))
+    if num_apps is None:
+        num_apps = min(len(charms), num_units)
+    model = FakeModel(name)
+    for charm in itertools.islice(itertools.cycle(charms), num_apps):
+        app_name = (
+            charm
+            if charm not in model.applications
+            else "{}-{}".format(charm, len(model.applications))
+        )
+        relations = (
+            {"db-router": ["keystone-mysql-router"]} if charm == "mysql-innodb-cluster" else {}
+        )
+        model.applications[app_name] = FakeApplication(app_name, charm, relations=relations)
+
+    principals = list(model.applications.values())
+    for index in range(num_units):
+        machine_id = str(index // units_per_machine)
+        machine = model.machines.setdefault(machine_id, FakeMachine(machine_id))
+        app = principals[index % len(principals)]
+        unit = FakeUnit(
+            "{}/{}".format(app.name, len(app.units)),
+            app.name,
+            machine,
+            leader=not app.units,
+            settle_ticks=settle_ticks,
+        )
+        app.units.append(unit)
+        machine.units.append(unit)
+        model.units[unit.name] = unit
+
+    for index in range(num_subordinates):
+        principal = principals[index % len(principals)]
+        charm = SUBORDINATE_CHARMS[index % len(SUBORDINATE_CHARMS)]
+        sub_name = "{}-{}".format(principal.name, charm)
+        sub_app = FakeApplication(sub_name, charm, subordinate_to=[principal.name])
+        model.applications[sub_name] = sub_app
+        for unit in principal.units:
+            sub_unit = FakeUnit(
+                "{}/{}".format(sub_name, len(sub_app.units)),
+                sub_name,
+                unit.machine,
+                leader=not sub_app.units,
+                settle_ticks=settle_ticks,
+            )
+            sub_app.units.append(sub_unit)
+            unit.subordinates.append(sub_unit)
+            unit.machine.units.append(sub_unit)
+            model.units[sub_unit.name] = sub_unit
+    return model
+
+
+@contextlib.contextmanager
+def fake_juju(model):
+    """Make cou.zaza_utils.model use the fake model.
+
+    get_model() returns the fake model for any model name, the libjuju thread
+    is not used, the status cache starts empty and asyncio.sleep() ticks the
+    model instead of sleeping.
+
+    :param model: the fake model to use
+    :type model: FakeModel
+    """
+    real_sleep = asyncio.sleep
+
+    async def _get_model(model_name=None):
+        return model
+
+    async def _sleep(delay, result=None):
+        model.tick()
+        return await real_sleep(0, result)
+
+    zaza_model._GET_STATUS_TIMES.clear()
+    with mock.patch.object(zaza, "RUN_LIBJUJU_IN_THREAD", new=False), mock.patch.object(
+        zaza_model, "get_model", new=_get_model
+    ), mock.patch.object(zaza_model.asyncio, "sleep", new=_sleep):
+        yield model
+    zaza_model._GET_STATUS_TIMES.clear()
@@ -14,6 +14,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 """Test steps package."""
+from unittest.mock import MagicMock, patch
+
 from cou.steps import UpgradeStep
 from tests.unit.utils import BaseTestCase
 
@@ -58,3 +60,36 @@ class TestSteps(BaseTestCase):
 
         result = u.run()
         assert result is None
+
+    def test_upgrade_step_run_timings(self):
+        def sample_function():
+            return 1
+
+        u = UpgradeStep(description="test", function=sample_function, parallel=False)
+        self.assertIsNone(u.timings.start_time)
+
+        with patch("cou.steps.instrumentation.get_totals") as mock_get_totals:
+            mock_get_totals.side_effect = [{"sync": 1.0}, {"sync": 3.0, "rpc": 4.0}]
+            self.assertEqual(u.run(), 1)
+
+        self.assertIsNotNone(u.timings.start_time)
+        self.assertTrue(u.timings.completed)
+        self.assertGreaterEqual(u.timings.wall_time, 0.0)
+        self.assertEqual(u.timings.wait_time, 2.0)
+        self.assertEqual(u.timings.rpc_time, 4.0)
+
+    def test_upgrade_step_run_timings_exception(self):
+        def sample_function():
+            raise ValueError()
+
+        u = UpgradeStep(description="test", function=sample_function, parallel=False)
+        with self.assertRaises(ValueError):
+            u.run()
+        self.assertIsNotNone(u.timings.start_time)
+        self.assertFalse(u.timings.completed)
+
+    def test_upgrade_step_run_invalidates_probe_cache(self):
+        u = UpgradeStep(description="test", function=MagicMock(), parallel=False)
+        with patch("cou.steps.probe_cache") as mock_probe_cache:
+            u.run()
+        mock_probe_cache.invalidate.assert_called_once_with()
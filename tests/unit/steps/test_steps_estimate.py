@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cou.steps import StepTarget, StepTimings, UpgradeStep, estimate
+from cou.steps.backup import backup
+
+
+def _step(description, charm=None, units=0, parallel=False):
+    return UpgradeStep(
+        description=description,
+        parallel=parallel,
+        function=backup,
+        target=StepTarget(charm, units) if charm else None,
+    )
+
+
+class EstimateTestCase(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache_dir = os.path.join(tmpdir.name, "cou")
+        env = patch.dict(os.environ, {"COU_CACHE_DIR": self.cache_dir})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_history_key(self):
+        self.assertEqual(estimate.history_key(_step("a", "keystone", 3)), "backup/keystone/3")
+        self.assertEqual(estimate.history_key(_step("a")), "backup//0")
+        step = UpgradeStep(description="a", parallel=False, function=MagicMock())
+        self.assertIsNone(estimate.history_key(step))
+
+    def test_record_and_load_history(self):
+        self.assertEqual(estimate.load_history(), {})
+        plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        ran = _step("ran", "keystone", 3)
+        ran.timings = StepTimings(start_time=1.0, completed=True, wall_time=10.0)
+        plan.add_step(ran)
+        plan.add_step(_step("skipped", "keystone", 3))
+        failed = _step("failed", "nova-compute", 3)
+        failed.timings = StepTimings(start_time=1.0, wall_time=5.0)
+        plan.add_step(failed)
+
+        # nothing ran, nothing to record
+        estimate.record_history(UpgradeStep(description="a", parallel=False, function=None))
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+        with patch.object(estimate, "MAX_TIMINGS", 2):
+            for _ in range(3):
+                estimate.record_history(plan)
+        self.assertEqual(estimate.load_history(), {"backup/keystone/3": [10.0, 10.0]})
+
+    def test_record_history_unwritable(self):
+        with open(os.path.join(os.path.dirname(self.cache_dir), "cou"), "w"):
+            pass
+        ran = _step("ran")
+        ran.timings = StepTimings(start_time=1.0, completed=True, wall_time=10.0)
+        with self.assertLogs(level="WARNING") as logs:
+            estimate.record_history(ran)
+        self.assertIn("Unable to record the step timings", logs.output[-1])
+
+    def test_record_history_replace_fails(self):
+        ran = _step("ran")
+        ran.timings = StepTimings(start_time=1.0, completed=True, wall_time=10.0)
+        with patch("cou.steps.estimate.os.replace", side_effect=OSError("denied")):
+            with self.assertLogs(level="WARNING"):
+                estimate.record_history(ran)
+        # the temporary file is removed, and no history is written
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_load_history_unreadable(self):
+        os.makedirs(self.cache_dir)
+        path = os.path.join(self.cache_dir, estimate.HISTORY_FILE)
+        with open(path, "w") as f:
+            f.write("{")
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(estimate.load_history(), {})
+        with open(path, "w") as f:
+            json.dump([1], f)
+        self.assertEqual(estimate.load_history(), {})
+
+    def test_load_history_bad_entries(self):
+        os.makedirs(self.cache_dir)
+        with open(os.path.join(self.cache_dir, estimate.HISTORY_FILE), "w") as f:
+            json.dump(
+                {
+                    "backup/keystone/3": [10.0, 20],
+                    "backup": [10.0],
+                    "backup/keystone/three": [10.0],
+                    "backup/nova/1": ["10"],
+                    "backup/glance/1": 10.0,
+                },
+                f,
+            )
+        history = estimate.load_history()
+        self.assertEqual(history, {"backup/keystone/3": [10.0, 20]})
+        self.assertEqual(estimate.estimate_step(_step("a", "nova", 1), history), 15.0)
+
+    def test_estimate_step(self):
+        history = {
+            "backup/keystone/3": [10.0, 30.0, 20.0],
+            "backup/keystone/6": [50.0],
+            "backup/glance/1": [],
+            "backup/nova-compute/10": [100.0],
+            "other/keystone/3": [1000.0],
+        }
+        no_function = UpgradeStep(description="a", parallel=False, function=None)
+        unknown = UpgradeStep(description="a", parallel=False, function=MagicMock())
+        self.assertEqual(estimate.estimate_step(no_function, history), 0.0)
+        self.assertIsNone(estimate.estimate_step(unknown, history))
+        # exact key
+        self.assertEqual(estimate.estimate_step(_step("a", "keystone", 3), history), 20.0)
+        # same charm, scaled from the nearest unit count
+        self.assertEqual(estimate.estimate_step(_step("a", "keystone", 12), history), 100.0)
+        # same type of step on any charm
+        self.assertEqual(estimate.estimate_step(_step("a", "glance", 1), history), 30.0)
+        self.assertEqual(estimate.estimate_step(_step("a"), history), 30.0)
+        self.assertIsNone(estimate.estimate_step(_step("a"), {"other/keystone/3": [1.0]}))
+
+    def test_estimate_plan(self):
+        history = {"backup/keystone/3": [10.0], "backup/glance/3": [20.0]}
+        plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        group = UpgradeStep(description="group", parallel=True, function=None)
+        keystone = _step("keystone", "keystone", 3)
+        glance = _step("glance", "glance", 3)
+        group.add_step(keystone)
+        group.add_step(glance)
+        plan.add_step(group)
+        last = _step("last", "keystone", 3)
+        plan.add_step(last)
+
+        result = estimate.estimate_plan(plan, history)
+
+        self.assertEqual(result.total, 40.0)
+        self.assertEqual(result.critical_path, 30.0)
+        self.assertEqual(result.steps[group], 30.0)
+        self.assertEqual(result.steps[glance], 20.0)
+        self.assertEqual(result.steps[plan], 40.0)
+
+        plan.add_step(UpgradeStep(description="unknown", parallel=False, function=MagicMock()))
+        result = estimate.estimate_plan(plan, history)
+        self.assertIsNone(result.total)
+        self.assertIsNone(result.critical_path)
+        self.assertEqual(result.steps[group], 30.0)
+
+    def test_estimate_plan_loads_history(self):
+        with patch.object(estimate, "load_history", return_value={"backup//0": [5.0]}):
+            self.assertEqual(estimate.estimate_plan(_step("a")).total, 5.0)
+
+    def test_format_duration(self):
+        self.assertEqual(estimate.format_duration(None), "unknown")
+        self.assertEqual(estimate.format_duration(150.4), "~2m30s")
+        self.assertEqual(estimate.format_duration(3900), "~1h05m")
@@ -1,8 +1,20 @@
+import json
+import os
+import tempfile
+import threading
 import unittest
 from unittest.mock import MagicMock, call, patch
 
+from cou.steps import StepTimings, UpgradeStep
 from cou.steps.backup import backup
-from cou.steps.plan import apply_plan, dump_plan, generate_plan
+from cou.steps.estimate import PlanEstimate
+from cou.steps.plan import (
+    _StepRunner,
+    apply_plan,
+    dump_plan,
+    export_trace,
+    generate_plan,
+)
 
 
 class StepsPlanTestCase(unittest.TestCase):
@@ -21,44 +33,146 @@ class StepsPlanTestCase(unittest.TestCase):
         self.assertEqual(sub_step.function, backup)
 
     def test_apply_plan_continue(self):
-        upgrade_plan = MagicMock()
-        upgrade_plan.description = "Test Plan"
-        upgrade_plan.run = MagicMock()
+        upgrade_plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        step = UpgradeStep(description="Test Plan", parallel=False, function=MagicMock())
+        upgrade_plan.add_step(step)
 
         with patch("cou.steps.plan.input") as mock_input, patch("cou.steps.plan.sys") as mock_sys:
             mock_input.return_value = "C"
             apply_plan(upgrade_plan)
 
-            mock_input.assert_called_once_with("Test Plan[Continue/abort/skip]")
-            upgrade_plan.run.assert_called_once()
+            mock_input.assert_called_once_with("Test Plan[Continue/phase/abort/skip]")
+            step.function.assert_called_once_with()
             mock_sys.exit.assert_not_called()
 
     def test_apply_plan_abort(self):
-        upgrade_plan = MagicMock()
-        upgrade_plan.description = "Test Plan"
+        upgrade_plan = UpgradeStep(description="Test Plan", parallel=False, function=MagicMock())
 
         with patch("cou.steps.plan.input") as mock_input, patch("cou.steps.plan.sys") as mock_sys:
             mock_input.return_value = "a"
             apply_plan(upgrade_plan)
 
-            mock_input.assert_called_once_with("Test Plan[Continue/abort/skip]")
+            mock_input.assert_called_once_with("Test Plan[Continue/phase/abort/skip]")
             upgrade_plan.function.assert_not_called()
             mock_sys.exit.assert_called_once_with(1)
 
     def test_apply_plan_skip(self):
-        upgrade_plan = MagicMock()
-        upgrade_plan.description = "Test Plan"
-        sub_step = MagicMock()
-        sub_step.description = sub_step
-        upgrade_plan.sub_steps = [sub_step]
+        upgrade_plan = UpgradeStep(description="Test Plan", parallel=False, function=MagicMock())
+        sub_step = UpgradeStep(description="Sub Step", parallel=False, function=MagicMock())
+        upgrade_plan.add_step(sub_step)
 
         with patch("cou.steps.plan.input") as mock_input, patch("cou.steps.plan.sys") as mock_sys:
-            mock_input.return_value = "s"
+            mock_input.side_effect = ["s", "c"]
             apply_plan(upgrade_plan)
 
+            self.assertEqual(mock_input.call_count, 2)
             upgrade_plan.function.assert_not_called()
+            sub_step.function.assert_called_once_with()
             mock_sys.exit.assert_not_called()
 
+    def test_apply_plan_phase(self):
+        calls = []
+        upgrade_plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        phase = UpgradeStep(description="phase", parallel=False, function=lambda: calls.append(0))
+        for index in (1, 2):
+            phase.add_step(
+                UpgradeStep(
+                    description=f"step {index}",
+                    parallel=False,
+                    function=lambda index: calls.append(index),
+                    index=index,
+                )
+            )
+        upgrade_plan.add_step(phase)
+        last = UpgradeStep(description="last", parallel=False, function=MagicMock())
+        upgrade_plan.add_step(last)
+
+        with patch("cou.steps.plan.input") as mock_input:
+            mock_input.side_effect = ["p", "s"]
+            apply_plan(upgrade_plan)
+
+            self.assertEqual(
+                [mock_call.args[0] for mock_call in mock_input.call_args_list],
+                ["phase[Continue/phase/abort/skip]", "last[Continue/phase/abort/skip]"],
+            )
+        self.assertEqual(calls, [0, 1, 2])
+        last.function.assert_not_called()
+
+    def test_apply_plan_approve(self):
+        upgrade_plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        backup_step = UpgradeStep(description="backup mysql", parallel=False, function=MagicMock())
+        upgrade_step = UpgradeStep(description="upgrade", parallel=False, function=MagicMock())
+        upgrade_plan.add_step(backup_step)
+        upgrade_plan.add_step(upgrade_step)
+
+        with patch("cou.steps.plan.input") as mock_input:
+            mock_input.return_value = "c"
+            apply_plan(upgrade_plan, approve=["backup*"])
+
+            mock_input.assert_called_once_with("upgrade[Continue/phase/abort/skip]")
+        backup_step.function.assert_called_once_with()
+        upgrade_step.function.assert_called_once_with()
+
+    def test_apply_plan_runs_ahead(self):
+        asked = threading.Event()
+        ran_while_asking = []
+        upgrade_plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        upgrade_plan.add_step(
+            UpgradeStep(
+                description="first",
+                parallel=False,
+                function=lambda: ran_while_asking.append(asked.wait(timeout=5)),
+            )
+        )
+        upgrade_plan.add_step(UpgradeStep(description="second", parallel=False, function=None))
+        upgrade_plan.sub_steps[-1].add_step(
+            UpgradeStep(description="third", parallel=False, function=MagicMock())
+        )
+
+        def _input(prompt):
+            if prompt.startswith("third"):
+                asked.set()
+            return "c"
+
+        with patch("cou.steps.plan.input", side_effect=_input):
+            apply_plan(upgrade_plan)
+
+        # the first step was still running when the operator was asked about the third
+        self.assertEqual(ran_while_asking, [True])
+        upgrade_plan.sub_steps[-1].sub_steps[0].function.assert_called_once_with()
+
+    def test_apply_plan_failed_step(self):
+        upgrade_plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        failing = UpgradeStep(
+            description="failing", parallel=False, function=MagicMock(side_effect=ValueError)
+        )
+        upgrade_plan.add_step(failing)
+        after = UpgradeStep(description="after", parallel=False, function=MagicMock())
+        upgrade_plan.add_step(after)
+
+        with self.assertRaises(ValueError):
+            apply_plan(upgrade_plan, approve=["*"])
+
+        failing.function.assert_called_once_with()
+        after.function.assert_not_called()
+
+    def test_step_runner_check(self):
+        runner = _StepRunner()
+        runner.check()
+        runner.submit(
+            UpgradeStep(
+                description="failing", parallel=False, function=MagicMock(side_effect=KeyError)
+            )
+        )
+        after = UpgradeStep(description="after", parallel=False, function=MagicMock())
+        runner.submit(after)
+        with self.assertRaises(KeyError):
+            runner.wait()
+        after.function.assert_not_called()
+        with self.assertRaises(KeyError):
+            runner.check()
+        runner.shutdown()
+
     def test_dump_plan(self):
         upgrade_plan = MagicMock()
         upgrade_plan.description = "Test Plan"
@@ -72,3 +186,73 @@ class StepsPlanTestCase(unittest.TestCase):
 
             mock_print.assert_has_calls([call("Test Plan"), call("\tSub Step")])
             mock_print.call_count = 2
+
+    def test_dump_plan_estimate(self):
+        upgrade_plan = UpgradeStep(description="Test Plan", parallel=False, function=None)
+        sub_step = UpgradeStep(description="Sub Step", parallel=False, function=backup)
+        upgrade_plan.add_step(sub_step)
+        plan_estimate = PlanEstimate(
+            total=90.0, critical_path=None, steps={upgrade_plan: 90.0, sub_step: 90.0}
+        )
+
+        with patch("cou.steps.plan.logging.info") as mock_print:
+            dump_plan(upgrade_plan, estimate=plan_estimate)
+
+        mock_print.assert_has_calls(
+            [
+                call("Test Plan (~1m30s)"),
+                call("\tSub Step (~1m30s)"),
+                call(
+                    "Estimated duration: %s, %s on the critical path if parallel steps ran "
+                    "concurrently",
+                    "~1m30s",
+                    "unknown",
+                ),
+            ]
+        )
+        self.assertEqual(mock_print.call_count, 3)
+
+    def test_export_trace(self):
+        plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        first = UpgradeStep(description="first", parallel=False, function=MagicMock())
+        second = UpgradeStep(description="second", parallel=False, function=MagicMock())
+        skipped = UpgradeStep(description="skipped", parallel=False, function=MagicMock())
+        for step in (first, second, skipped):
+            plan.add_step(step)
+        first.timings = StepTimings(start_time=100.0, wall_time=2.0, wait_time=1.5)
+        second.timings = StepTimings(start_time=105.0, wall_time=1.0, rpc_time=0.5)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace.json")
+            export_trace(plan, path)
+            with open(path, encoding="utf-8") as trace:
+                events = json.load(trace)["traceEvents"]
+
+        self.assertEqual(
+            [event["name"] for event in events], ["Top level plan", "first", "second"]
+        )
+        self.assertEqual(events[0]["ts"], 100.0 * 1e6)
+        self.assertEqual(events[0]["dur"], 6.0 * 1e6)
+        self.assertEqual(events[1]["dur"], 2.0 * 1e6)
+        self.assertEqual(events[1]["args"]["wait_time"], 1.5)
+        self.assertEqual(events[2]["args"]["rpc_time"], 0.5)
+        self.assertTrue(all(event["ph"] == "X" for event in events))
+
+    def test_export_trace_nothing_run(self):
+        plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+        plan.add_step(UpgradeStep(description="skipped", parallel=False, function=MagicMock()))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace.json")
+            export_trace(plan, path)
+            with open(path, encoding="utf-8") as trace:
+                self.assertEqual(json.load(trace)["traceEvents"], [])
+
+    def test_export_trace_unwritable(self):
+        plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "missing", "trace.json")
+            with self.assertLogs(level="ERROR") as logs:
+                export_trace(plan, path)
+        self.assertIn("Unable to write the trace to", logs.output[0])
@@ -0,0 +1,125 @@
+import importlib.metadata
+import os
+import tempfile
+import unittest
+from argparse import Namespace
+from unittest.mock import MagicMock, patch
+
+from cou.steps import UpgradeStep, plan_cache
+from cou.steps.backup import backup
+
+
+def _plan():
+    plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+    plan.add_step(
+        UpgradeStep(
+            description="backup mysql databases", parallel=False, function=backup, app="mysql"
+        )
+    )
+    return plan
+
+
+class PlanCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache_dir = os.path.join(tmpdir.name, "cou")
+        env = patch.dict(os.environ, {"COU_CACHE_DIR": self.cache_dir})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_save_and_load_plan(self):
+        self.assertIsNone(plan_cache.load_plan("abc"))
+        plan_cache.save_plan("abc", _plan())
+
+        plan = plan_cache.load_plan("abc")
+
+        self.assertEqual(plan.description, "Top level plan")
+        self.assertIsNone(plan.function)
+        self.assertEqual(len(plan.sub_steps), 1)
+        sub_step = plan.sub_steps[0]
+        self.assertEqual(sub_step.description, "backup mysql databases")
+        self.assertFalse(sub_step.parallel)
+        self.assertIs(sub_step.function, backup)
+        self.assertEqual(sub_step.params, {"app": "mysql"})
+        self.assertEqual(os.listdir(self.cache_dir), ["plan-abc.json"])
+
+    def test_load_plan_unusable(self):
+        os.makedirs(self.cache_dir)
+        with open(os.path.join(self.cache_dir, "plan-corrupt.json"), "w") as f:
+            f.write("{")
+        with open(os.path.join(self.cache_dir, "plan-old.json"), "w") as f:
+            f.write('{"version": 0, "plan": {}}')
+
+        self.assertIsNone(plan_cache.load_plan("corrupt"))
+        self.assertIsNone(plan_cache.load_plan("old"))
+
+    def test_save_plan_not_importable(self):
+        plan = UpgradeStep(description="step", parallel=False, function=lambda: None)
+        with self.assertLogs(level="WARNING"):
+            plan_cache.save_plan("abc", plan)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_save_plan_prunes(self):
+        with patch.object(plan_cache, "MAX_CACHED_PLANS", 2):
+            for index in range(4):
+                plan_cache.save_plan(str(index), _plan())
+                path = os.path.join(self.cache_dir, f"plan-{index}.json")
+                os.utime(path, (index, index))
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["plan-2.json", "plan-3.json"])
+
+    def test_save_plan_replace_fails(self):
+        with patch("cou.steps.plan_cache.os.replace", side_effect=OSError("denied")):
+            with self.assertLogs(level="WARNING"):
+                plan_cache.save_plan("abc", _plan())
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_get_cache_key(self):
+        args = Namespace(dry_run=True, approve=None, loglevel="INFO", group="all")
+        with patch(
+            "cou.steps.plan_cache.importlib.metadata.version"
+        ) as mock_version, patch.object(plan_cache, "PLAN_ARGS", ("group",)):
+            mock_version.return_value = "1.0"
+            key = plan_cache.get_cache_key(args, "abc")
+            self.assertEqual(key, plan_cache.get_cache_key(Namespace(**vars(args)), "abc"))
+            self.assertNotEqual(key, plan_cache.get_cache_key(args, "changed"))
+            self.assertNotEqual(
+                key, plan_cache.get_cache_key(Namespace(**{**vars(args), "group": "a"}), "abc")
+            )
+            # the arguments that don't change the plan don't change the key
+            for name, value in [
+                ("loglevel", "DEBUG"),
+                ("approve", ["*"]),
+                ("trace", "trace.json"),
+                ("profile", True),
+                ("save_plan", "plan.json"),
+            ]:
+                changed = Namespace(**{**vars(args), name: value})
+                self.assertEqual(key, plan_cache.get_cache_key(changed, "abc"))
+
+            mock_version.return_value = "1.1"
+            self.assertNotEqual(key, plan_cache.get_cache_key(args, "abc"))
+
+            mock_version.side_effect = importlib.metadata.PackageNotFoundError
+            self.assertNotEqual(key, plan_cache.get_cache_key(args, "abc"))
+
+    def test_generate_cached_plan(self):
+        args = Namespace(dry_run=True)
+        generate = MagicMock(return_value=_plan())
+        with patch.object(plan_cache, "model") as mock_model:
+            mock_model.get_model_fingerprint.return_value = "abc"
+
+            plan = plan_cache.generate_cached_plan(args, generate)
+            self.assertIs(plan, generate.return_value)
+            generate.assert_called_once_with(args)
+
+            plan = plan_cache.generate_cached_plan(args, generate)
+            self.assertIsNot(plan, generate.return_value)
+            self.assertEqual(plan.sub_steps[0].function, backup)
+            generate.assert_called_once_with(args)
+
+            mock_model.get_model_fingerprint.return_value = "changed"
+            plan = plan_cache.generate_cached_plan(args, generate)
+            self.assertIs(plan, generate.return_value)
+            self.assertEqual(generate.call_count, 2)
@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cou.steps import StepTarget, UpgradeStep, serialization
+from cou.steps.backup import backup
+
+
+def _plan():
+    plan = UpgradeStep(description="Top level plan", parallel=False, function=None)
+    group = UpgradeStep(description="group", parallel=True, function=None)
+    group.add_step(
+        UpgradeStep(
+            description="backup 1",
+            parallel=False,
+            function=backup,
+            target=StepTarget("mysql-innodb-cluster", 3),
+            app="a",
+        )
+    )
+    group.add_step(UpgradeStep(description="backup 2", parallel=False, function=backup, app="b"))
+    plan.add_step(group)
+    plan.add_step(UpgradeStep(description="backup 3", parallel=False, function=backup))
+    return plan
+
+
+def _flatten(plan, depth=0):
+    yield depth, plan.description, plan.parallel, plan.function, plan.params, plan.target
+    for sub_step in plan.sub_steps:
+        yield from _flatten(sub_step, depth + 1)
+
+
+class SerializationTestCase(unittest.TestCase):
+    def test_plan_to_dict(self):
+        data = serialization.plan_to_dict(_plan())
+
+        self.assertEqual(data["version"], serialization.PLAN_FORMAT_VERSION)
+        self.assertEqual(
+            [(step["id"], step["type"], step["parent"]) for step in data["steps"]],
+            [(0, None, None), (1, None, 0), (2, "backup", 1), (3, "backup", 1), (4, "backup", 0)],
+        )
+        self.assertEqual(data["steps"][2]["params"], {"app": "a"})
+        self.assertEqual(data["steps"][2]["target"], {"charm": "mysql-innodb-cluster", "units": 3})
+        self.assertNotIn("target", data["steps"][3])
+        self.assertEqual(json.loads(json.dumps(data)), data)
+
+    def test_plan_round_trip(self):
+        plan = _plan()
+        loaded = serialization.plan_from_dict(serialization.plan_to_dict(plan))
+        self.assertEqual(list(_flatten(loaded)), list(_flatten(plan)))
+
+    def test_plan_to_dict_unregistered(self):
+        plan = UpgradeStep(description="step", parallel=False, function=MagicMock())
+        with self.assertRaises(serialization.PlanFormatError):
+            serialization.plan_to_dict(plan)
+
+    def test_get_step_type(self):
+        plan = _plan()
+        self.assertIsNone(serialization.get_step_type(plan))
+        self.assertEqual(serialization.get_step_type(plan.sub_steps[1]), "backup")
+
+    def test_register_step_type(self):
+        function = MagicMock()
+        with patch.dict(serialization.STEP_TYPES):
+            serialization.register_step_type("new", function)
+            serialization.register_step_type("new", function)
+            with self.assertRaises(serialization.PlanFormatError):
+                serialization.register_step_type("new", MagicMock())
+            plan = UpgradeStep(description="step", parallel=False, function=function)
+            loaded = serialization.plan_from_dict(serialization.plan_to_dict(plan))
+        self.assertIs(loaded.function, function)
+        self.assertNotIn("new", serialization.STEP_TYPES)
+
+    def test_plan_from_dict_invalid(self):
+        data = serialization.plan_to_dict(_plan())
+        invalid = [
+            {"version": 0, "steps": data["steps"]},
+            {"version": 1},
+            {"version": 1, "steps": []},
+            {"version": 1, "steps": data["steps"] + [dict(data["steps"][0], id=5)]},
+            {"version": 1, "steps": [dict(data["steps"][2], parent=None, type="unknown")]},
+        ]
+        for entry in invalid:
+            with self.assertRaises(serialization.PlanFormatError):
+                serialization.plan_from_dict(entry)
+
+    def test_save_and_load_plan_file(self):
+        plan = _plan()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "plan.json")
+            serialization.save_plan_file(plan, path)
+            loaded = serialization.load_plan_file(path)
+            self.assertEqual(list(_flatten(loaded)), list(_flatten(plan)))
+
+            with open(path, "w") as f:
+                f.write("not json")
+            with self.assertRaises(serialization.PlanFormatError):
+                serialization.load_plan_file(path)
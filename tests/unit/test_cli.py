@@ -4,16 +4,47 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 
-from cou.cli import entrypoint, parse_args, setup_logging
+from cou.cli import entrypoint, parse_args, report_profile, setup_logging
 
 
 class CliTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("cou.cli.estimate")
+        self.mock_estimate = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("cou.cli.probe_cache")
+        self.mock_probe_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_parse_args(self):
         args = ["--dry-run", "--log-level", "DEBUG", "--interactive"]
         parsed_args = parse_args(args)
         self.assertTrue(parsed_args.dry_run)
         self.assertEqual(parsed_args.loglevel, "DEBUG")
         self.assertTrue(parsed_args.interactive)
+        self.assertFalse(parsed_args.profile)
+        self.assertIsNone(parsed_args.profile_output)
+        self.assertIsNone(parsed_args.trace)
+        self.assertTrue(parsed_args.plan_cache)
+        self.assertEqual(parsed_args.probe_cache_ttl, self.mock_probe_cache.DEFAULT_TTL)
+        self.assertEqual(parse_args(["--probe-cache-ttl", "2.5"]).probe_cache_ttl, 2.5)
+        self.assertFalse(parse_args(["--no-plan-cache"]).plan_cache)
+        self.assertIsNone(parsed_args.save_plan)
+        self.assertIsNone(parsed_args.load_plan)
+        self.assertIsNone(parsed_args.approve)
+        self.assertTrue(parsed_args.progress)
+        self.assertFalse(parse_args(["--no-progress"]).progress)
+        self.assertEqual(
+            parse_args(["--approve", "backup*", "--approve", "upgrade*"]).approve,
+            ["backup*", "upgrade*"],
+        )
+
+        parsed_args = parse_args(["--profile", "--profile-output", "profile.json"])
+        self.assertTrue(parsed_args.profile)
+        self.assertEqual(parsed_args.profile_output, "profile.json")
+        # --profile-output implies --profile
+        parsed_args = parse_args(["--profile-output", "profile.json"])
+        self.assertTrue(parsed_args.profile)
 
         with pytest.raises(ArgumentError):
             args = parse_args(["--dry-run", "--log-level=DDD"])
@@ -33,9 +64,13 @@ class CliTestCase(unittest.TestCase):
             mock_console_handler.setFormatter.assert_called_once()
 
     def test_entrypoint_with_exception(self):
-        with patch("cou.cli.parse_args"), patch("cou.cli.setup_logging"), patch(
+        with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
             "cou.cli.generate_plan"
         ) as mock_generate_plan, patch("cou.cli.apply_plan"):
+            mock_parse_args.return_value.plan_cache = False
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = None
             mock_generate_plan.side_effect = Exception("An error occurred")
 
             result = entrypoint()
@@ -46,26 +81,215 @@ class CliTestCase(unittest.TestCase):
     def test_entrypoint_dry_run(self):
         with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
             "cou.cli.generate_plan"
-        ), patch("cou.cli.dump_plan") as mock_dump_plan, patch("cou.cli.apply_plan"):
+        ) as mock_generate_plan, patch("cou.cli.dump_plan") as mock_dump_plan, patch(
+            "cou.cli.apply_plan"
+        ):
             mock_parse_args.return_value = MagicMock()
             mock_parse_args.return_value.dry_run = True
+            mock_parse_args.return_value.profile = False
+            mock_parse_args.return_value.trace = None
+            mock_parse_args.return_value.plan_cache = False
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = None
 
             result = entrypoint()
 
             self.assertEqual(result, 0)
-            mock_dump_plan.assert_called_once()
+            upgrade_plan = mock_generate_plan.return_value
+            self.mock_estimate.estimate_plan.assert_called_once_with(upgrade_plan)
+            mock_dump_plan.assert_called_once_with(
+                upgrade_plan, estimate=self.mock_estimate.estimate_plan.return_value
+            )
 
     def test_entrypoint_real_run(self):
         with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
             "cou.cli.generate_plan"
-        ), patch("cou.cli.dump_plan"), patch("cou.cli.apply_plan") as mock_apply_plan:
+        ) as mock_generate_plan, patch("cou.cli.dump_plan"), patch(
+            "cou.cli.apply_plan"
+        ) as mock_apply_plan:
             mock_parse_args.return_value = MagicMock()
             mock_parse_args.return_value.dry_run = False
+            mock_parse_args.return_value.profile = False
+            mock_parse_args.return_value.trace = None
+            mock_parse_args.return_value.plan_cache = False
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = None
 
             result = entrypoint()
 
             self.assertEqual(result, 0)
+            self.mock_probe_cache.set_ttl.assert_called_once_with(
+                mock_parse_args.return_value.probe_cache_ttl
+            )
             mock_apply_plan.assert_called_once()
+            self.mock_estimate.record_history.assert_called_once_with(
+                mock_generate_plan.return_value
+            )
+
+    def test_entrypoint_profile(self):
+        with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
+            "cou.cli.generate_plan"
+        ) as mock_generate_plan, patch("cou.cli.dump_plan"), patch(
+            "cou.cli.instrumentation"
+        ) as mock_instrumentation, patch(
+            "cou.cli.report_profile"
+        ) as mock_report_profile:
+            mock_parse_args.return_value = MagicMock()
+            mock_parse_args.return_value.dry_run = True
+            mock_parse_args.return_value.profile = True
+            mock_parse_args.return_value.profile_output = "profile.json"
+            mock_parse_args.return_value.trace = None
+            mock_parse_args.return_value.plan_cache = False
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = None
+            mock_generate_plan.side_effect = Exception("An error occurred")
+
+            result = entrypoint()
+
+            self.assertEqual(result, 1)
+            mock_instrumentation.enable.assert_called_once_with()
+            mock_report_profile.assert_called_once_with("profile.json")
+
+    def test_entrypoint_trace(self):
+        with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
+            "cou.cli.generate_plan"
+        ) as mock_generate_plan, patch("cou.cli.apply_plan"), patch(
+            "cou.cli.instrumentation"
+        ) as mock_instrumentation, patch(
+            "cou.cli.export_trace"
+        ) as mock_export_trace:
+            mock_parse_args.return_value = MagicMock()
+            mock_parse_args.return_value.dry_run = False
+            mock_parse_args.return_value.profile = False
+            mock_parse_args.return_value.trace = "trace.json"
+            mock_parse_args.return_value.plan_cache = False
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = None
+
+            result = entrypoint()
+
+            self.assertEqual(result, 0)
+            mock_instrumentation.enable.assert_called_once_with()
+            mock_export_trace.assert_called_once_with(
+                mock_generate_plan.return_value, "trace.json"
+            )
+
+    def test_entrypoint_plan_cache(self):
+        with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
+            "cou.cli.generate_plan"
+        ) as mock_generate_plan, patch("cou.cli.dump_plan") as mock_dump_plan, patch(
+            "cou.cli.plan_cache"
+        ) as mock_plan_cache:
+            mock_parse_args.return_value = MagicMock()
+            mock_parse_args.return_value.dry_run = True
+            mock_parse_args.return_value.profile = False
+            mock_parse_args.return_value.trace = None
+            mock_parse_args.return_value.plan_cache = True
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = None
+
+            result = entrypoint()
+
+            self.assertEqual(result, 0)
+            mock_plan_cache.generate_cached_plan.assert_called_once_with(
+                mock_parse_args.return_value, mock_generate_plan
+            )
+            mock_generate_plan.assert_not_called()
+            mock_dump_plan.assert_called_once_with(
+                mock_plan_cache.generate_cached_plan.return_value,
+                estimate=self.mock_estimate.estimate_plan.return_value,
+            )
+
+    def test_entrypoint_plan_cache_not_dry_run(self):
+        with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
+            "cou.cli.generate_plan"
+        ) as mock_generate_plan, patch("cou.cli.apply_plan") as mock_apply_plan, patch(
+            "cou.cli.plan_cache"
+        ) as mock_plan_cache:
+            mock_parse_args.return_value = MagicMock()
+            mock_parse_args.return_value.dry_run = False
+            mock_parse_args.return_value.profile = False
+            mock_parse_args.return_value.trace = None
+            mock_parse_args.return_value.plan_cache = True
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = None
+
+            result = entrypoint()
+
+            self.assertEqual(result, 0)
+            mock_plan_cache.generate_cached_plan.assert_not_called()
+            mock_apply_plan.assert_called_once_with(
+                mock_generate_plan.return_value, approve=mock_parse_args.return_value.approve
+            )
+
+    def test_entrypoint_save_and_load_plan(self):
+        with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
+            "cou.cli.generate_plan"
+        ) as mock_generate_plan, patch("cou.cli.apply_plan") as mock_apply_plan, patch(
+            "cou.cli.serialization"
+        ) as mock_serialization:
+            mock_parse_args.return_value = MagicMock()
+            mock_parse_args.return_value.dry_run = False
+            mock_parse_args.return_value.profile = False
+            mock_parse_args.return_value.trace = None
+            mock_parse_args.return_value.load_plan = "in.json"
+            mock_parse_args.return_value.progress = False
+            mock_parse_args.return_value.save_plan = "out.json"
+
+            result = entrypoint()
+
+            self.assertEqual(result, 0)
+            mock_generate_plan.assert_not_called()
+            mock_serialization.load_plan_file.assert_called_once_with("in.json")
+            upgrade_plan = mock_serialization.load_plan_file.return_value
+            mock_serialization.save_plan_file.assert_called_once_with(upgrade_plan, "out.json")
+            mock_apply_plan.assert_called_once_with(
+                upgrade_plan, approve=mock_parse_args.return_value.approve
+            )
+
+    def test_entrypoint_progress(self):
+        with patch("cou.cli.parse_args") as mock_parse_args, patch("cou.cli.setup_logging"), patch(
+            "cou.cli.generate_plan"
+        ), patch("cou.cli.dump_plan"), patch("cou.cli.progress") as mock_progress, patch(
+            "cou.cli.sys"
+        ) as mock_sys:
+            mock_parse_args.return_value = MagicMock()
+            mock_parse_args.return_value.dry_run = True
+            mock_parse_args.return_value.profile = False
+            mock_parse_args.return_value.trace = None
+            mock_parse_args.return_value.plan_cache = False
+            mock_parse_args.return_value.load_plan = None
+            mock_parse_args.return_value.save_plan = None
+            mock_parse_args.return_value.progress = True
+
+            mock_sys.stderr.isatty.return_value = False
+            self.assertEqual(entrypoint(), 0)
+            mock_progress.enable.assert_not_called()
+
+            mock_sys.stderr.isatty.return_value = True
+            self.assertEqual(entrypoint(), 0)
+            mock_progress.enable.assert_called_once_with()
+
+    def test_report_profile(self):
+        with patch("cou.cli.instrumentation") as mock_instrumentation:
+            report_profile()
+            mock_instrumentation.disable.assert_called_once_with()
+            mock_instrumentation.log_summary.assert_called_once_with()
+            mock_instrumentation.export_json.assert_not_called()
+
+            report_profile("profile.json")
+            mock_instrumentation.export_json.assert_called_once_with("profile.json")
+
+            mock_instrumentation.export_json.side_effect = PermissionError("denied")
+            with self.assertLogs(level="ERROR") as logs:
+                report_profile("/profile.json")
+            self.assertIn("Unable to write the profile to /profile.json", logs.output[0])
 
 
 # from argparse import ArgumentError
@@ -0,0 +1,57 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+from cou.utils import get_cache_dir, lazy_import
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def test_lazy_import_loaded(self):
+        self.assertIs(lazy_import("unittest"), unittest)
+
+    def test_lazy_import(self):
+        with patch.dict(sys.modules):
+            sys.modules.pop("email.headerregistry", None)
+            module = lazy_import("email.headerregistry")
+            self.assertIs(sys.modules["email.headerregistry"], module)
+            self.assertIs(sys.modules["email"].headerregistry, module)
+            self.assertTrue(callable(module.HeaderRegistry))
+
+    def test_lazy_import_missing(self):
+        with self.assertRaises(ModuleNotFoundError):
+            lazy_import("cou.no_such_module")
+
+    def test_cli_does_not_load_juju(self):
+        code = (
+            "import sys, cou.cli; "
+            "print(' '.join(m for m in ('juju', 'oslo_config') if m in sys.modules))"
+        )
+        output = subprocess.check_output([sys.executable, "-c", code], text=True)
+        self.assertEqual(output.strip(), "")
+
+
+class GetCacheDirTestCase(unittest.TestCase):
+    def test_get_cache_dir(self):
+        with patch.dict(os.environ, {"COU_CACHE_DIR": "/cache"}):
+            self.assertEqual(get_cache_dir(), "/cache")
+        with patch.dict(os.environ, {"COU_CACHE_DIR": "", "XDG_CACHE_HOME": "/xdg"}):
+            self.assertEqual(get_cache_dir(), "/xdg/cou")
+        with patch.dict(os.environ, {"COU_CACHE_DIR": "", "XDG_CACHE_HOME": "", "HOME": "/h"}):
+            self.assertEqual(get_cache_dir(), "/h/.cache/cou")
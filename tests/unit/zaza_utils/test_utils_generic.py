@@ -100,26 +100,34 @@ class TestGenericUtils(ut_utils.BaseTestCase):
         self.get_undercloud_env_vars.assert_called_once_with()
 
     def test_get_pkg_version(self):
-        self.patch_object(generic_utils.model, "get_units")
-        self.patch_object(generic_utils.juju_utils, "remote_run")
-        _pkg = "os-thingy"
-        _version = "2:27.0.0-0ubuntu1~cloud0"
-        _dpkg_output = "ii {} {} all OpenStack thingy\n".format(_pkg, _version)
-        self.remote_run.return_value = _dpkg_output
+        self.patch_object(generic_utils.upgrade_utils, "get_package_versions")
         _unit1 = mock.MagicMock()
-        _unit1.entity_id = "os-thingy/7"
+        _unit1.entity_id = "os-thingy/0"
         _unit2 = mock.MagicMock()
-        _unit2.entity_id = "os-thingy/12"
-        _units = [_unit1, _unit2]
-        self.get_units.return_value = _units
+        _unit2.entity_id = "os-thingy/1"
+        self.model.get_units.return_value = [_unit1, _unit2]
+        _pkg = "os-thingy"
+        _version = "2:27.0.0-0ubuntu1~cloud0"
 
         # Matching
+        self.get_package_versions.return_value = {
+            "os-thingy/0": _version,
+            "os-thingy/1": _version,
+        }
         self.assertEqual(generic_utils.get_pkg_version(_pkg, _pkg), _version)
+        self.get_package_versions.assert_called_once_with(["os-thingy/0", "os-thingy/1"], _pkg)
 
         # Mismatched
-        _different_dpkg_output = "ii {} {} all OpenStack thingy\n".format(_pkg, "DIFFERENT")
-        self.remote_run.side_effect = [_dpkg_output, _different_dpkg_output]
-        with self.assertRaises(Exception):
+        self.get_package_versions.return_value = {
+            "os-thingy/0": _version,
+            "os-thingy/1": "DIFFERENT",
+        }
+        with self.assertRaisesRegex(Exception, "Unexpected output"):
+            generic_utils.get_pkg_version(_pkg, _pkg)
+
+        # Not installed
+        self.get_package_versions.return_value = {"os-thingy/0": _version, "os-thingy/1": None}
+        with self.assertRaisesRegex(Exception, "Unable to get the version of os-thingy"):
             generic_utils.get_pkg_version(_pkg, _pkg)
 
     def test_get_undercloud_env_vars(self):
@@ -186,6 +194,27 @@ class TestGenericUtils(ut_utils.BaseTestCase):
             ]
         )
 
+    def test_do_release_upgrade_on_units(self):
+        self.patch_object(generic_utils, "do_release_upgrade")
+        self.model.get_units_by_machine.return_value = {
+            "0": ["nova-compute/0", "ceph-osd/0"],
+            "1": ["nova-compute/1"],
+        }
+        self.assertEqual(
+            generic_utils.do_release_upgrade_on_units(
+                ["nova-compute/0", "ceph-osd/0", "nova-compute/1"]
+            ),
+            {
+                "nova-compute/0": "nova-compute/0",
+                "ceph-osd/0": "nova-compute/0",
+                "nova-compute/1": "nova-compute/1",
+            },
+        )
+        self.do_release_upgrade.assert_has_calls(
+            [mock.call("nova-compute/0"), mock.call("nova-compute/1")]
+        )
+        self.assertEqual(self.do_release_upgrade.call_count, 2)
+
     def test_wrap_do_release_upgrade(self):
         self.patch_object(generic_utils, "do_release_upgrade")
         self.patch_object(generic_utils, "run_via_ssh")
@@ -224,6 +253,20 @@ class TestGenericUtils(ut_utils.BaseTestCase):
             ["juju", "ssh", _unit, f'sudo juju-run -u {_unit} "juju-reboot --now"']
         )
 
+    def test_reboot_invalidates_clock_offsets(self):
+        self.model.get_units_by_machine.return_value = {"1/lxd/0": ["app/2"]}
+        self.subprocess.CalledProcessError = subprocess.CalledProcessError
+        for func in (generic_utils.reboot, generic_utils.juju_reboot):
+            self.model.invalidate_clock_offsets.reset_mock()
+            self.subprocess.check_call.side_effect = subprocess.CalledProcessError(255, "ssh")
+            func("app/2")
+            self.model.get_units_by_machine.assert_called_with(["app/2"])
+            self.model.invalidate_clock_offsets.assert_called_once_with(machines=["1/lxd/0"])
+        self.model.invalidate_clock_offsets.reset_mock()
+        self.subprocess.check_call.side_effect = None
+        generic_utils.do_release_upgrade("app/2")
+        self.model.invalidate_clock_offsets.assert_called_once_with(machines=["1/lxd/0"])
+
     def test_run_via_ssh(self):
         _unit = "app/2"
         _cmd = "hostname"
@@ -241,7 +284,8 @@ class TestGenericUtils(ut_utils.BaseTestCase):
 
     def test_series_upgrade(self):
         self.patch_object(generic_utils.model, "block_until_all_units_idle")
-        self.patch_object(generic_utils.model, "block_until_unit_wl_status")
+        self.patch_object(generic_utils.model, "block_until_targets")
+        self.patch_object(generic_utils.model, "unit_wl_status_target")
         self.patch_object(generic_utils.model, "prepare_series_upgrade")
         self.patch_object(generic_utils.model, "complete_series_upgrade")
         self.patch_object(generic_utils.model, "set_series")
@@ -266,6 +310,18 @@ class TestGenericUtils(ut_utils.BaseTestCase):
             files=_files,
         )
         self.block_until_all_units_idle.assert_called_with()
+        # each wait for the unit's status and the model's idleness is a single wait
+        self.unit_wl_status_target.assert_has_calls(
+            [
+                mock.call(_unit, "blocked"),
+                mock.call(_unit, "blocked"),
+                mock.call(_unit, "active"),
+            ]
+        )
+        self.block_until_targets.assert_called_with(
+            [self.unit_wl_status_target.return_value], idle=True
+        )
+        self.assertEqual(self.block_until_targets.call_count, 3)
         self.prepare_series_upgrade.assert_called_once_with(_machine_num, to_series=_to_series)
         self.wrap_do_release_upgrade.assert_called_once_with(
             _unit,
@@ -410,6 +466,16 @@ class TestGenericUtils(ut_utils.BaseTestCase):
         self.run_action.assert_not_called()
         self.series_upgrade.assert_has_calls(_series_upgrade_calls)
 
+    def test_set_dpkg_non_interactive_on_units(self):
+        generic_utils.set_dpkg_non_interactive_on_units(["app/1", "app-hacluster/1"])
+        self.model.run_on_unit_machines.assert_called_once_with(
+            ["app/1", "app-hacluster/1"],
+            "grep 'DPkg::options { \"--force-confdef\"; };' "
+            "/etc/apt/apt.conf.d/50unattended-upgrades || "
+            "echo 'DPkg::options { \"--force-confdef\"; };' >> "
+            "/etc/apt/apt.conf.d/50unattended-upgrades",
+        )
+
     def test_set_dpkg_non_interactive_on_unit(self):
         self.patch_object(generic_utils, "model")
         _unit_name = "app/1"
@@ -469,21 +535,56 @@ class TestGenericUtils(ut_utils.BaseTestCase):
             self._run.assert_called_once_with(unit_name="ceph-osd/0", command=cmd)
 
     def test_get_unit_process_ids(self):
-        self.patch(
-            "cou.zaza_utils.generic.get_process_id_list",
-            new_callable=mock.MagicMock(),
-            name="_get_pids",
+        self.patch_object(generic_utils.model, "run_on_units")
+        cmd = (
+            'pids=$(pidof -x "ceph-osd"); echo "0 $? $pids"; '
+            'pids=$(pidof -x "pr1"); echo "1 $? $pids"; '
+            'pids=$(pidof -x "pr2"); echo "2 $? $pids"'
         )
-
-        pids = ["1", "2"]
-        self._get_pids.return_value = pids
-        unit_processes = {"ceph-osd/0": {"ceph-osd": 2}, "unit/0": {"pr1": 2, "pr2": 2}}
+        self.run_on_units.return_value = {
+            "ceph-osd/0": {"Code": "0", "Stdout": "0 0 1 2\n1 1 \n2 1 \n"},
+            "unit/0": {"Code": "0", "Stdout": "0 1 \n1 0 3 4\n2 0 5\n"},
+            "unit/1": {"Code": "0", "Stdout": "0 1 \n1 0 6\n2 1 \n"},
+        }
+        unit_processes = {
+            "ceph-osd/0": {"ceph-osd": 2},
+            "unit/0": {"pr1": 2, "pr2": 1},
+            "unit/1": {"pr1": 1},
+        }
         expected = {
             "ceph-osd/0": {"ceph-osd": ["1", "2"]},
-            "unit/0": {"pr1": ["1", "2"], "pr2": ["1", "2"]},
+            "unit/0": {"pr1": ["3", "4"], "pr2": ["5"]},
+            "unit/1": {"pr1": ["6"]},
         }
         result = generic_utils.get_unit_process_ids(unit_processes)
         self.assertEqual(result, expected)
+        # a single call, with a single command for all the process names
+        self.run_on_units.assert_called_once_with(
+            cmd, units=["ceph-osd/0", "unit/0", "unit/1"], max_age=0
+        )
+
+        # the process isn't running
+        self.run_on_units.return_value = {"unit/1": {"Code": "0", "Stdout": "0 1 \n"}}
+        with self.assertRaises(zaza_exceptions.ProcessIdsFailed):
+            generic_utils.get_unit_process_ids({"unit/1": ["pr1"]})
+        # which is expected
+        self.assertEqual(
+            generic_utils.get_unit_process_ids({"unit/1": ["pr1"]}, expect_success=False),
+            {"unit/1": {"pr1": []}},
+        )
+        # the process is running, but isn't expected to
+        self.run_on_units.return_value = {"unit/1": {"Code": "0", "Stdout": "0 0 6\n"}}
+        with self.assertRaises(zaza_exceptions.ProcessIdsFailed):
+            generic_utils.get_unit_process_ids({"unit/1": ["pr1"]}, expect_success=False)
+
+        # the command failed before getting to the process
+        self.run_on_units.return_value = {"unit/1": {"Code": "0", "Stdout": "garbage"}}
+        with self.assertRaises(zaza_exceptions.ProcessIdsFailed):
+            generic_utils.get_unit_process_ids({"unit/1": ["pr1"]})
+
+        self.run_on_units.reset_mock()
+        self.assertEqual(generic_utils.get_unit_process_ids({"unit/1": []}), {"unit/1": {}})
+        self.run_on_units.assert_not_called()
 
     def test_validate_unit_process_ids(self):
         expected = {"ceph-osd/0": {"ceph-osd": 2}, "unit/0": {"pr1": 2, "pr2": [1, 2]}}
@@ -0,0 +1,112 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import tests.unit.utils as ut_utils
+from cou.zaza_utils import global_options, ro_types
+
+
+class TestReadOnlyTypes(ut_utils.BaseTestCase):
+    def test_resolve_immutable(self):
+        ro = ro_types.resolve_immutable({"a-b": {"c": [1, {"d": 2}]}, "e": "str"})
+        self.assertIsInstance(ro, ro_types.ReadOnlyDict)
+        self.assertIsInstance(ro.a_b, ro_types.ReadOnlyDict)
+        self.assertIsInstance(ro["a-b"].c, ro_types.ReadOnlyList)
+        self.assertEqual(ro.a_b.c[1].d, 2)
+        self.assertEqual(ro.e, "str")
+        # nested wrappers are built once and shared between reads
+        self.assertIs(ro.a_b, ro["a-b"])
+        self.assertIs(ro.a_b.c[1], ro.a_b.c[1])
+        self.assertIs(ro_types.resolve_immutable(ro), ro)
+
+    def test_read_only(self):
+        ro = ro_types.resolve_immutable({"a": [1, 2, 3]})
+        with self.assertRaises(TypeError):
+            ro["a"] = 1
+        with self.assertRaises(TypeError):
+            ro.a = 1
+        with self.assertRaises(TypeError):
+            ro.a.b = 1
+        self.assertFalse(hasattr(ro.a, "__dict__"))
+        self.assertIsInstance(ro.a[1:], ro_types.ReadOnlyList)
+        self.assertEqual(ro.a[1:], (2, 3))
+
+    def test_read_only_dict_methods(self):
+        ro = ro_types.resolve_immutable({"a": 1})
+        changes = {
+            "update": lambda: ro.update({"x": 9}),
+            "pop": lambda: ro.pop("a"),
+            "popitem": lambda: ro.popitem(),
+            "clear": lambda: ro.clear(),
+            "setdefault": lambda: ro.setdefault("x", 9),
+            "__delitem__": lambda: ro.__delitem__("a"),
+            "__delattr__": lambda: delattr(ro, "a"),
+            "__ior__": lambda: ro.__ior__({"x": 9}),
+        }
+        for name, change in changes.items():
+            with self.subTest(name):
+                with self.assertRaises(TypeError):
+                    change()
+                self.assertEqual(ro, {"a": 1})
+
+    def test_options_view_read_only(self):
+        global_options.reset_options()
+        self.addCleanup(global_options.reset_options)
+        global_options.merge({"x": 1})
+        with self.assertRaises(TypeError):
+            global_options.get_options().update({"x": 9})
+        self.assertEqual(global_options.get_option("x"), 1)
+
+    def test_serialize(self):
+        data = {"a": {"b": [1, {"c": 2}]}}
+        serialized = ro_types.resolve_immutable(data).__serialize__()
+        self.assertEqual(serialized, data)
+        self.assertIs(type(serialized["a"]), dict)
+        self.assertIs(type(serialized["a"]["b"]), list)
+
+
+class TestGlobalOptions(ut_utils.BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        global_options.reset_options()
+        self.addCleanup(global_options.reset_options)
+
+    def test_get_options_cached(self):
+        global_options.merge({"a": {"b": 1}})
+        view = global_options.get_options()
+        self.assertIs(global_options.get_options(), view)
+        self.assertEqual(view.a.b, 1)
+
+    def test_get_options_invalidated(self):
+        global_options.merge({"a": {"b": 1}})
+        view = global_options.get_options()
+        global_options.set_option("a.c", 2)
+        self.assertIsNot(global_options.get_options(), view)
+        self.assertEqual(global_options.get_options().a.c, 2)
+        view = global_options.get_options()
+        global_options.merge({"d": 3})
+        self.assertEqual(global_options.get_options().d, 3)
+        global_options.reset_options()
+        self.assertEqual(global_options.get_options(), {})
+
+    def test_get_option(self):
+        global_options.merge({"a": {"b-c": [1, {"d": 2}], 1: "int-like"}})
+        self.assertEqual(global_options.get_option("a.b-c.1.d"), 2)
+        self.assertIs(global_options.get_option("a.b-c"), global_options.get_options().a["b-c"])
+        self.assertEqual(global_options.get_option("a.1"), "int-like")
+        # keys are matched exactly, without the '_' to '-' fallback
+        self.assertEqual(global_options.get_option("a.b_c", "default"), "default")
+        self.assertEqual(global_options.get_option("a.b-c.5", "default"), "default")
+        with self.assertRaises(KeyError):
+            global_options.get_option("a.x", raise_exception=True)
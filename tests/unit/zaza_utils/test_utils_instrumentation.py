@@ -0,0 +1,145 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+
+import aiounittest
+import mock
+from juju.client.connection import Connection
+
+import cou.zaza_utils as zaza
+import tests.unit.utils as ut_utils
+from cou.zaza_utils import instrumentation, sync_wrapper
+
+
+class TestInstrumentation(ut_utils.BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(instrumentation.disable)
+
+    def test_disabled(self):
+        with instrumentation.timed("call") as timer:
+            timer.bytes_in = 10
+        instrumentation.record_cache("cache", True)
+        self.assertEqual(instrumentation.get_stats(), {"calls": {}, "caches": {}})
+
+    def test_timed(self):
+        instrumentation.enable(rpc=False)
+        with instrumentation.timed("call") as timer:
+            timer.bytes_in = 10
+            timer.bytes_out = 3
+        with self.assertRaises(ValueError):
+            with instrumentation.timed("call"):
+                raise ValueError()
+        instrumentation.record_call("call", 7.0)
+        call = instrumentation.get_stats()["calls"]["call"]
+        self.assertEqual(call["count"], 3)
+        self.assertEqual(call["errors"], 1)
+        self.assertEqual(call["bytes_in"], 10)
+        self.assertEqual(call["bytes_out"], 3)
+        self.assertEqual(call["max"], 7.0)
+        self.assertEqual(call["histogram"]["<=10.0"], 1)
+        self.assertEqual(sum(call["histogram"].values()), 3)
+
+    def test_record_cache(self):
+        instrumentation.enable(rpc=False)
+        for hit in (True, True, True, False):
+            instrumentation.record_cache("cache", hit)
+        self.assertEqual(
+            instrumentation.get_stats()["caches"],
+            {"cache": {"hits": 3, "misses": 1, "hit_rate": 0.75}},
+        )
+
+    def test_sync_wrapper(self):
+        async def _f():
+            return 1
+
+        instrumentation.enable(rpc=False)
+        with mock.patch.object(zaza, "RUN_LIBJUJU_IN_THREAD", new=False):
+            self.assertEqual(sync_wrapper(_f)(), 1)
+        self.assertEqual(instrumentation.get_stats()["calls"]["sync:_f"]["count"], 1)
+
+    def test_summary_and_export(self):
+        instrumentation.enable(rpc=False)
+        instrumentation.record_call("get_status", 0.5, bytes_in=2048)
+        instrumentation.record_cache("status", False)
+        summary = instrumentation.format_summary()
+        self.assertIn("get_status", summary)
+        self.assertIn("0.0%", summary)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "profile.json")
+            instrumentation.export_json(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f), instrumentation.get_stats())
+
+
+class TestRpcHook(aiounittest.AsyncTestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(instrumentation.disable)
+
+    async def test_rpc_hook(self):
+        original = Connection.rpc
+
+        async def _rpc(self, msg, encoder=None):
+            return {"response": {"a": "b"}}
+
+        Connection.rpc = _rpc
+        try:
+            with instrumentation.profiling():
+                self.assertIsNot(Connection.rpc, _rpc)
+                result = await Connection.rpc(None, {"type": "Client", "request": "FullStatus"})
+            self.assertIs(Connection.rpc, _rpc)
+        finally:
+            Connection.rpc = original
+        self.assertEqual(result, {"response": {"a": "b"}})
+        call = instrumentation.get_stats()["calls"]["rpc:Client.FullStatus"]
+        self.assertEqual(call["count"], 1)
+        self.assertGreater(call["bytes_in"], 0)
+        self.assertGreater(call["bytes_out"], 0)
+
+    async def test_rpc_hook_serialisation_not_timed(self):
+        original = Connection.rpc
+        clock = iter(range(100))
+
+        async def _rpc(self, msg, encoder=None):
+            if msg["request"] == "Fail":
+                raise ConnectionError()
+            return {"response": {"a": "b"}}
+
+        def _dumps(*args, **kwargs):
+            # serialising takes a tick of the clock too
+            next(clock)
+            return "{}"
+
+        Connection.rpc = _rpc
+        try:
+            with mock.patch.object(
+                instrumentation.time, "perf_counter", side_effect=lambda: next(clock)
+            ), mock.patch.object(instrumentation.json, "dumps", side_effect=_dumps):
+                with instrumentation.profiling():
+                    await Connection.rpc(None, {"type": "Client", "request": "FullStatus"})
+                    with self.assertRaises(ConnectionError):
+                        await Connection.rpc(None, {"type": "Client", "request": "Fail"})
+        finally:
+            Connection.rpc = original
+        calls = instrumentation.get_stats()["calls"]
+        self.assertEqual(calls["rpc:Client.FullStatus"]["total"], 1)
+        self.assertEqual(calls["rpc:Client.Fail"]["errors"], 1)
@@ -19,6 +19,7 @@ import mock
 
 import tests.unit.utils as ut_utils
 from cou.zaza_utils import juju as juju_utils
+from cou.zaza_utils import status as status_utils
 
 
 class TestJujuUtils(ut_utils.BaseTestCase):
@@ -176,6 +177,24 @@ class TestJujuUtils(ut_utils.BaseTestCase):
         self.machine0_mock.display_name = "node-bob.maas"
         self.assertEqual(juju_utils.get_unit_name_from_host_name("node-bob.maas", "app"), "app/0")
 
+    def test_get_unit_name_from_host_name_compact_status(self):
+        self.model.get_status.return_value = status_utils.compact_status(
+            {
+                "applications": {
+                    "app": {"units": {unit: {"machine": unit[-1]} for unit in ["app/1", "app/2"]}}
+                },
+                "machines": {
+                    "0": {"id": "0"},
+                    "1": {"id": "1", "display-name": ""},
+                    "2": {"id": "2", "display-name": "node-jaeger.maas"},
+                },
+            }
+        )
+        self.assertEqual(
+            juju_utils.get_unit_name_from_host_name("node-jaeger.maas", "app"), "app/2"
+        )
+        self.assertEqual(juju_utils.get_unit_name_from_host_name("juju-model-1", "app"), "app/1")
+
     def test_get_unit_name_from_host_name(self):
         self.patch_object(juju_utils, "get_application_status")
         self.get_application_status.side_effect = self._get_application_status
@@ -317,7 +336,10 @@ class TestJujuUtils(ut_utils.BaseTestCase):
         self.model.run_on_leader.return_value = {"Code": 0, "Stdout": str(data)}
         juju_utils.leader_get("application")
         self.model.run_on_leader.assert_called_with(
-            "application", "leader-get --format=yaml ", model_name=None
+            "application",
+            "leader-get --format=yaml ",
+            model_name=None,
+            max_age=juju_utils.probe_cache.TTL,
         )
         self.yaml.safe_load.assert_called_with(str(data))
 
@@ -328,7 +350,10 @@ class TestJujuUtils(ut_utils.BaseTestCase):
         self.model.run_on_leader.return_value = {"Code": 0, "Stdout": data["foo"]}
         juju_utils.leader_get("application", "foo")
         self.model.run_on_leader.assert_called_with(
-            "application", "leader-get --format=yaml foo", model_name=None
+            "application",
+            "leader-get --format=yaml foo",
+            model_name=None,
+            max_age=juju_utils.probe_cache.TTL,
         )
         self.yaml.safe_load.assert_called_with(data["foo"])
 
@@ -339,7 +364,10 @@ class TestJujuUtils(ut_utils.BaseTestCase):
         with self.assertRaises(Exception):
             juju_utils.leader_get("application")
         self.model.run_on_leader.assert_called_with(
-            "application", "leader-get --format=yaml ", model_name=None
+            "application",
+            "leader-get --format=yaml ",
+            model_name=None,
+            max_age=juju_utils.probe_cache.TTL,
         )
         self.assertFalse(self.yaml.safe_load.called)
 
@@ -16,6 +16,9 @@
 import concurrent
 import copy
 import datetime
+import itertools
+import os
+import tempfile
 
 import aiounittest
 
@@ -36,6 +39,9 @@ except ImportError:
 
 import mock
 import yaml
+from juju.client._definitions import ErrorResult
+from juju.client.connection import client_facades
+from juju.exceptions import DeadEntityException
 
 import cou.zaza_utils as zaza
 import cou.zaza_utils.model as model
@@ -86,6 +92,9 @@ FAKE_STATUS = {
     },
 }
 
+FULL_STATUS = {"applications": {"app": FAKE_STATUS}, "machines": {"0": {"series": "trusty"}}}
+COMPACT_STATUS = model.status_utils.compact_status(FULL_STATUS)
+
 
 EXECUTING_STATUS = {
     "can-upgrade-to": "",
@@ -752,6 +761,47 @@ class TestModel(ut_utils.BaseTestCase):
         self.assertEqual(model.run_on_unit("app/2", cmd), expected)
         self.unit1.run.assert_called_once_with(cmd, timeout=None)
 
+    def test_run_on_unit_cached(self):
+        self.addCleanup(model.probe_cache.invalidate)
+        self.patch_object(model, "get_juju_model", return_value="mname")
+        self.patch_object(model, "Model")
+        self.patch_object(model, "get_unit_from_name")
+        self.get_unit_from_name.return_value = self.unit1
+        self.Model.return_value = self.Model_mock
+        cmd = "pidof -x 'svc'"
+
+        first = model.run_on_unit("app/2", cmd, max_age=10)
+        self.assertEqual(model.run_on_unit("app/2", cmd, max_age=10), first)
+        self.unit1.run.assert_called_once_with(cmd, timeout=None)
+        # a result older than max_age is run again, and not cached
+        model.probe_cache.invalidate()
+        model.run_on_unit("app/2", cmd, max_age=0)
+        self.assertEqual(self.unit1.run.call_count, 2)
+        self.assertIsNone(model.probe_cache.get("app/2", cmd, max_age=10))
+
+        # failed probes aren't cached
+        self.action.data["results"] = {"Code": "1", "Stdout": ""}
+        model.run_on_unit("app/2", cmd, max_age=10)
+        self.assertIsNone(model.probe_cache.get("app/2", cmd, max_age=10))
+
+        # a command that isn't a probe drops the results of the unit
+        model.run_on_unit("app/2", "systemctl restart svc")
+        self.assertIsNone(model.probe_cache.get("app/2", cmd, max_age=10))
+
+    def test_run_on_leader_cached(self):
+        self.addCleanup(model.probe_cache.invalidate)
+        self.patch_object(model, "get_juju_model", return_value="mname")
+        self.patch_object(model, "Model")
+        self.Model.return_value = self.Model_mock
+        cmd = "leader-get --format=yaml "
+
+        first = model.run_on_leader("app", cmd, max_age=10)
+        self.assertEqual(model.run_on_leader("app", cmd, max_age=10), first)
+        self.unit2.run.assert_called_once_with(cmd, timeout=None)
+
+        model.run_on_leader("app", "leader-set a=b")
+        self.assertIsNone(model.probe_cache.get("app/4", cmd, max_age=10))
+
     def test_run_on_leader(self):
         self.patch_object(model, "get_juju_model", return_value="mname")
         expected = {
@@ -896,13 +946,11 @@ class TestModel(ut_utils.BaseTestCase):
         )
 
     def test_get_actions(self):
-        self.patch_object(model, "get_juju_model", return_value="mname")
-        self.patch_object(model.subprocess, "check_output")
-        self.check_output.return_value = 'action: "action desc"'
-        self.assertEqual(model.get_actions("myapp"), {"action": "action desc"})
-        self.check_output.assert_called_once_with(
-            ["juju", "actions", "-m", "mname", "myapp", "--format", "yaml"]
+        self.patch_object(model, "get_model", return_value=self.Model_mock)
+        self.mymodel.applications["app"].get_actions = mock.AsyncMock(
+            return_value={"action": "action desc"}
         )
+        self.assertEqual(model.get_actions("app"), {"action": "action desc"})
 
     def test_run_action_on_leader(self):
         self.patch_object(model, "get_juju_model", return_value="mname")
@@ -1214,6 +1262,20 @@ class TestModel(ut_utils.BaseTestCase):
             model.wait_for_application_states("modelname", timeout=1)
         self.assertTrue(self.system_ready)
 
+    def test_wait_for_application_states_progress(self):
+        self._application_states_setup(
+            {"workload-status": "active", "workload-status-message": "Unit is ready"}
+        )
+        dashboard = mock.MagicMock()
+        self.patch_object(model.progress, "start", return_value=dashboard)
+        with mock.patch.object(zaza, "RUN_LIBJUJU_IN_THREAD", new=False):
+            model.wait_for_application_states("modelname", timeout=1)
+        self.start.assert_called_once_with(self.Model_mock, mock.ANY)
+        dashboard.unit_checked.assert_any_call("app", self.unit1.entity_id, True)
+        dashboard.application_ready.assert_called_once_with("app")
+        dashboard.render.assert_called_with()
+        dashboard.close.assert_called_once_with()
+
     def test_wait_for_application_states_errored_unit(self):
         self._application_states_setup(
             {"workload-status": "error", "workload-status-message": "Unit is ready"}
@@ -1237,17 +1299,14 @@ class TestModel(ut_utils.BaseTestCase):
     def test_wait_for_application_states_retries_no_success(self):
         self.patch_object(model, "check_model_for_hard_errors")
         self.patch_object(model, "async_resolve_units")
-        self.patch_object(model, "async_block_until_unit_wl_status")
-        self.patch_object(model, "check_unit_workload_status")
+        self.patch_object(model, "async_block_until_targets")
 
-        def unit_wl_status(_model, unit, states):
-            # There are two units. Only raise an error for the first unit
-            # so we can test scenarios where one unit is okay, the other
-            # unit is not okay.
-            if unit.name == "app/2":
-                raise model.UnitError([unit])
-
-        self.check_unit_workload_status.side_effect = unit_wl_status
+        # There are two units. Only raise an error for the first unit
+        # so we can test scenarios where one unit is okay, the other
+        # unit is not okay.  The check before waiting finds no errors.
+        self.check_model_for_hard_errors.side_effect = itertools.chain(
+            [None], itertools.repeat(model.UnitError([self.unit1]))
+        )
         self._application_states_setup(
             {"workload-status": "error", "workload-status-message": 'hook failed: "install"'}
         )
@@ -1262,17 +1321,14 @@ class TestModel(ut_utils.BaseTestCase):
     def test_wait_for_application_states_retries_non_retryable(self):
         self.patch_object(model, "check_model_for_hard_errors")
         self.patch_object(model, "async_resolve_units")
-        self.patch_object(model, "async_block_until_unit_wl_status")
-        self.patch_object(model, "check_unit_workload_status")
+        self.patch_object(model, "async_block_until_targets")
 
-        def unit_wl_status(_model, unit, states):
-            # There are two units. Only raise an error for the first unit
-            # so we can test scenarios where one unit is okay, the other
-            # unit is not okay.
-            if unit.name == "app/2":
-                raise model.UnitError([unit])
-
-        self.check_unit_workload_status.side_effect = unit_wl_status
+        # There are two units. Only raise an error for the first unit
+        # so we can test scenarios where one unit is okay, the other
+        # unit is not okay.  The check before waiting finds no errors.
+        self.check_model_for_hard_errors.side_effect = itertools.chain(
+            [None], itertools.repeat(model.UnitError([self.unit1]))
+        )
         self._application_states_setup(
             {
                 "workload-status": "error",
@@ -1286,29 +1342,29 @@ class TestModel(ut_utils.BaseTestCase):
                 model.wait_for_application_states("modelname", timeout=1, max_resolve_count=3)
                 self.assertFalse(self.system_ready)
         self.async_resolve_units.assert_not_called()
-        self.async_block_until_unit_wl_status.assert_not_called()
+        self.async_block_until_targets.assert_not_called()
 
     def test_wait_for_application_states_retries_with_success(self):
         self.patch_object(model, "check_model_for_hard_errors")
-        self.patch_object(model, "async_block_until_unit_wl_status")
+        self.patch_object(model, "async_block_until_targets")
         self.patch_object(model, "async_resolve_units")
-        self.patch_object(model, "check_unit_workload_status")
         count = 0
 
-        def unit_wl_status(_model, unit, states):
+        def hard_errors(_model):
             # After a couple of retries, we want to simulate the unit going
             # into the active state, so tweak the state.
-            if unit.name == "app/2":
-                nonlocal count
-                count += 1
-                if count < 3:
-                    raise model.UnitError([unit])
-                # Mutate the state for the desired behavior :-/
-                type(unit).workload_status = "active"
-                type(unit).workload_status_message = "Unit is ready"
-            return True
-
-        self.check_unit_workload_status.side_effect = unit_wl_status
+            # The check before waiting finds no errors.
+            nonlocal count
+            count += 1
+            if count == 1:
+                return
+            if count < 4:
+                raise model.UnitError([self.unit1])
+            # Mutate the state for the desired behavior :-/
+            type(self.unit1).workload_status = "active"
+            type(self.unit1).workload_status_message = "Unit is ready"
+
+        self.check_model_for_hard_errors.side_effect = hard_errors
         self._application_states_setup(
             {"workload-status": "error", "workload-status-message": 'hook failed: "install"'}
         )
@@ -1318,12 +1374,11 @@ class TestModel(ut_utils.BaseTestCase):
         with mock.patch.object(zaza, "RUN_LIBJUJU_IN_THREAD", new=False):
             model.wait_for_application_states("modelname", timeout=500, max_resolve_count=3)
         self.assertEquals(self.async_resolve_units.call_count, 2)
-        self.async_block_until_unit_wl_status.assert_has_calls(
-            [
-                mock.call("app/2", "error", "modelname", negate_match=True, timeout=60),
-                mock.call("app/2", "error", "modelname", negate_match=True, timeout=60),
-            ]
-        )
+        self.assertEqual(self.async_block_until_targets.call_count, 2)
+        for call in self.async_block_until_targets.call_args_list:
+            self.assertEqual(call.kwargs, {"model_name": "modelname", "timeout": 60})
+            (target,) = call.args[0]
+            self.assertEqual(repr(target), "unit app/2 (not workload status error)")
 
     def test_wait_for_application_states_blocked_ok(self):
         self._application_states_setup(
@@ -1399,6 +1454,69 @@ class TestModel(ut_utils.BaseTestCase):
         )
         self.assertIn(mock.call("Applications left: %s", "app"), self.mock_logging_info.mock_calls)
 
+    def test_application_state_predicate(self):
+        def unit(name, agent, workload, message):
+            return mock.MagicMock(
+                entity_id=name,
+                data={"agent-status": {"current": agent}} if agent else {},
+                workload_status=workload,
+                workload_status_message=message,
+            )
+
+        table = model.UnitStatusTable(
+            [
+                unit("app/0", "idle", "active", "Unit is ready"),
+                unit("app/1", "executing", "active", "Unit is ready"),
+                unit("app/2", "idle", "blocked", "No relation"),
+                unit("app/3", "idle", "active", None),
+                unit("app/4", None, "active", "Unit is ready"),
+            ]
+        )
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.agent_status, ["idle", "executing", "idle", "idle", None])
+        self.assertEqual(table.message[3], "")
+
+        predicates = model.compile_application_states(
+            ["app", "other", "regex"],
+            {
+                "app": {"workload-status": "blocked", "workload-status-message": "No rel"},
+                "regex": {"workload-status-message-regex": "^$", "num-expected-units": 0},
+            },
+        )
+        self.assertEqual(predicates["other"].statuses, ("active",))
+        self.assertEqual(predicates["app"].statuses, ("active", "blocked"))
+        self.assertEqual(predicates["app"].prefixes, model.APPROVED_MESSAGE_PREFIXES + ("No rel",))
+        self.assertTrue(predicates["app"].expects(1))
+        self.assertFalse(predicates["app"].expects(0))
+        self.assertTrue(predicates["regex"].expects(0))
+
+        self.assertEqual(
+            predicates["app"].evaluate(table),
+            [
+                [],
+                [("unit status", "not idle", ["idle"])],
+                [],
+                [
+                    (
+                        "workload status message",
+                        "",
+                        ["ready", "Ready", "Unit is ready", "No rel"],
+                    )
+                ],
+                [("unit status", "not idle", ["idle"])],
+            ],
+        )
+        self.assertEqual(
+            predicates["regex"].evaluate(table)[2],
+            [
+                ("workload status", "blocked", ["active"]),
+                ("workload status message", "No relation", ["ready", "Ready", "Unit is ready"]),
+            ],
+        )
+        self.assertEqual(
+            predicates["other"].evaluate(model.UnitStatusTable(table.units[:1])), [[]]
+        )
+
     def test_wait_for_application_states_zero_units(self):
         self._application_states_setup(
             {"workload-status": "active", "workload-status-message": "Unit is ready"}
@@ -1470,75 +1588,70 @@ class TestModel(ut_utils.BaseTestCase):
         self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt", timeout=0.1)
         self.assertEqual(ctxtmgr.exception.args, ("fault",))
 
-    def test_block_until_file_has_contents(self):
-        self.action.data = {"results": {"Code": "0", "Stderr": "", "Stdout": "somestring"}}
+    def run_on_units_mocks(self, stdout):
+        self.patch_object(model, "async_run_on_units")
+        self.async_run_on_units.return_value = {
+            "app/2": {"Code": "0", "Stderr": "", "Stdout": stdout},
+            "app/4": {"Code": "0", "Stderr": "", "Stdout": stdout},
+        }
 
-        self.patch_object(model, "Model")
-        self.Model.return_value = self.Model_mock
-        self.patch_object(model, "get_juju_model", return_value="mname")
-        self.patch("builtins.open", new_callable=mock.mock_open(), name="_open")
-        _fileobj = mock.MagicMock()
-        _fileobj.__enter__().read.return_value = "somestring"
-        self._open.return_value = _fileobj
+    def test_block_until_file_has_contents(self):
+        self.run_on_units_mocks("somestring")
         model.block_until_file_has_contents(
             "app", "/tmp/src/myfile.txt", "somestring", timeout=0.1
         )
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
-        self.unit2.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_once_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
 
     def test_block_until_file_has_no_contents(self):
-        self.action.data = {"results": {"Code": "0", "Stderr": ""}}
-
-        self.patch_object(model, "Model")
-        self.Model.return_value = self.Model_mock
-        self.patch_object(model, "get_juju_model", return_value="mname")
-        self.patch("builtins.open", new_callable=mock.mock_open(), name="_open")
-        _fileobj = mock.MagicMock()
-        _fileobj.__enter__().read.return_value = ""
-        self._open.return_value = _fileobj
+        self.run_on_units_mocks("")
         model.block_until_file_has_contents("app", "/tmp/src/myfile.txt", "", timeout=0.1)
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
-        self.unit2.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_once_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
 
     def test_block_until_file_has_contents_missing(self):
-        self.patch_object(model, "Model")
-        self.Model.return_value = self.Model_mock
-        self.patch_object(model, "get_juju_model", return_value="mname")
-        self.patch("builtins.open", new_callable=mock.mock_open(), name="_open")
-        _fileobj = mock.MagicMock()
-        _fileobj.__enter__().read.return_value = "anything else"
-        self._open.return_value = _fileobj
+        self.run_on_units_mocks("anything else")
         with self.assertRaises(AsyncTimeoutError):
             model.block_until_file_has_contents(
                 "app", "/tmp/src/myfile.txt", "somestring", timeout=0.1
             )
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
+
+    def test_block_until_file_ready_async_check(self):
+        async def _check(contents):
+            return contents == "somestring"
+
+        self.run_on_units_mocks("somestring")
+        model.block_until_file_ready("app", "/tmp/src/myfile.txt", _check, timeout=0.1)
+        self.async_run_on_units.side_effect = model.JujuError("connection closed")
+        with self.assertRaises(AsyncTimeoutError):
+            model.block_until_file_ready("app", "/tmp/src/myfile.txt", _check, timeout=0.1)
 
     def test_block_until_file_missing(self):
-        self.patch_object(model, "Model")
-        self.Model.return_value = self.Model_mock
-        self.patch_object(model, "get_juju_model", return_value="mname")
-        self.action.data["results"]["Stdout"] = "1"
+        self.run_on_units_mocks("1")
         model.block_until_file_missing("app", "/tmp/src/myfile.txt", timeout=0.1)
-        self.unit1.run.assert_called_once_with('test -e "/tmp/src/myfile.txt"; echo $?')
+        self.async_run_on_units.assert_awaited_once_with(
+            'test -e "/tmp/src/myfile.txt"; echo $?', application_name="app", model_name=None
+        )
 
     def test_block_until_file_missing_isnt_missing(self):
-        self.patch_object(model, "Model")
-        self.Model.return_value = self.Model_mock
-        self.patch_object(model, "get_juju_model", return_value="mname")
-        self.action.data["results"]["Stdout"] = "0"
+        self.run_on_units_mocks("0")
+        with self.assertRaises(AsyncTimeoutError):
+            model.block_until_file_missing("app", "/tmp/src/myfile.txt", timeout=0.1)
+        self.async_run_on_units.side_effect = model.JujuError("connection closed")
         with self.assertRaises(AsyncTimeoutError):
             model.block_until_file_missing("app", "/tmp/src/myfile.txt", timeout=0.1)
 
     def test_block_until_file_matches_re(self):
-        self.action.data = {"results": {"Code": "0", "Stderr": "", "Stdout": "somestring"}}
-
-        self.patch_object(model, "Model")
-        self.Model.return_value = self.Model_mock
-        self.patch_object(model, "get_juju_model", return_value="mname")
+        self.run_on_units_mocks("somestring")
         model.block_until_file_matches_re("app", "/tmp/src/myfile.txt", "s.*string", timeout=0.1)
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
-        self.unit2.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_once_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
 
     def test_async_block_until_all_units_idle(self):
         async def _block_until(f, timeout=None, model=None):
@@ -1599,7 +1712,7 @@ class TestModel(ut_utils.BaseTestCase):
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -1621,7 +1734,7 @@ class TestModel(ut_utils.BaseTestCase):
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -1642,7 +1755,7 @@ class TestModel(ut_utils.BaseTestCase):
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _run_on_unit(unit_name, cmd, model_name=None, timeout=None):
+        async def _run_on_unit(unit_name, cmd, model_name=None, timeout=None, max_age=None):
             return rou_return
 
         self.patch_object(model, "async_run_on_unit")
@@ -1662,7 +1775,11 @@ class TestModel(ut_utils.BaseTestCase):
         self.block_until_service_status_base({"Stdout": "152 409 54"})
         model.block_until_service_status("app/2", ["test_svc"], "running", pgrep_full=True)
         self.async_run_on_unit.assert_called_once_with(
-            "app/2", "pgrep -f 'test_svc'", model_name=None, timeout=2700
+            "app/2",
+            "pgrep -f 'test_svc'",
+            model_name=None,
+            timeout=2700,
+            max_age=model.probe_cache.TTL,
         )
 
     def test_block_until_service_status_check_running_fail(self):
@@ -1683,18 +1800,33 @@ class TestModel(ut_utils.BaseTestCase):
             model.block_until_service_status("app/2", ["test_svc"], "stopped")
 
     def test_get_unit_time(self):
-        async def _run_on_unit(unit_name, command, model_name=None, timeout=None):
-            return {"Stdout": "1524409654"}
+        self.patch_object(model, "async_get_clock_offsets")
+        self.async_get_clock_offsets.return_value = {
+            "app/2": model.ClockOffset(offset=100.0, rtt=2.0, time=0.0)
+        }
+        self.patch_object(model.time, "time", return_value=1524409554.5)
+        self.assertEqual(model.get_unit_time("app/2"), 1524409653)
+        self.async_get_clock_offsets.assert_awaited_once_with(
+            ["app/2"], model_name=None, timeout=None
+        )
 
-        self.patch_object(model, "async_run_on_unit")
-        self.async_run_on_unit.side_effect = _run_on_unit
-        self.assertEqual(model.get_unit_time("app/2"), 1524409654)
-        self.async_run_on_unit.assert_called_once_with(
-            unit_name="app/2", command="date +'%s'", model_name=None, timeout=None
+    def test_get_units_time(self):
+        self.patch_object(model, "async_get_clock_offsets")
+        self.async_get_clock_offsets.return_value = {
+            "nova-compute/0": model.ClockOffset(offset=100.0, rtt=0.0, time=0.0),
+            "ceph-osd/0": model.ClockOffset(offset=-100.0, rtt=0.0, time=0.0),
+        }
+        self.patch_object(model.time, "time", return_value=1524409554.0)
+        self.assertEqual(
+            model.get_units_time(["nova-compute/0", "ceph-osd/0"], timeout=5),
+            {"nova-compute/0": 1524409654, "ceph-osd/0": 1524409454},
+        )
+        self.async_get_clock_offsets.assert_awaited_once_with(
+            ["nova-compute/0", "ceph-osd/0"], model_name=None, timeout=5
         )
 
     def test_get_systemd_service_active_time(self):
-        async def _run_on_unit(unit_name, command, model_name=None, timeout=None):
+        async def _run_on_unit(unit_name, command, model_name=None, timeout=None, max_age=None):
             return {"Stdout": "ActiveEnterTimestamp=Fri 2022-01-14 13:32:24 UTC"}
 
         self.patch_object(model, "async_run_on_unit")
@@ -1705,11 +1837,15 @@ class TestModel(ut_utils.BaseTestCase):
         )
         cmd = r"systemctl show mysvc1 --property=ActiveEnterTimestamp"
         self.async_run_on_unit.assert_called_once_with(
-            unit_name="app/2", command=cmd, model_name=None, timeout=None
+            unit_name="app/2",
+            command=cmd,
+            model_name=None,
+            timeout=None,
+            max_age=model.probe_cache.TTL,
         )
 
     def test_get_unit_service_start_time(self):
-        async def _run_on_unit(unit_name, command, model_name=None, timeout=None):
+        async def _run_on_unit(unit_name, command, model_name=None, timeout=None, max_age=None):
             return {"Stdout": "1524409654"}
 
         self.patch_object(model, "async_run_on_unit")
@@ -1720,11 +1856,15 @@ class TestModel(ut_utils.BaseTestCase):
             "xargs -d' ' -I {} stat -c %Y /proc/{}  | sort -n | head -1"
         )
         self.async_run_on_unit.assert_called_once_with(
-            unit_name="app/2", command=cmd, model_name=None, timeout=None
+            unit_name="app/2",
+            command=cmd,
+            model_name=None,
+            timeout=None,
+            max_age=model.probe_cache.TTL,
         )
 
     def test_get_unit_service_start_time_with_pgrep(self):
-        async def _run_on_unit(unit_name, command, model_name=None, timeout=None):
+        async def _run_on_unit(unit_name, command, model_name=None, timeout=None, max_age=None):
             return {"Stdout": "1524409654"}
 
         self.patch_object(model, "async_run_on_unit")
@@ -1735,11 +1875,15 @@ class TestModel(ut_utils.BaseTestCase):
         cmd = "stat -c %Y /proc/$(pgrep -o -f 'mysvc1')"
 
         self.async_run_on_unit.assert_called_once_with(
-            unit_name="app/2", command=cmd, model_name=None, timeout=None
+            unit_name="app/2",
+            command=cmd,
+            model_name=None,
+            timeout=None,
+            max_age=model.probe_cache.TTL,
         )
 
     def test_get_unit_service_start_time_not_running(self):
-        async def _run_on_unit(unit_name, command, model_name=None, timeout=None):
+        async def _run_on_unit(unit_name, command, model_name=None, timeout=None, max_age=None):
             return {"Stdout": ""}
 
         self.patch_object(model, "async_run_on_unit")
@@ -1748,10 +1892,7 @@ class TestModel(ut_utils.BaseTestCase):
             model.get_unit_service_start_time("app/2", "mysvc1")
 
     def block_until_oslo_config_entries_match_base(self, file_contents, expected_contents):
-        self.action.data = {"results": {"Code": "0", "Stderr": "", "Stdout": file_contents}}
-        self.patch_object(model, "Model")
-        self.patch_object(model, "get_juju_model", return_value="mname")
-        self.Model.return_value = self.Model_mock
+        self.run_on_units_mocks(file_contents)
         model.block_until_oslo_config_entries_match(
             "app", "/tmp/src/myfile.txt", expected_contents, timeout=0.1
         )
@@ -1781,8 +1922,9 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             },
         }
         self.block_until_oslo_config_entries_match_base(file_contents, expected_contents)
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
-        self.unit2.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_once_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
 
     def test_block_until_oslo_config_entries_match_fail(self):
         file_contents = """
@@ -1810,7 +1952,9 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         }
         with self.assertRaises(AsyncTimeoutError):
             self.block_until_oslo_config_entries_match_base(file_contents, expected_contents)
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
 
     def test_block_until_oslo_config_entries_match_missing_entry(self):
         file_contents = """
@@ -1837,7 +1981,9 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         }
         with self.assertRaises(AsyncTimeoutError):
             self.block_until_oslo_config_entries_match_base(file_contents, expected_contents)
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
 
     def test_block_until_oslo_config_entries_match_missing_section(self):
         file_contents = """
@@ -1859,7 +2005,9 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         }
         with self.assertRaises(AsyncTimeoutError):
             self.block_until_oslo_config_entries_match_base(file_contents, expected_contents)
-        self.unit1.run.assert_called_once_with("cat /tmp/src/myfile.txt")
+        self.async_run_on_units.assert_awaited_with(
+            "cat /tmp/src/myfile.txt", application_name="app", model_name=None
+        )
 
     def block_until_services_restarted_base(self, gu_return=None, gu_raise_exception=False):
         async def _block_until(f, timeout=None):
@@ -1916,7 +2064,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -1936,7 +2084,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         (
@@ -1969,7 +2117,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -1991,7 +2139,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -2016,7 +2164,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -2041,7 +2189,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -2067,7 +2215,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             if not rc:
                 raise AsyncTimeoutError
 
-        async def _get_status(*args):
+        async def _get_status(*args, **kwargs):
             return self.juju_status
 
         self.patch_object(model, "Model")
@@ -2097,36 +2245,63 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         self.Model.return_value = self.Model_mock
         self.patch_object(model, "units_with_wl_status_state")
         self.unit1.workload_status_message = 'hook failed: "update-status"'
-        self.units_with_wl_status_state.return_value = [self.unit1]
-        self.patch_object(model.generic_utils, "check_output")
+        self.unit2.workload_status_message = 'hook failed: "install"'
+        self.units_with_wl_status_state.return_value = [self.unit1, self.unit2]
+        self.patch_object(model.juju.client.client, "ApplicationFacade")
+        self.facade = self.ApplicationFacade.from_connection.return_value
+        self.facade.ResolveUnitErrors = mock.AsyncMock(return_value=mock.MagicMock(results=[]))
         self.block_until_auto_reconnect_model.side_effect = _block_until
 
+    def assert_resolved(self, *units):
+        self.facade.ResolveUnitErrors.assert_awaited_once_with(
+            all_=False,
+            retry=True,
+            tags={"entities": [{"tag": "unit-{}".format(u.replace("/", "-"))} for u in units]},
+        )
+
     def test_resolve_units(self):
         self.resolve_units_mocks()
         model.resolve_units(wait=False)
-        self.check_output.assert_called_once_with(["juju", "resolved", "-m", "testmodel", "app/2"])
+        self.assert_resolved("app/2", "app/4")
 
     def test_resolve_units_no_match(self):
         self.resolve_units_mocks()
         model.resolve_units(application_name="foo", wait=False)
-        self.assertFalse(self.check_output.called)
+        self.assertFalse(self.facade.ResolveUnitErrors.called)
+
+    def test_resolve_units_wait(self):
+        self.resolve_units_mocks()
+        model.resolve_units(wait=True, timeout=0.1)
+        self.assert_resolved("app/2", "app/4")
+        self.block_until_auto_reconnect_model.assert_called_once_with(
+            mock.ANY, model=self.Model_mock, timeout=0.1
+        )
 
     def test_resolve_units_wait_timeout(self):
         self.resolve_units_mocks()
-        self.unit1.workload_status = "error"
+        self.unit2.workload_status = "error"
         with self.assertRaises(AsyncTimeoutError):
             model.resolve_units(wait=True, timeout=0.1)
-        self.check_output.assert_called_once_with(["juju", "resolved", "-m", "testmodel", "app/2"])
+        self.assert_resolved("app/2", "app/4")
+        self.block_until_auto_reconnect_model.assert_called_once()
 
     def test_resolve_units_erred_hook(self):
         self.resolve_units_mocks()
         model.resolve_units(wait=False, erred_hook="update-status")
-        self.check_output.assert_called_once_with(["juju", "resolved", "-m", "testmodel", "app/2"])
+        self.assert_resolved("app/2")
 
     def test_resolve_units_erred_hook_no_match(self):
         self.resolve_units_mocks()
         model.resolve_units(erred_hook="foo", wait=False)
-        self.assertFalse(self.check_output.called)
+        self.assertFalse(self.facade.ResolveUnitErrors.called)
+
+    def test_resolve_units_error(self):
+        self.resolve_units_mocks()
+        self.facade.ResolveUnitErrors.return_value = mock.MagicMock(
+            results=[ErrorResult(), ErrorResult(error={"message": "not in error"})]
+        )
+        with self.assertRaisesRegex(model.JujuError, "not in error"):
+            model.resolve_units(wait=False)
 
     def test_wait_for_agent_status(self):
         async def _block_until(f, timeout=None, model=None):
@@ -2197,85 +2372,355 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         self.Model_mock.charmstore.entity.side_effect = _entity
         self.assertEqual(model.get_latest_charm_url("cs:something"), "cs:something-23")
 
+    def facade_mocks(self, facade):
+        self.patch_object(model, "get_model", return_value=self.Model_mock)
+        self.patch_object(model.juju.client.client, facade)
+        self.facade = getattr(self, facade).from_connection.return_value
+        return self.facade
+
+    def facade_connections(self, facade, response):
+        """Yield a connection for each facade version libjuju can negotiate.
+
+        The facades are resolved by lookup_facade(), as on a real controller,
+        and the RPCs return response.
+        """
+        self.patch_object(model, "get_model", return_value=self.Model_mock)
+        for version in client_facades[facade]["versions"]:
+            connection = mock.MagicMock(facades={facade: version})
+            connection.rpc = mock.AsyncMock(return_value={"response": response})
+            self.Model_mock.connection.return_value = connection
+            with self.subTest(version=version):
+                yield connection
+
+    def test_run_on_units(self):
+        facade = self.facade_mocks("ActionFacade")
+        facade.Run = mock.AsyncMock(
+            return_value=mock.MagicMock(
+                results=[
+                    mock.MagicMock(error=None, action=mock.MagicMock(receiver=receiver, tag=tag))
+                    for receiver, tag in [
+                        ("unit-nova-compute-0", "action-1"),
+                        ("unit-nova-compute-12", "action-2"),
+                        ("machine-1-lxd-0", "action-3"),
+                    ]
+                ]
+            )
+        )
+        outputs = {
+            "action-1": {"Code": "0", "Stdout": "a"},
+            "action-2": {"Code": "0", "stdout": "b"},
+            "action-3": None,
+        }
+
+        async def _wait_for_action(tag):
+            return mock.MagicMock(data={"results": outputs[tag]})
+
+        self.Model_mock.wait_for_action.side_effect = _wait_for_action
+        results = model.run_on_units(
+            "hostname", application_name="nova-compute", machines=["1/lxd/0"], timeout=10
+        )
+        self.assertEqual(
+            results,
+            {
+                "nova-compute/0": {
+                    "Code": "0",
+                    "Stderr": "",
+                    "Stdout": "a",
+                    "stderr": "",
+                    "stdout": "a",
+                },
+                "nova-compute/12": {
+                    "Code": "0",
+                    "Stderr": "",
+                    "Stdout": "b",
+                    "stderr": "",
+                    "stdout": "b",
+                },
+                "1/lxd/0": {},
+            },
+        )
+        facade.Run.assert_awaited_once_with(
+            applications=["nova-compute"],
+            commands="hostname",
+            machines=["1/lxd/0"],
+            timeout=10000000000,
+            units=[],
+        )
+
+        facade.Run.return_value = mock.MagicMock(
+            results=[mock.MagicMock(error=mock.MagicMock(message="no such unit"))]
+        )
+        with self.assertRaisesRegex(model.JujuError, "no such unit"):
+            model.run_on_units("hostname", units=["nova-compute/7"])
+        with self.assertRaises(ValueError):
+            model.run_on_units("hostname")
+
+    def test_run_on_units_cached(self):
+        self.addCleanup(model.probe_cache.invalidate)
+        facade = self.facade_mocks("ActionFacade")
+        facade.Run = mock.AsyncMock(
+            return_value=mock.MagicMock(
+                results=[
+                    mock.MagicMock(
+                        error=None, action=mock.MagicMock(receiver="unit-app-1", tag="action-1")
+                    )
+                ]
+            )
+        )
+
+        async def _wait_for_action(tag):
+            return mock.MagicMock(data={"results": {"Code": "0", "Stdout": "1.0"}})
+
+        self.Model_mock.wait_for_action.side_effect = _wait_for_action
+        model.probe_cache.put("app/0", "dpkg -l", {"Code": "0", "Stdout": "0.9"})
+
+        results = model.run_on_units("dpkg -l", units=["app/0", "app/1"], max_age=10)
+
+        self.assertEqual(results["app/0"], {"Code": "0", "Stdout": "0.9"})
+        self.assertEqual(results["app/1"]["Stdout"], "1.0")
+        facade.Run.assert_awaited_once_with(
+            applications=[], commands="dpkg -l", machines=[], timeout=None, units=["app/1"]
+        )
+        # every unit is cached now, so there is nothing to run
+        model.run_on_units("dpkg -l", units=["app/0", "app/1"], max_age=10)
+        facade.Run.assert_awaited_once()
+
+        model.probe_cache.invalidate()
+        model.run_on_units("dpkg -l", units=["app/0", "app/1"], max_age=0)
+        self.assertIsNone(model.probe_cache.get("app/1", "dpkg -l", max_age=10))
+
+        model.run_on_units("apt-get upgrade", application_name="app")
+        self.assertIsNone(model.probe_cache.get("app/0", "dpkg -l", max_age=10))
+        model.probe_cache.put("app/0", "dpkg -l", {"Code": "0", "Stdout": "0.9"})
+        model.run_on_units("reboot", machines=["0"])
+        self.assertIsNone(model.probe_cache.get("app/0", "dpkg -l", max_age=10))
+
+    def test_get_units_by_machine(self):
+        status = model.status_utils.compact_status(
+            {
+                "applications": {
+                    "nova-compute": {
+                        "units": {
+                            "nova-compute/0": {
+                                "machine": "0",
+                                "subordinates": {"ovn-chassis/0": {}},
+                            },
+                            "nova-compute/1": {"machine": "1"},
+                        }
+                    },
+                    "ceph-osd": {"units": {"ceph-osd/0": {"machine": "0"}}},
+                }
+            }
+        )
+        self.patch_object(model, "async_get_status", return_value=status)
+        units = ["nova-compute/0", "ovn-chassis/0", "ceph-osd/0", "nova-compute/1", "gone/0"]
+        self.assertEqual(
+            model.get_units_by_machine(units),
+            {
+                "0": ["nova-compute/0", "ovn-chassis/0", "ceph-osd/0"],
+                "1": ["nova-compute/1"],
+                "gone/0": ["gone/0"],
+            },
+        )
+        self.async_get_status.assert_awaited_once_with(
+            None, refresh=False, filters=["ceph-osd", "gone", "nova-compute", "ovn-chassis"]
+        )
+
+    def test_run_on_unit_machines(self):
+        self.patch_object(model, "async_get_units_by_machine")
+        self.async_get_units_by_machine.return_value = {
+            "0": ["nova-compute/0", "ceph-osd/0"],
+            "1": ["nova-compute/1"],
+        }
+        self.patch_object(model, "async_run_on_units")
+        self.async_run_on_units.return_value = {
+            "nova-compute/0": {"Stdout": "a"},
+            "nova-compute/1": {"Stdout": "b"},
+        }
+        units = ["nova-compute/0", "ceph-osd/0", "nova-compute/1"]
+        self.assertEqual(
+            model.run_on_unit_machines(units, "date", timeout=5),
+            {
+                "nova-compute/0": {"Stdout": "a"},
+                "ceph-osd/0": {"Stdout": "a"},
+                "nova-compute/1": {"Stdout": "b"},
+            },
+        )
+        self.async_run_on_units.assert_awaited_once_with(
+            "date",
+            units=["nova-compute/0", "nova-compute/1"],
+            model_name=None,
+            timeout=5,
+            max_age=None,
+        )
+
+        self.async_get_units_by_machine.return_value = {}
+        self.assertEqual(model.run_on_unit_machines([], "date"), {})
+        self.async_run_on_units.assert_awaited_once()
+
     def test_prepare_series_upgrade(self):
-        self.patch_object(model, "subprocess")
-        self.patch_object(model, "get_juju_model", return_value=self.model_name)
-        _machine_num = "1"
-        _to_series = "bionic"
-        model.prepare_series_upgrade(_machine_num, to_series=_to_series)
-        self.subprocess.check_call.assert_called_once_with(
-            [
-                "juju",
-                "upgrade-series",
-                "-m",
-                self.model_name,
-                _machine_num,
-                "prepare",
-                _to_series,
-                "--yes",
-            ]
+        facade = self.facade_mocks("MachineManagerFacade")
+        facade.UpgradeSeriesPrepare = mock.AsyncMock(return_value=ErrorResult())
+        model.prepare_series_upgrade("1/lxd/0", to_series="bionic")
+        facade.UpgradeSeriesPrepare.assert_awaited_once_with(
+            force=False, series="bionic", tag={"tag": "machine-1-lxd-0"}
         )
 
-    def test_complete_series_upgrade(self):
-        self.patch_object(model, "get_juju_model", return_value=self.model_name)
-        self.patch_object(model, "subprocess")
-        _machine_num = "1"
-        model.complete_series_upgrade(_machine_num)
-        self.subprocess.check_call.assert_called_once_with(
-            ["juju", "upgrade-series", "-m", self.model_name, _machine_num, "complete"]
+        facade.UpgradeSeriesPrepare.return_value = ErrorResult(
+            error={"message": "unit is not idle"}
         )
+        with self.assertRaisesRegex(model.JujuError, "unit is not idle"):
+            model.prepare_series_upgrade("1", to_series="bionic")
+
+    def test_complete_series_upgrade(self):
+        facade = self.facade_mocks("MachineManagerFacade")
+        facade.UpgradeSeriesComplete = mock.AsyncMock(return_value=ErrorResult())
+        model.complete_series_upgrade("1")
+        facade.UpgradeSeriesComplete.assert_awaited_once_with(tag={"tag": "machine-1"})
+
+    def test_series_upgrade_negotiated_facade(self):
+        self.patch_object(model.generic_utils, "check_call")
+        for connection in self.facade_connections("MachineManager", {}):
+            self.check_call.reset_mock()
+            model.prepare_series_upgrade("1", to_series="bionic", model_name="test")
+            model.complete_series_upgrade("1", model_name="test")
+            # libjuju 2.9 binds no upgrade-series call, so juju is run
+            self.check_call.assert_has_awaits(
+                [
+                    mock.call(
+                        ["juju", "upgrade-series", "-m", "test", "1", "prepare", "bionic", "--yes"]
+                    ),
+                    mock.call(["juju", "upgrade-series", "-m", "test", "1", "complete"]),
+                ]
+            )
+            connection.rpc.assert_not_awaited()
+
+    def test_series_upgrade_invalidates_clock_offsets(self):
+        self.patch_object(model, "invalidate_clock_offsets")
+        facade = self.facade_mocks("MachineManagerFacade")
+        facade.UpgradeSeriesPrepare = mock.AsyncMock(return_value=ErrorResult())
+        facade.UpgradeSeriesComplete = mock.AsyncMock(return_value=ErrorResult())
+        model.prepare_series_upgrade("1", to_series="bionic", model_name="test")
+        model.complete_series_upgrade("1", model_name="test")
+        self.invalidate_clock_offsets.assert_has_calls(
+            [mock.call("test", machines=["1"]), mock.call("test", machines=["1"])]
+        )
+
+    def test_invalidate_clock_offsets_machines(self):
+        self.addCleanup(model.invalidate_clock_offsets)
+        offset = model.ClockOffset(1.0, 0.1, 0.0)
+        with model._CLOCK_OFFSETS_LOCK:
+            for machine in ("1", "1/lxd/0", "10", "2"):
+                model._CLOCK_OFFSETS[("None", machine)] = offset
+            model._CLOCK_OFFSETS[("test", "1")] = offset
+        model.invalidate_clock_offsets(machines=["1"])
+        self.assertEqual(set(model._CLOCK_OFFSETS), {("None", "10"), ("None", "2"), ("test", "1")})
 
     def test_set_series(self):
-        self.patch_object(model, "get_juju_model", return_value=self.model_name)
-        self.patch_object(model, "subprocess")
-        _application = "application"
-        _to_series = "bionic"
-        model.set_series(_application, _to_series)
-        self.subprocess.check_call.assert_called_once_with(
-            ["juju", "set-series", "-m", self.model_name, _application, _to_series]
+        facade = self.facade_mocks("ApplicationFacade")
+        facade.UpdateApplicationSeries = mock.AsyncMock(return_value=mock.MagicMock(results=[]))
+        model.set_series("application", "bionic")
+        facade.UpdateApplicationSeries.assert_awaited_once_with(
+            args=[{"tag": {"tag": "application-application"}, "series": "bionic", "force": False}]
         )
 
     def test_attach_resource(self):
-        self.patch_object(model, "get_juju_model", return_value=self.model_name)
-        self.patch_object(model, "subprocess")
-        _application = "application"
-        _resource_name = "myresource"
-        _resource_path = "/path/to/{}.tar.gz".format(_resource_name)
-        model.attach_resource(_application, _resource_name, _resource_path)
-        self.subprocess.check_call.assert_called_once_with(
-            [
-                "juju",
-                "attach-resource",
-                "-m",
-                self.model_name,
-                _application,
-                "{}={}".format(_resource_name, _resource_path),
-            ]
-        )
+        self.patch_object(model, "get_model", return_value=self.Model_mock)
+        app = self.mymodel.applications["app"]
+        on_event_loop = []
+
+        def _attach_resource(resource_name, file_name, file_obj):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+
+        app.attach_resource.side_effect = _attach_resource
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "myresource.tar.gz")
+            with open(path, "w") as f:
+                f.write("resource")
+            model.attach_resource("app", "myresource", path)
+        app.attach_resource.assert_called_once_with("myresource", "myresource.tar.gz", mock.ANY)
+        # the upload blocks, so it doesn't run on the event loop
+        self.assertEqual(on_event_loop, [False])
+
+    def test_set_model_constraints(self):
+        self.patch_object(model, "get_model", return_value=self.Model_mock)
+        self.Model_mock.set_constraints = mock.AsyncMock()
+        model.set_model_constraints({})
+        self.assertFalse(self.Model_mock.set_constraints.called)
+        model.set_model_constraints({"mem": "4G", "cores": 2})
+        self.Model_mock.set_constraints.assert_awaited_once_with({"mem": 4096, "cores": 2})
 
     def test_add_storage(self):
-        self.patch_object(model, "get_juju_model", return_value=self.model_name)
-        self.patch_object(model, "subprocess")
-        model.add_storage("ceph-osd/0", "label", "pool", 101)
-        self.subprocess.check_output.assert_called_once_with(
-            ["juju", "add-storage", "ceph-osd/0", "-m", self.model_name, "label=pool,101GB"],
-            stderr=mock.ANY,
+        facade = self.facade_mocks("StorageFacade")
+        result = mock.MagicMock(error=None)
+        result.result.storage_tags = ["storage-label-12"]
+        facade.AddToUnit = mock.AsyncMock(return_value=mock.MagicMock(results=[result]))
+        self.assertEqual(model.add_storage("ceph-osd/0", "label", "pool", 101), "label/12")
+        facade.AddToUnit.assert_awaited_once_with(
+            storages=[
+                {
+                    "unit": "unit-ceph-osd-0",
+                    "name": "label",
+                    "storage": {"pool": "pool", "size": 101 * 1024, "count": 1},
+                }
+            ]
         )
 
     def test_detach_storage(self):
-        self.patch_object(model, "get_juju_model", return_value=self.model_name)
-        self.patch_object(model, "subprocess")
-        model.detach_storage("storage", force=True)
-        self.subprocess.check_call.assert_called_once_with(
-            ["juju", "detach-storage", "-m", self.model_name, "storage", "--force"]
-        )
+        facade = self.facade_mocks("StorageFacade")
+        facade.DetachStorage = mock.AsyncMock(return_value=mock.MagicMock(results=[]))
+        model.detach_storage("osd-devices/0", force=True)
+        facade.DetachStorage.assert_awaited_once_with(
+            force=True, ids={"ids": [{"storage-tag": "storage-osd-devices-0", "unit-tag": ""}]}
+        )
+
+    def test_detach_storage_negotiated_facade(self):
+        self.patch_object(model.generic_utils, "check_call")
+        for connection in self.facade_connections("Storage", {"results": []}):
+            model.detach_storage("osd-devices/0", model="test")
+            connection.rpc.assert_awaited_once()
+            msg = connection.rpc.await_args.args[0]
+            self.assertEqual(msg["request"], "Detach")
+            self.assertEqual(
+                msg["params"],
+                {"ids": [{"storage-tag": "storage-osd-devices-0", "unit-tag": ""}]},
+            )
+
+            model.detach_storage("osd-devices/0", model="test", force=True)
+            connection.rpc.assert_awaited_once()
+            self.check_call.assert_awaited_with(
+                ["juju", "detach-storage", "-m", "test", "osd-devices/0", "--force"]
+            )
 
     def test_remove_storage(self):
-        self.patch_object(model, "get_juju_model", return_value=self.model_name)
-        self.patch_object(model, "subprocess")
-        model.remove_storage("storage", force=True, destroy=False)
-        self.subprocess.check_call.assert_called_once_with(
-            ["juju", "remove-storage", "storage", "-m", self.model_name, "--force", "--no-destroy"]
+        facade = self.facade_mocks("StorageFacade")
+        facade.Remove = mock.AsyncMock(return_value=mock.MagicMock(results=[]))
+        model.remove_storage("osd-devices/0", force=True, destroy=False)
+        facade.Remove.assert_awaited_once_with(
+            storage=[
+                {
+                    "tag": "storage-osd-devices-0",
+                    "destroy-attachments": False,
+                    "destroy-storage": False,
+                    "force": True,
+                }
+            ]
+        )
+        facade.Remove.reset_mock()
+        model.remove_storage("osd-devices/0", destroy_attachments=True)
+        facade.Remove.assert_awaited_once_with(
+            storage=[
+                {
+                    "tag": "storage-osd-devices-0",
+                    "destroy-attachments": True,
+                    "destroy-storage": True,
+                    "force": False,
+                }
+            ]
         )
 
 
@@ -2299,6 +2744,285 @@ class AsyncModelTests(aiounittest.AsyncTestCase):
 
         await model.async_block_until(_f, _g, timeout=0.1)
 
+    async def test_async_block_until_targets(self):
+        def _status(unit_status, charm, machine_status):
+            return model.status_utils.compact_status(
+                {
+                    "applications": {
+                        "app": {
+                            "charm": charm,
+                            "units": {
+                                "app/0": {
+                                    "workload-status": {"status": unit_status},
+                                    "subordinates": {
+                                        "sub/0": {"workload-status": {"status": "active"}}
+                                    },
+                                }
+                            },
+                        },
+                        "sub": {"subordinate-to": ["app"]},
+                    },
+                    "machines": {
+                        "0": {
+                            "agent-status": {"status": machine_status},
+                            "containers": {"0/lxd/1": {"agent-status": {"status": "started"}}},
+                        }
+                    },
+                }
+            )
+
+        def _active(unit):
+            return unit.workload_status.status == "active"
+
+        def _started(machine):
+            return machine.agent_status.status == "started"
+
+        targets = [
+            model.WaitTarget("unit", "app/0", _active),
+            model.WaitTarget("unit", "sub/0", _active),
+            model.WaitTarget("application", "app", lambda app: app.charm == "ch:app-2"),
+            model.WaitTarget("machine", "0", _started, description="started"),
+            model.WaitTarget("machine", "0/lxd/1", _started),
+            model.WaitTarget("model", None, lambda status: "sub" in status.applications),
+        ]
+        statuses = [
+            _status("maintenance", "ch:app-1", "pending"),
+            _status("active", "ch:app-2", "pending"),
+            _status("active", "ch:app-2", "started"),
+        ]
+        on_satisfied = mock.MagicMock()
+        with mock.patch.object(model, "async_get_status", side_effect=statuses) as get_status:
+            with mock.patch.object(model.asyncio, "sleep", new=mock.AsyncMock()):
+                satisfied = await model.async_block_until_targets(
+                    targets, model_name="test", on_satisfied=on_satisfied
+                )
+
+        self.assertEqual(
+            satisfied, [targets[1], targets[4], targets[5], targets[0], targets[2], targets[3]]
+        )
+        on_satisfied.assert_has_calls([mock.call(target) for target in satisfied])
+        get_status.assert_awaited_with("test", interval=4.0, refresh=True, filters=None)
+        self.assertEqual(get_status.await_count, 3)
+        self.assertEqual(repr(targets[3]), "machine 0 (started)")
+        self.assertEqual(repr(targets[5]), "model")
+
+    async def test_async_block_until_targets_timeout(self):
+        targets = [
+            model.WaitTarget("unit", "app/9", lambda unit: True),
+            model.WaitTarget("unit", "app/0", lambda unit: True),
+            model.WaitTarget("machine", "0/lxd/0", lambda machine: True),
+        ]
+        with mock.patch.object(model, "async_get_status", return_value=COMPACT_STATUS):
+            with self.assertLogs(level="WARNING") as logs:
+                with self.assertRaises(AsyncTimeoutError):
+                    await model.async_block_until_targets(targets, timeout=0.1)
+        self.assertIn("Timed out waiting for: unit app/9, machine 0/lxd/0", logs.output[0])
+
+    async def test_async_block_until_targets_idle(self):
+        def _status(unit_status):
+            return model.status_utils.compact_status(
+                {
+                    "applications": {
+                        "app": {
+                            "charm": "ch:app-1",
+                            "units": {"app/0": {"workload-status": {"status": unit_status}}},
+                        },
+                    },
+                }
+            )
+
+        model_mock = mock.MagicMock()
+        model_mock.all_units_idle.side_effect = [False, True]
+        targets = [
+            model.unit_wl_status_target("app/0", "blocked"),
+            model.charm_url_target("app", "ch:app-1"),
+        ]
+        with mock.patch.object(
+            model, "async_get_status", side_effect=[_status("active"), _status("blocked")]
+        ) as get_status, mock.patch.object(
+            model, "get_model", return_value=model_mock
+        ), mock.patch.object(
+            model, "watch_model_state"
+        ) as watch_model_state, mock.patch.object(
+            model, "units_with_wl_status_state", return_value=[]
+        ), mock.patch.object(
+            model.asyncio, "sleep", new=mock.AsyncMock()
+        ):
+            satisfied = await model.async_block_until_targets(targets, idle=True)
+
+        # the units become idle after the targets are satisfied, so the last
+        # pass doesn't fetch the status
+        self.assertEqual(satisfied, [targets[1], targets[0]])
+        self.assertEqual(get_status.await_count, 2)
+        get_status.assert_awaited_with(None, interval=4.0, refresh=True, filters=["app"])
+        self.assertEqual(model_mock.all_units_idle.call_count, 2)
+        watch_model_state.assert_called_once_with(model_mock)
+
+    async def test_async_block_until_targets_idle_before_target(self):
+        statuses = [
+            model.status_utils.compact_status(
+                {
+                    "applications": {
+                        "app": {"units": {"app/0": {"workload-status": {"status": status}}}}
+                    }
+                }
+            )
+            for status in ("maintenance", "maintenance", "blocked")
+        ]
+        get_status = mock.AsyncMock(side_effect=statuses)
+        # the status polls done at each check of the units
+        idle_checks = []
+
+        def _all_units_idle():
+            idle_checks.append(get_status.await_count)
+            # idle until the unit gets to its status, then busy (e.g. hooks run
+            # after a reboot) in that poll, and only then idle again
+            return get_status.await_count < len(statuses) or len(idle_checks) > 1
+
+        model_mock = mock.MagicMock()
+        model_mock.all_units_idle.side_effect = _all_units_idle
+        target = model.unit_wl_status_target("app/0", "blocked")
+        with mock.patch.object(model, "async_get_status", new=get_status), mock.patch.object(
+            model, "get_model", return_value=model_mock
+        ), mock.patch.object(model, "watch_model_state"), mock.patch.object(
+            model, "units_with_wl_status_state", return_value=[]
+        ), mock.patch.object(
+            model.asyncio, "sleep", new=mock.AsyncMock()
+        ):
+            self.assertEqual(await model.async_block_until_targets([target], idle=True), [target])
+
+        self.assertEqual(idle_checks, [3, 3])
+
+    async def test_async_block_until_targets_idle_errors(self):
+        model_mock = mock.MagicMock()
+        model_mock.all_units_idle.return_value = False
+        errored = [mock.MagicMock(entity_id="app/0")]
+        with mock.patch.object(model, "get_model", return_value=model_mock), mock.patch.object(
+            model, "watch_model_state"
+        ), mock.patch.object(model, "units_with_wl_status_state", return_value=errored):
+            with self.assertRaises(model.UnitError):
+                await model.async_block_until_targets([], idle=True)
+            with self.assertLogs(level="WARNING"):
+                self.assertEqual(
+                    await model.async_block_until_targets([], idle=True, ignore_hard_errors=True),
+                    [],
+                )
+
+    async def test_async_block_until_targets_idle_timeout(self):
+        model_mock = mock.MagicMock()
+        model_mock.all_units_idle.return_value = False
+        with mock.patch.object(model, "get_model", return_value=model_mock), mock.patch.object(
+            model, "watch_model_state"
+        ), mock.patch.object(model, "units_with_wl_status_state", return_value=[]):
+            with self.assertLogs(level="WARNING") as logs:
+                with self.assertRaises(AsyncTimeoutError):
+                    await model.async_block_until_targets([], idle=True, timeout=0.1)
+        self.assertIn("Timed out waiting for: all units idle", logs.output[0])
+
+    def test_wait_target_lookup_missing_principal(self):
+        status = model.status_utils.compact_status(
+            {
+                "applications": {
+                    "sub": {"subordinate-to": ["app", "other"]},
+                    "other": {"charm": "ch:other-1"},
+                },
+            }
+        )
+        # the principal is filtered out of the status, or has no units
+        target = model.WaitTarget("unit", "sub/0", lambda unit: True)
+        self.assertIsNone(target.lookup(status))
+        target = model.WaitTarget("unit", "sub/0", lambda unit: True, principal="app")
+        self.assertFalse(target.satisfied(status))
+
+    def test_wait_targets_filters(self):
+        self.assertEqual(
+            model._wait_targets_filters(
+                [
+                    model.WaitTarget("unit", "sub/0", None, principal="app"),
+                    model.WaitTarget("application", "other", None),
+                ]
+            ),
+            ["app", "other", "sub"],
+        )
+        with self.assertRaises(ValueError):
+            model.WaitTarget("relation", "app:ha", None)
+
+    async def test_async_get_clock_offsets(self):
+        self.addCleanup(model.invalidate_clock_offsets)
+        groups = {"0": ["nova-compute/0", "ceph-osd/0"], "1": ["nova-compute/1"]}
+        results = {
+            "nova-compute/0": {"Code": "0", "Stdout": "1010.5\n"},
+            "nova-compute/1": {"Code": "0", "Stdout": "995.0\n"},
+        }
+        with mock.patch.object(
+            model, "async_get_units_by_machine", return_value=groups
+        ) as get_units_by_machine, mock.patch.object(
+            model, "async_run_on_units", return_value=results
+        ) as run_on_units, mock.patch.object(
+            model.time, "time", side_effect=[1000.0, 1001.0]
+        ), mock.patch.object(
+            model.time, "monotonic", return_value=50.0
+        ):
+            offsets = await model.async_get_clock_offsets(
+                ["nova-compute/0", "ceph-osd/0", "nova-compute/1"], timeout=5
+            )
+            # measured once, then reused
+            get_units_by_machine.return_value = {"1": ["nova-compute/1"]}
+            self.assertEqual(
+                await model.async_get_clock_offsets(["nova-compute/1"]),
+                {"nova-compute/1": offsets["nova-compute/1"]},
+            )
+
+        self.assertEqual(offsets["nova-compute/0"], model.ClockOffset(10.0, 1.0, 50.0))
+        self.assertIs(offsets["ceph-osd/0"], offsets["nova-compute/0"])
+        self.assertEqual(offsets["nova-compute/1"].offset, -5.5)
+        self.assertEqual(offsets["nova-compute/0"].unit_time(2000.0), 2009.5)
+        run_on_units.assert_awaited_once_with(
+            "date +%s.%N",
+            units=["nova-compute/0", "nova-compute/1"],
+            model_name=None,
+            timeout=5,
+            max_age=0,
+        )
+
+    async def test_async_get_clock_offsets_refresh(self):
+        self.addCleanup(model.invalidate_clock_offsets)
+        groups = {"0": ["app/0"], "1": ["app/1"]}
+        with model._CLOCK_OFFSETS_LOCK:
+            model._CLOCK_OFFSETS[("None", "0")] = model.ClockOffset(1.0, 0.1, 0.0)
+            model._CLOCK_OFFSETS[("None", "1")] = model.ClockOffset(2.0, 0.1, 10000.0)
+        now = 10000.0 + model.CLOCK_OFFSET_REFRESH + 1
+        with mock.patch.object(
+            model, "async_get_units_by_machine", return_value=groups
+        ), mock.patch.object(
+            model, "async_run_on_units", return_value={"app/1": {"Stdout": "x"}}
+        ) as run_on_units, mock.patch.object(
+            model.time, "monotonic", return_value=now
+        ):
+            # machine 0 is too old to use, machine 1 is refreshed in the background
+            run_on_units.return_value = {"app/0": {"Stdout": str(model.time.time() + 3)}}
+            offsets = await model.async_get_clock_offsets(["app/0", "app/1"])
+            self.assertAlmostEqual(offsets["app/0"].offset, 3.0, delta=1)
+            self.assertEqual(offsets["app/1"].offset, 2.0)
+            self.assertEqual(run_on_units.await_count, 1)
+            # a refresh already in flight isn't started again
+            await model.async_get_clock_offsets(["app/1"])
+            self.assertEqual(len(model._CLOCK_OFFSETS_TASKS), 1)
+
+            run_on_units.return_value = {"app/1": {"Stdout": "x"}}
+            with self.assertLogs(level="WARNING") as logs:
+                await asyncio.gather(*model._CLOCK_OFFSETS_TASKS)
+            self.assertIn("Unable to refresh the clock offset of machines ['1']", logs.output[0])
+            self.assertEqual(run_on_units.await_count, 2)
+            self.assertFalse(model._CLOCK_OFFSETS_REFRESHING)
+
+            # a successful refresh replaces the offset
+            run_on_units.return_value = {"app/1": {"Stdout": str(model.time.time() + 7)}}
+            await model.async_get_clock_offsets(["app/1"])
+            await asyncio.gather(*model._CLOCK_OFFSETS_TASKS)
+            offsets = await model.async_get_clock_offsets(["app/1"])
+            self.assertAlmostEqual(offsets["app/1"].offset, 7.0, delta=1)
+
     async def test_run_on_machine(self):
         with mock.patch.object(model.generic_utils, "check_output") as check_output:
             await model.async_run_on_machine("1", "test")
@@ -2388,3 +3112,239 @@ class AsyncModelTests(aiounittest.AsyncTestCase):
                 self.assertEquals(result.cloud, mock.ANY)
                 self.assertEquals(result.credential_name, "fake-cred-name")
                 self.assertEquals(result.credential, "fake-cred")
+
+    async def test_async_get_model_fingerprint(self):
+        app = mock.MagicMock()
+        app.get_config = mock.AsyncMock(return_value={"source": {"value": "distro"}})
+        model_mock = mock.MagicMock()
+        model_mock.info.uuid = "uuid"
+        model_mock.applications = {"app": app}
+        status = mock.MagicMock()
+        status.applications = {
+            "app": {"charm": "ch:app-1", "units": {"app/0": {}}},
+            "removed": {"charm": "ch:removed-1"},
+        }
+        with mock.patch.object(model, "get_model", return_value=model_mock), mock.patch.object(
+            model, "async_get_status", return_value=status
+        ):
+            fingerprint = await model.async_get_model_fingerprint()
+            self.assertEqual(fingerprint, await model.async_get_model_fingerprint())
+
+            status.applications["app"]["units"]["app/1"] = {}
+            self.assertNotEqual(fingerprint, await model.async_get_model_fingerprint())
+            del status.applications["app"]["units"]["app/1"]
+
+            app.get_config.return_value = {"source": {"value": "cloud:focal-yoga"}}
+            self.assertNotEqual(fingerprint, await model.async_get_model_fingerprint())
+
+    async def test_async_get_status_coalesces(self):
+        release = asyncio.Event()
+        model_mock = mock.MagicMock()
+
+        async def _get_status(filters=None):
+            await release.wait()
+            return FULL_STATUS
+
+        model_mock.get_status = mock.AsyncMock(side_effect=_get_status)
+        self.addCleanup(model._GET_STATUS_TIMES.clear)
+        with mock.patch.object(model, "get_model", return_value=model_mock):
+            callers = asyncio.gather(*(model.async_get_status("coalesce") for _ in range(3)))
+            await asyncio.sleep(0)
+            release.set()
+            self.assertEqual(await callers, [COMPACT_STATUS] * 3)
+            model_mock.get_status.assert_awaited_once_with(filters=None)
+            self.assertEqual(model._GET_STATUS_IN_FLIGHT, {})
+
+            # fresh enough for this call site
+            self.assertEqual(await model.async_get_status("coalesce", max_age=60), COMPACT_STATUS)
+            model_mock.get_status.assert_awaited_once_with(filters=None)
+            # too old for this one
+            self.assertEqual(await model.async_get_status("coalesce", max_age=0), COMPACT_STATUS)
+            self.assertEqual(model_mock.get_status.await_count, 2)
+
+            model.invalidate_status_cache("coalesce")
+            self.assertNotIn("coalesce", model._GET_STATUS_TIMES)
+            with model.get_status_lock("coalesce"):
+                self.assertIs(model.get_status_lock("coalesce"), model.get_status_lock("coalesce"))
+
+    async def test_async_get_status_invalidated_in_flight(self):
+        release = asyncio.Event()
+        model_mock = mock.MagicMock()
+        calls = []
+
+        async def _get_status(filters=None):
+            calls.append(filters)
+            if len(calls) == 1:
+                await release.wait()
+            return FULL_STATUS
+
+        model_mock.get_status = mock.AsyncMock(side_effect=_get_status)
+        self.addCleanup(model._GET_STATUS_TIMES.clear)
+        with mock.patch.object(model, "get_model", return_value=model_mock):
+            before = asyncio.ensure_future(model.async_get_status("invalidated"))
+            await asyncio.sleep(0)
+            self.assertIn("invalidated", model._GET_STATUS_IN_FLIGHT)
+
+            model.invalidate_status_cache("invalidated")
+            self.assertNotIn("invalidated", model._GET_STATUS_IN_FLIGHT)
+            # a caller arriving after the invalidation doesn't join the old call
+            self.assertEqual(await model.async_get_status("invalidated"), COMPACT_STATUS)
+            self.assertEqual(len(calls), 2)
+            after = model._GET_STATUS_TIMES["invalidated"]
+
+            release.set()
+            self.assertEqual(await before, COMPACT_STATUS)
+            # and the result of the old call doesn't replace the new one
+            self.assertIs(model._GET_STATUS_TIMES["invalidated"], after)
+
+    async def test_async_get_status_in_flight_failure(self):
+        model_mock = mock.MagicMock()
+        outcomes = [model.JujuError("boom"), FULL_STATUS]
+
+        async def _get_status(filters=None):
+            await asyncio.sleep(0)
+            result = outcomes.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        model_mock.get_status = mock.AsyncMock(side_effect=_get_status)
+        self.addCleanup(model._GET_STATUS_TIMES.clear)
+        with mock.patch.object(model, "get_model", return_value=model_mock):
+            results = await asyncio.gather(
+                model.async_get_status("failure"),
+                model.async_get_status("failure"),
+                return_exceptions=True,
+            )
+            self.assertTrue(all(isinstance(result, model.JujuError) for result in results))
+            self.assertEqual(await model.async_get_status("failure"), COMPACT_STATUS)
+
+    async def test_async_get_status_in_flight_cancelled(self):
+        model_mock = mock.MagicMock()
+        started = asyncio.Event()
+
+        async def _get_status(filters=None):
+            if not started.is_set():
+                started.set()
+                await asyncio.sleep(60)
+            return FULL_STATUS
+
+        model_mock.get_status = mock.AsyncMock(side_effect=_get_status)
+        self.addCleanup(model._GET_STATUS_TIMES.clear)
+        with mock.patch.object(model, "get_model", return_value=model_mock):
+            owner = asyncio.ensure_future(model.async_get_status("cancelled"))
+            await started.wait()
+            waiter = asyncio.ensure_future(model.async_get_status("cancelled"))
+            await asyncio.sleep(0)
+            owner.cancel()
+            # the waiter takes over the call rather than being cancelled too
+            self.assertEqual(await waiter, COMPACT_STATUS)
+            self.assertTrue(owner.cancelled())
+
+    async def test_async_get_status_filtered(self):
+        model_mock = mock.MagicMock()
+        model_mock.get_status = mock.AsyncMock(return_value=FULL_STATUS)
+        self.addCleanup(model._GET_STATUS_TIMES.clear)
+        with mock.patch.object(model, "get_model", return_value=model_mock):
+            await model.async_get_status("filtered")
+            await model.async_get_status("filtered", filters=["nova", "keystone"])
+            # cached per set of filters
+            await model.async_get_status("filtered", refresh=False, filters=["keystone", "nova"])
+            await model.async_get_status("filtered", filters=["keystone"])
+            self.assertEqual(
+                model_mock.get_status.await_args_list,
+                [
+                    mock.call(filters=None),
+                    mock.call(filters=["keystone", "nova"]),
+                    mock.call(filters=["keystone"]),
+                ],
+            )
+
+            model.invalidate_status_cache("filtered")
+            self.assertEqual(model._GET_STATUS_TIMES, {})
+
+    async def test_watch_model_state(self):
+        def dead_machine():
+            machine = mock.MagicMock(entity_id="2", dead=True)
+            type(machine).status = mock.PropertyMock(side_effect=DeadEntityException)
+            return machine
+
+        machine0 = mock.MagicMock(entity_id="0", status="running", dead=False)
+        machine1 = mock.MagicMock(entity_id="1", status="provisioning error", dead=False)
+        machine2 = mock.MagicMock(entity_id="2", status="provisioning error", dead=False)
+        unit0 = mock.MagicMock(
+            entity_id="app/0", workload_status="active", safe_data={"machine-id": "0"}, dead=False
+        )
+        unit1 = mock.MagicMock(
+            entity_id="app/1", workload_status="error", safe_data={"machine-id": "1"}, dead=False
+        )
+        model_mock = mock.MagicMock()
+        model_mock.units = {"app/0": unit0, "app/1": unit1}
+        model_mock.machines = {"0": machine0, "1": machine1, "2": machine2}
+
+        index = model.watch_model_state(model_mock)
+
+        self.assertIs(model.watch_model_state(model_mock), index)
+        self.assertEqual(model_mock.add_observer.call_count, 2)
+        self.assertEqual(model.units_with_wl_status_state(model_mock, "error"), [unit1])
+        # machine 2 has no units
+        self.assertEqual(model.machines_in_state(model_mock, ["provisioning error"]), [machine1])
+        with self.assertRaises(model.UnitError):
+            model.check_model_for_hard_errors(model_mock)
+
+        # the unit is resolved and moved to machine 0
+        unit1.workload_status = "active"
+        unit1.safe_data = {"machine-id": "0"}
+        await index.on_unit_change(None, unit1, unit1, model_mock)
+        self.assertEqual(model.units_with_wl_status_state(model_mock, "error"), [])
+        self.assertEqual(model.machines_in_state(model_mock, ["provisioning error"]), [])
+        self.assertEqual(
+            sorted(u.entity_id for u in model.units_with_wl_status_state(model_mock, "active")),
+            ["app/0", "app/1"],
+        )
+
+        # a new unit, on a machine whose delta comes later, and which fails
+        del model_mock.machines["2"]
+        await index.on_machine_change(None, machine2, dead_machine(), model_mock)
+        unit2 = mock.MagicMock(
+            entity_id="app/2",
+            workload_status="waiting",
+            machine=None,
+            safe_data={"machine-id": "2"},
+            dead=False,
+        )
+        model_mock.units["app/2"] = unit2
+        await index.on_unit_change(None, None, unit2, model_mock)
+        model.check_model_for_hard_errors(model_mock)
+        model_mock.machines["2"] = machine2
+        await index.on_machine_change(None, None, machine2, model_mock)
+        with self.assertRaises(model.MachineError):
+            model.check_model_for_hard_errors(model_mock)
+
+        # the machine is removed with its unit; the new_obj of a remove delta
+        # is a dead entity, whose data can't be read
+        del model_mock.units["app/2"]
+        del model_mock.machines["2"]
+        dead_unit2 = mock.MagicMock(entity_id="app/2", dead=True)
+        for attr in ("machine", "safe_data", "workload_status"):
+            setattr(type(dead_unit2), attr, mock.PropertyMock(side_effect=DeadEntityException))
+        await index.on_unit_change(None, unit2, dead_unit2, model_mock)
+        await index.on_machine_change(None, machine2, dead_machine(), model_mock)
+        self.assertNotIn("app/2", index.unit_names["waiting"])
+        self.assertNotIn("2", index.machine_ids["provisioning error"])
+        model.check_model_for_hard_errors(model_mock)
+
+        # a stale entry (no delta seen) is never returned
+        unit0.workload_status = "error"
+        await index.on_unit_change(None, None, unit0, model_mock)
+        unit0.workload_status = "active"
+        self.assertEqual(model.units_with_wl_status_state(model_mock, "error"), [])
+        machine0.status = "provisioning error"
+        await index.on_machine_change(None, None, machine0, model_mock)
+        machine0.status = "running"
+        self.assertEqual(model.machines_in_state(model_mock, ["provisioning error"]), [])
+        unit_gone = mock.MagicMock(
+            entity_id="app/9", workload_status="error", safe_data={}, dead=False
+        )
+        await index.on_unit_change(None, None, unit_gone, model_mock)
+        self.assertEqual(model.units_with_wl_status_state(model_mock, "error"), [])
@@ -0,0 +1,85 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pickle
+
+import tests.unit.utils as ut_utils
+from cou.zaza_utils import os_versions
+
+
+class TestCompareReleases(ut_utils.BaseTestCase):
+    def test_compare_openstack(self):
+        yoga = os_versions.CompareOpenStack("yoga")
+        self.assertEqual(yoga, "yoga")
+        self.assertNotEqual(yoga, "zed")
+        self.assertGreater(yoga, "xena")
+        self.assertGreaterEqual(yoga, "yoga")
+        self.assertLess(yoga, os_versions.CompareOpenStack("zed"))
+        self.assertLessEqual(yoga, "zed")
+        self.assertEqual(str(yoga), "yoga")
+        self.assertEqual(repr(yoga), "CompareOpenStack<yoga>")
+
+    def test_compare_host_releases(self):
+        self.assertGreater(os_versions.CompareHostReleases("jammy"), "focal")
+        self.assertLess(os_versions.CompareHostReleases("bionic"), "focal")
+
+    def test_interned(self):
+        yoga = os_versions.CompareOpenStack("yoga")
+        self.assertIs(os_versions.CompareOpenStack("yoga"), yoga)
+        self.assertIs(os_versions.CompareOpenStack(yoga), yoga)
+        self.assertIs(pickle.loads(pickle.dumps(yoga)), yoga)
+        self.assertEqual({yoga: 1}["yoga"], 1)
+        self.assertIsNot(os_versions.CompareHostReleases("focal"), yoga)
+
+    def test_equal_to_anything(self):
+        yoga = os_versions.CompareOpenStack("yoga")
+        for other in (None, 1, "foo", ["yoga"], os_versions.CompareHostReleases("focal")):
+            with self.subTest(other=other):
+                self.assertFalse(yoga == other)
+                self.assertTrue(yoga != other)
+        self.assertFalse(yoga != "yoga")
+        # next to plain strings, in sets and dicts
+        self.assertIn(yoga, {None, "foo", "yoga"})
+        self.assertEqual({"foo": 1, None: 2, yoga: 3}["yoga"], 3)
+
+    def test_sort(self):
+        releases = ["zed", "ussuri", "yoga", "victoria"]
+        self.assertEqual(
+            sorted(releases, key=os_versions.CompareOpenStack),
+            ["ussuri", "victoria", "yoga", "zed"],
+        )
+
+    def test_unknown(self):
+        with self.assertRaises(KeyError):
+            os_versions.CompareOpenStack("foo")
+        with self.assertRaises(KeyError):
+            os_versions.CompareOpenStack(["yoga"])
+        with self.assertRaises(ValueError):
+            os_versions.CompareOpenStack("yoga") < "foo"
+        with self.assertRaises(Exception):
+            os_versions.BasicStringComparator("yoga")
+
+
+class TestPackageCodenames(ut_utils.BaseTestCase):
+    def test_get_os_codename_from_package_version(self):
+        get_codename = os_versions.get_os_codename_from_package_version
+        self.assertEqual(get_codename("nova-common", "2:21.2.4-0ubuntu1"), "ussuri")
+        self.assertEqual(get_codename("ceph-common", "17.2.5-0ubuntu0.22.04.1"), "yoga")
+        self.assertIsNone(get_codename("nova-common", "2:1.0.0"))
+        self.assertIsNone(get_codename("nova-common", None))
+
+    def test_charm_packages(self):
+        for package in os_versions.CHARM_PACKAGES.values():
+            self.assertIn(package, os_versions.PACKAGE_CODENAMES)
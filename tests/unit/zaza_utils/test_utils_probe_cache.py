@@ -0,0 +1,86 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import mock
+
+import tests.unit.utils as ut_utils
+from cou.zaza_utils import instrumentation, probe_cache
+
+RESULT = {"Code": "0", "Stdout": "1234", "Stderr": ""}
+
+
+class TestProbeCache(ut_utils.BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(probe_cache.invalidate)
+        self.addCleanup(probe_cache.set_ttl, probe_cache.DEFAULT_TTL)
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(instrumentation.disable)
+
+    def test_get_and_put(self):
+        instrumentation.enable(rpc=False)
+        self.assertIsNone(probe_cache.get("app/0", "pidof -x 'svc'"))
+        probe_cache.put("app/0", "pidof -x 'svc'", RESULT)
+
+        result = probe_cache.get("app/0", "pidof -x 'svc'")
+        self.assertEqual(result, RESULT)
+        # callers get a copy
+        result["Stdout"] = ""
+        self.assertEqual(probe_cache.get("app/0", "pidof -x 'svc'"), RESULT)
+        self.assertIsNone(probe_cache.get("app/0", "pidof -x 'svc'", model_name="other"))
+        self.assertIsNone(probe_cache.get("app/1", "pidof -x 'svc'"))
+        self.assertEqual(instrumentation.get_stats()["caches"]["probe"]["hits"], 2)
+
+    def test_ttl(self):
+        probe_cache.set_ttl(5)
+        with mock.patch.object(probe_cache.time, "monotonic", return_value=100.0):
+            probe_cache.put("app/0", "cmd", RESULT)
+        with mock.patch.object(probe_cache.time, "monotonic", return_value=104.0):
+            self.assertEqual(probe_cache.get("app/0", "cmd"), RESULT)
+            self.assertIsNone(probe_cache.get("app/0", "cmd", max_age=2))
+        with mock.patch.object(probe_cache.time, "monotonic", return_value=106.0):
+            self.assertIsNone(probe_cache.get("app/0", "cmd"))
+
+        # a ttl of 0 disables the cache
+        probe_cache.set_ttl(0)
+        probe_cache.put("app/0", "cmd", RESULT)
+        self.assertIsNone(probe_cache.get("app/0", "cmd", max_age=10))
+        self.assertEqual(probe_cache._results, {})
+
+    def test_put_failed(self):
+        probe_cache.put("app/0", "cmd", {"Code": "1", "Stdout": "", "Stderr": "error"})
+        probe_cache.put("app/1", "cmd", {"Stdout": ""})
+        # e.g. the start time of a service that isn't running yet
+        probe_cache.put("app/2", "cmd", {"Code": "0", "Stdout": "\n", "Stderr": ""})
+        probe_cache.put("app/3", "cmd", {"Code": "0"})
+        self.assertEqual(probe_cache._results, {})
+
+    def test_invalidate(self):
+        for unit_name in ("app/0", "app/1", "app-hacluster/0", "other/0"):
+            probe_cache.put(unit_name, "cmd", RESULT)
+        probe_cache.put("app/0", "cmd", RESULT, model_name="model")
+
+        probe_cache.invalidate(units=["app/0"])
+        self.assertIsNone(probe_cache.get("app/0", "cmd"))
+        self.assertIsNone(probe_cache.get("app/0", "cmd", model_name="model"))
+        self.assertIsNotNone(probe_cache.get("app/1", "cmd"))
+
+        probe_cache.invalidate(applications=["app"])
+        self.assertIsNone(probe_cache.get("app/1", "cmd"))
+        self.assertIsNotNone(probe_cache.get("app-hacluster/0", "cmd"))
+
+        probe_cache.invalidate()
+        self.assertEqual(probe_cache._results, {})
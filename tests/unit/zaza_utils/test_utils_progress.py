@@ -0,0 +1,182 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+
+import aiounittest
+import mock
+from juju.exceptions import DeadEntityException
+
+import tests.unit.utils as ut_utils
+from cou.zaza_utils import progress
+
+
+class FakeClock(object):
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProgress(ut_utils.BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(progress.disable)
+        self.clock = FakeClock()
+        self.stream = io.StringIO()
+
+    def test_start_disabled(self):
+        model = mock.MagicMock()
+        dashboard = progress.start(model, ["app"])
+        dashboard.watch(model)
+        dashboard.unit_checked("app", "app/0", True)
+        dashboard.application_ready("app")
+        dashboard.render(force=True)
+        dashboard.close()
+        model.add_observer.assert_not_called()
+
+    def test_start_enabled(self):
+        model = mock.MagicMock()
+        progress.enable(self.stream)
+        dashboard = progress.start(model, ["app"])
+        self.assertIsInstance(dashboard, progress.Dashboard)
+        self.assertIs(dashboard.stream, self.stream)
+        model.add_observer.assert_called_once_with(mock.ANY, entity_type="unit")
+
+        dashboard.close()
+        self.assertIn("Waiting for 1 of 1 applications", self.stream.getvalue())
+
+    def test_active_steps(self):
+        progress.step_started("upgrade keystone")
+        self.assertIn("upgrade keystone", progress.get_active_steps())
+        progress.step_finished("upgrade keystone")
+        progress.step_finished("upgrade keystone")
+        self.assertEqual(progress.get_active_steps(), {})
+
+    def test_lines(self):
+        dashboard = progress.Dashboard(
+            ["keystone", "glance"], stream=self.stream, clock=self.clock
+        )
+        for index in range(7):
+            dashboard.unit_checked("keystone", "keystone/{}".format(index), False)
+        dashboard.unit_checked("glance", "glance/0", False)
+        dashboard.unit_status["keystone/0"] = "maintenance/executing"
+        self.assertEqual(
+            dashboard.lines(),
+            [
+                "Waiting for 2 of 2 applications, 0/8 units ready, 0m00s elapsed",
+                "0.0 units/min, time left unknown",
+                "  glance: 0/1 ready",
+                "    glance/0",
+                "  keystone: 0/7 ready",
+                "    keystone/0 maintenance/executing",
+                "    keystone/1",
+                "    keystone/2",
+                "    keystone/3",
+                "    keystone/4",
+                "    ... and 2 more",
+            ],
+        )
+
+        self.clock.now += 120
+        dashboard.application_ready("glance")
+        dashboard.unit_checked("keystone", "keystone/0", True)
+        dashboard.unit_checked("keystone", "keystone/0", True)
+        with mock.patch.object(progress, "get_active_steps", return_value={"step": 1000.0}):
+            lines = dashboard.lines()
+        self.assertEqual(
+            lines[:4],
+            [
+                "Waiting for 1 of 2 applications, 2/8 units ready, 2m00s elapsed",
+                "1.0 units/min, about 6m00s left",
+                "running: step (2m00s)",
+                "  keystone: 1/7 ready",
+            ],
+        )
+
+    def test_format_duration(self):
+        self.assertEqual(progress._format_duration(59), "0m59s")
+        self.assertEqual(progress._format_duration(3 * 3600 + 120), "3h02m")
+
+    def test_render(self):
+        dashboard = progress.Dashboard(["app"], stream=self.stream, clock=self.clock)
+        dashboard.unit_checked("app", "app/0", False)
+        dashboard.render()
+        first = self.stream.getvalue()
+        self.assertTrue(first.startswith("Waiting for 1 of 1 applications"))
+
+        # unchanged, or changed too recently: not redrawn
+        dashboard.render()
+        dashboard.unit_checked("app", "app/0", True)
+        dashboard.render()
+        self.assertEqual(self.stream.getvalue(), first)
+
+        self.clock.now += progress.RENDER_INTERVAL
+        dashboard.render()
+        redraw = self.stream.getvalue().replace(first, "", 1)
+        self.assertTrue(redraw.startswith("\x1b[{}F\x1b[J".format(len(first.splitlines()))))
+        self.assertIn("1/1 units ready", redraw)
+
+        dashboard.close()
+        self.assertEqual(len(self.stream.getvalue()), len(first) + len(redraw))
+
+
+class TestDashboardObserver(aiounittest.AsyncTestCase):
+    async def test_on_unit_change(self):
+        dashboard = progress.Dashboard(["app"], stream=io.StringIO())
+        unit = mock.MagicMock(
+            entity_id="app/0", workload_status="active", agent_status="idle", dead=False
+        )
+        await dashboard._on_unit_change(None, None, unit, None)
+        self.assertEqual(dashboard.unit_status, {"app/0": "active/idle"})
+        await dashboard._on_unit_change(None, unit, None, None)
+        self.assertEqual(dashboard.unit_status, {})
+        # the new_obj of a remove delta is a dead unit, whose data can't be read
+        await dashboard._on_unit_change(None, None, unit, None)
+        dead_unit = mock.MagicMock(entity_id="app/0", dead=True)
+        type(dead_unit).workload_status = mock.PropertyMock(side_effect=DeadEntityException)
+        await dashboard._on_unit_change(None, unit, dead_unit, None)
+        self.assertEqual(dashboard.unit_status, {})
+        await dashboard._on_unit_change(None, None, None, None)
+
+    async def test_watch_shares_one_observer(self):
+        model = mock.MagicMock()
+        first = progress.Dashboard(["app"], stream=io.StringIO())
+        second = progress.Dashboard(["app"], stream=io.StringIO())
+        first.watch(model)
+        second.watch(model)
+        model.add_observer.assert_called_once_with(mock.ANY, entity_type="unit")
+        observer = model.add_observer.call_args[0][0]
+
+        unit = mock.MagicMock(
+            entity_id="app/0", workload_status="active", agent_status="idle", dead=False
+        )
+        await observer(None, None, unit, model)
+        self.assertEqual(first.unit_status, {"app/0": "active/idle"})
+        self.assertEqual(second.unit_status, {"app/0": "active/idle"})
+
+        first.close()
+        unit.workload_status = "maintenance"
+        await observer(None, unit, unit, model)
+        self.assertEqual(first.unit_status, {"app/0": "active/idle"})
+        self.assertEqual(second.unit_status, {"app/0": "maintenance/idle"})
+        second.close()
+        second.close()
+
+        third = progress.Dashboard(["app"], stream=io.StringIO())
+        third.watch(model)
+        model.add_observer.assert_called_once()
+        await observer(None, unit, unit, model)
+        self.assertEqual(third.unit_status, {"app/0": "maintenance/idle"})
@@ -0,0 +1,141 @@
+# Copyright 2023 Canonical Limited.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from juju.client._definitions import FullStatus
+
+import tests.unit.utils as ut_utils
+from cou.zaza_utils import status
+
+
+def _unit(machine, sub=None):
+    unit = {
+        "machine": machine,
+        "leader": machine == "0",
+        "agent-status": {"status": "idle", "since": "01 Jan 2023"},
+        "workload-status": {"status": "active", "info": "Unit is ready"},
+    }
+    if sub:
+        unit["subordinates"] = {sub: {"charm": "ch:hacluster-1"}}
+    return unit
+
+
+FULL_STATUS = {
+    "model": {"name": "test", "type": "iaas"},
+    "applications": {
+        "keystone": {
+            "charm": "ch:amd64/focal/keystone-1",
+            "series": "focal",
+            "subordinate-to": [],
+            "relations": {"ha": ["keystone-hacluster"]},
+            "units": {
+                "keystone/0": _unit("0", "keystone-hacluster/0"),
+                "keystone/1": _unit("1/lxd/0", "keystone-hacluster/1"),
+            },
+        },
+        "keystone-hacluster": {"charm": "ch:hacluster-1", "subordinate-to": ["keystone"]},
+    },
+    "machines": {
+        "0": {
+            "id": "0",
+            "series": "focal",
+            "display-name": "node-bob.maas",
+            "agent-status": {"status": "started"},
+        },
+        "1": {
+            "id": "1",
+            "series": "focal",
+            "containers": {"1/lxd/0": {"id": "1/lxd/0", "series": "focal"}},
+        },
+    },
+    "relations": [],
+}
+
+
+class TestStatus(ut_utils.BaseTestCase):
+    def test_compact_status(self):
+        compact = status.compact_status(FullStatus.from_json(FULL_STATUS))
+
+        keystone = compact.applications["keystone"]
+        unit = keystone["units"]["keystone/0"]
+        self.assertEqual(keystone.charm, "ch:amd64/focal/keystone-1")
+        self.assertEqual(keystone["subordinate-to"], ())
+        self.assertEqual(keystone.get("relations"), {"ha": ("keystone-hacluster",)})
+        self.assertEqual(unit["workload-status"]["status"], "active")
+        self.assertEqual(unit.workload_status.info, "Unit is ready")
+        self.assertEqual(unit.agent_status["status"], "idle")
+        self.assertTrue(unit.get("leader"))
+        self.assertEqual(list(unit["subordinates"]), ["keystone-hacluster/0"])
+        self.assertEqual(unit["subordinates"]["keystone-hacluster/0"]["charm"], "ch:hacluster-1")
+        self.assertEqual(compact["applications"]["keystone-hacluster"]["units"], {})
+        self.assertEqual(
+            compact.applications["keystone-hacluster"].get("subordinate-to"), ("keystone",)
+        )
+        self.assertEqual(compact["machines"]["0"].agent_status["status"], "started")
+        self.assertEqual(compact.machines["1"]["containers"]["1/lxd/0"]["series"], "focal")
+        self.assertEqual(compact.model.name, "test")
+
+    def test_compact_status_all_fields(self):
+        # every field of the libjuju status is kept
+        compact = status.compact_status(FullStatus.from_json(FULL_STATUS))
+
+        self.assertEqual(compact.machines["0"].display_name, "node-bob.maas")
+        self.assertEqual(compact.machines["0"].get("display-name"), "node-bob.maas")
+        self.assertIsNone(compact.machines["1"]["display-name"])
+        self.assertIn("int", compact.applications["keystone"])
+        self.assertIn("provider-id", compact.applications["keystone"].units["keystone/0"])
+        self.assertIn("remote-applications", compact)
+
+    def test_compact_status_dict(self):
+        # a plain dict converts the same as the libjuju objects
+        from_dict = status.compact_status(FULL_STATUS)
+        from_libjuju = status.compact_status(FullStatus.from_json(FULL_STATUS))
+        self.assertEqual(from_dict.applications, from_libjuju.applications)
+        self.assertEqual(from_dict.machines, from_libjuju.machines)
+        self.assertEqual(status.compact_status({}).applications, {})
+
+    def test_compact_status_interned(self):
+        compact = status.compact_status(FullStatus.from_json(FULL_STATUS))
+
+        units = compact.applications["keystone"].units
+        self.assertIs(
+            units["keystone/0"].workload_status.info, units["keystone/1"].workload_status.info
+        )
+        self.assertIs(units["keystone/0"].machine, list(compact.machines)[0])
+        self.assertIs(
+            compact.applications["keystone-hacluster"].units,
+            compact.machines["0"].containers,
+        )
+
+    def test_record(self):
+        record = status.DetailedStatus(status="active")
+
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertIsNone(record.info)
+        self.assertIn("status", record)
+        self.assertNotIn("current", record)
+        self.assertEqual(record.get("current", "unknown"), "unknown")
+        self.assertEqual(
+            set(record.keys()),
+            {"status", "info", "since", "version", "kind", "life", "data", "err"},
+        )
+        with self.assertRaises(KeyError):
+            record["current"]
+        self.assertNotEqual(record, status.UnitStatus())
+        self.assertEqual(
+            repr(record),
+            "DetailedStatus(status='active', info=None, since=None, version=None, kind=None, "
+            "life=None, data=None, err=None)",
+        )
+        self.assertEqual(status.MachineStatus(dns_name="host")["dns-name"], "host")
@@ -16,6 +16,7 @@
 import copy
 import pprint
 
+import aiounittest
 import mock
 
 import cou.zaza_utils.upgrade_utils as openstack_upgrade
@@ -111,3 +112,77 @@ class TestUpgradeUtils(ut_utils.BaseTestCase):
             openstack_upgrade.extract_charm_name_from_url("cs:bionic/heat-12"), "heat"
         )
         self.assertEqual(openstack_upgrade.extract_charm_name_from_url("cs:heat"), "heat")
+
+
+class TestCurrentOSReleases(aiounittest.AsyncTestCase):
+    def setUp(self):
+        openstack_upgrade.clear_current_os_releases_cache(all_models=True)
+        self.addCleanup(openstack_upgrade.clear_current_os_releases_cache, all_models=True)
+        status = mock.MagicMock()
+        status.applications = {
+            "keystone": {
+                "charm": "cs:keystone-310",
+                "units": {"keystone/0": {}, "keystone/1": {}},
+            },
+            "nova-compute": {"charm": "cs:nova-compute-5", "units": {"nova-compute/0": {}}},
+            "ntp": {"charm": "cs:ntp", "units": {"ntp/0": {}}},
+        }
+        self.versions = {
+            "keystone/0": {"Code": "0", "Stdout": "2:18.1.0-0ubuntu1", "Stderr": ""},
+            "keystone/1": {"Code": "0", "Stdout": "2:17.0.1-0ubuntu1", "Stderr": ""},
+            "nova-compute/0": {"Code": "1", "Stdout": "", "Stderr": "not installed"},
+        }
+
+        async def _run_on_unit_machines(unit_names, cmd, model_name=None, max_age=None):
+            return {unit_name: self.versions[unit_name] for unit_name in unit_names}
+
+        self.async_get_status = mock.AsyncMock(return_value=status)
+        self.async_run_on_unit_machines = mock.AsyncMock(side_effect=_run_on_unit_machines)
+        for name in ("async_get_status", "async_run_on_unit_machines"):
+            patcher = mock.patch.object(openstack_upgrade.model, name, getattr(self, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_async_get_current_os_releases(self):
+        releases = await openstack_upgrade.async_get_current_os_releases()
+        self.assertEqual(releases, {"keystone": "ussuri", "nova-compute": None})
+        # one call per package, each running once per machine
+        self.assertEqual(self.async_run_on_unit_machines.await_count, 2)
+        self.async_run_on_unit_machines.assert_any_await(
+            ["keystone/0", "keystone/1"],
+            "dpkg-query --show --showformat='${Version}' keystone",
+            model_name=None,
+            max_age=openstack_upgrade.probe_cache.TTL,
+        )
+
+    async def test_async_get_current_os_releases_unknown(self):
+        # a version that is not in the lookup table makes the release unknown
+        self.versions["keystone/1"] = {"Code": "0", "Stdout": "2:99.0.0-0ubuntu1"}
+        with self.assertLogs(level="WARNING") as logs:
+            releases = await openstack_upgrade.async_get_current_os_releases()
+        self.assertEqual(releases, {"keystone": None, "nova-compute": None})
+        self.assertTrue(
+            any("Unknown OpenStack release of keystone 2:99.0.0" in line for line in logs.output)
+        )
+
+    async def test_async_get_current_os_releases_cached(self):
+        releases = await openstack_upgrade.async_get_current_os_releases()
+        self.assertIs(await openstack_upgrade.async_get_current_os_releases(), releases)
+        self.async_get_status.assert_awaited_once()
+        await openstack_upgrade.async_get_current_os_releases(refresh=True)
+        self.assertEqual(self.async_get_status.await_count, 2)
+        openstack_upgrade.clear_current_os_releases_cache(model_name="other")
+        await openstack_upgrade.async_get_current_os_releases()
+        self.assertEqual(self.async_get_status.await_count, 2)
+        openstack_upgrade.clear_current_os_releases_cache(model_name=None)
+        await openstack_upgrade.async_get_current_os_releases()
+        self.assertEqual(self.async_get_status.await_count, 3)
+        await openstack_upgrade.async_get_current_os_releases(model_name="other")
+        self.assertEqual(self.async_get_status.await_count, 4)
+        # the current model alone
+        openstack_upgrade.clear_current_os_releases_cache()
+        await openstack_upgrade.async_get_current_os_releases(model_name="other")
+        self.assertEqual(self.async_get_status.await_count, 4)
+        openstack_upgrade.clear_current_os_releases_cache(all_models=True)
+        await openstack_upgrade.async_get_current_os_releases(model_name="other")
+        self.assertEqual(self.async_get_status.await_count, 5)